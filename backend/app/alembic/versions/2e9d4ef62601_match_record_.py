@@ -0,0 +1,136 @@
+"""match record surrogate keys
+
+Revision ID: 2e9d4ef62601
+Revises: d058d3e741a9
+Create Date: 2026-10-18 08:49:14.953440
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2e9d4ef62601'
+down_revision: Union[str, None] = 'd058d3e741a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Name columns of the match table, with the table and id column that replace them
+NAME_COLUMNS = [
+    ("season_name", "season", "season_id"),
+    ("home_team_name", "team", "home_team_id"),
+    ("away_team_name", "team", "away_team_id"),
+    ("referee_name", "referee", "referee_id"),
+]
+# Columns of match_record as of this revision, in the order of the Match model
+MATCH_COLUMNS = [
+    "id", "division", "match_date", "match_time", "full_time_home_goals",
+    "full_time_away_goals", "full_time_result", "half_time_home_goals",
+    "half_time_away_goals", "half_time_result", "home_shots", "away_shots",
+    "home_shots_on_target", "away_shots_on_target", "home_fouls", "away_fouls",
+    "home_corners", "away_corners", "home_yellow_cards", "away_yellow_cards",
+    "home_red_cards", "away_red_cards", "bet365_home_win_odds", "bet365_draw_odds",
+    "bet365_away_win_odds", "bet_and_win_home_win_odds", "bet_and_win_draw_odds",
+    "bet_and_win_away_win_odds", "interwetten_home_win_odds", "interwetten_draw_odds",
+    "interwetten_away_win_odds", "pinnacle_home_win_odds", "pinnacle_draw_odds",
+    "pinnacle_away_win_odds", "william_hill_home_win_odds", "william_hill_draw_odds",
+    "william_hill_away_win_odds", "vc_bet_home_win_odds", "vc_bet_draw_odds",
+    "vc_bet_away_win_odds", "max_home_win_odds", "max_draw_odds", "max_away_win_odds",
+    "avg_home_win_odds", "avg_draw_odds", "avg_away_win_odds", "bet365_over_2_5_odds",
+    "bet365_under_2_5_odds", "pinnacle_over_2_5_odds", "pinnacle_under_2_5_odds",
+    "max_over_2_5_odds", "max_under_2_5_odds", "avg_over_2_5_odds",
+    "avg_under_2_5_odds", "asian_handicap_line", "bet365_asian_handicap_home_odds",
+    "bet365_asian_handicap_away_odds", "pinnacle_asian_handicap_home_odds",
+    "pinnacle_asian_handicap_away_odds", "max_asian_handicap_home_odds",
+    "max_asian_handicap_away_odds", "avg_asian_handicap_home_odds",
+    "avg_asian_handicap_away_odds",
+]
+
+
+def upgrade() -> None:
+    op.rename_table('match', 'match_record')
+    op.execute('ALTER SEQUENCE match_id_seq RENAME TO match_record_id_seq')
+    op.execute('ALTER INDEX match_pkey RENAME TO match_record_pkey')
+    op.drop_index('ix_match_natural_key', table_name='match_record')
+
+    for name_column, table, id_column in NAME_COLUMNS:
+        op.add_column('match_record', sa.Column(id_column, sa.Integer(), nullable=True))
+    # One UPDATE for all of them, every UPDATE writes a new copy of each row
+    op.execute(
+        "UPDATE match_record SET "
+        + ", ".join(
+            f"{id_column} = (SELECT id FROM {table} WHERE name = match_record.{name_column})"
+            for name_column, table, id_column in NAME_COLUMNS
+        )
+    )
+    for name_column, table, id_column in NAME_COLUMNS:
+        op.create_foreign_key(
+            f'match_record_{id_column}_fkey', 'match_record', table, [id_column], ['id']
+        )
+        op.drop_column('match_record', name_column)
+    for id_column in ['season_id', 'home_team_id', 'away_team_id']:
+        op.alter_column('match_record', id_column, nullable=False)
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.create_index(op.f('ix_match_record_away_team_id'), 'match_record', ['away_team_id'], unique=False)
+    op.create_index(op.f('ix_match_record_home_team_id'), 'match_record', ['home_team_id'], unique=False)
+    op.create_index('ix_match_record_natural_key', 'match_record', ['season_id', 'home_team_id', 'away_team_id', 'match_date'], unique=True)
+    op.create_index(op.f('ix_match_record_referee_id'), 'match_record', ['referee_id'], unique=False)
+    # ### end Alembic commands ###
+
+    # The names are kept available under the old table name
+    columns = ", ".join(f"m.{column}" for column in MATCH_COLUMNS)
+    op.execute(
+        f"""
+        CREATE VIEW match AS
+        SELECT {columns},
+            s.name AS season_name,
+            h.name AS home_team_name,
+            a.name AS away_team_name,
+            r.name AS referee_name
+        FROM match_record m
+        JOIN season s ON s.id = m.season_id
+        JOIN team h ON h.id = m.home_team_id
+        JOIN team a ON a.id = m.away_team_id
+        LEFT JOIN referee r ON r.id = m.referee_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP VIEW match')
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    op.drop_index(op.f('ix_match_record_referee_id'), table_name='match_record')
+    op.drop_index('ix_match_record_natural_key', table_name='match_record')
+    op.drop_index(op.f('ix_match_record_home_team_id'), table_name='match_record')
+    op.drop_index(op.f('ix_match_record_away_team_id'), table_name='match_record')
+    # ### end Alembic commands ###
+
+    for name_column, table, id_column in NAME_COLUMNS:
+        op.add_column(
+            'match_record',
+            sa.Column(name_column, sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+        )
+    op.execute(
+        "UPDATE match_record SET "
+        + ", ".join(
+            f"{name_column} = (SELECT name FROM {table} WHERE id = match_record.{id_column})"
+            for name_column, table, id_column in NAME_COLUMNS
+        )
+    )
+    for name_column, table, id_column in NAME_COLUMNS:
+        op.create_foreign_key(
+            f'match_{name_column}_fkey', 'match_record', table, [name_column], ['name']
+        )
+        op.drop_column('match_record', id_column)
+    for name_column in ['season_name', 'home_team_name', 'away_team_name']:
+        op.alter_column('match_record', name_column, nullable=False)
+
+    op.create_index('ix_match_natural_key', 'match_record', ['season_name', 'home_team_name', 'away_team_name', 'match_date'], unique=True)
+    op.execute('ALTER INDEX match_record_pkey RENAME TO match_pkey')
+    op.execute('ALTER SEQUENCE match_record_id_seq RENAME TO match_id_seq')
+    op.rename_table('match_record', 'match')
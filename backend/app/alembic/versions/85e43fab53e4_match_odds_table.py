@@ -0,0 +1,100 @@
+"""match odds table
+
+Revision ID: 85e43fab53e4
+Revises: 2e9d4ef62601
+Create Date: 2026-10-18 08:53:23.311177
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = '85e43fab53e4'
+down_revision: Union[str, None] = '2e9d4ef62601'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Odds columns moved from match_record to match_odds
+ODDS_COLUMNS = [
+    "bet365_home_win_odds", "bet365_draw_odds", "bet365_away_win_odds",
+    "bet_and_win_home_win_odds", "bet_and_win_draw_odds", "bet_and_win_away_win_odds",
+    "interwetten_home_win_odds", "interwetten_draw_odds", "interwetten_away_win_odds",
+    "pinnacle_home_win_odds", "pinnacle_draw_odds", "pinnacle_away_win_odds",
+    "william_hill_home_win_odds", "william_hill_draw_odds",
+    "william_hill_away_win_odds", "vc_bet_home_win_odds", "vc_bet_draw_odds",
+    "vc_bet_away_win_odds", "max_home_win_odds", "max_draw_odds", "max_away_win_odds",
+    "avg_home_win_odds", "avg_draw_odds", "avg_away_win_odds", "bet365_over_2_5_odds",
+    "bet365_under_2_5_odds", "pinnacle_over_2_5_odds", "pinnacle_under_2_5_odds",
+    "max_over_2_5_odds", "max_under_2_5_odds", "avg_over_2_5_odds",
+    "avg_under_2_5_odds", "asian_handicap_line", "bet365_asian_handicap_home_odds",
+    "bet365_asian_handicap_away_odds", "pinnacle_asian_handicap_home_odds",
+    "pinnacle_asian_handicap_away_odds", "max_asian_handicap_home_odds",
+    "max_asian_handicap_away_odds", "avg_asian_handicap_home_odds",
+    "avg_asian_handicap_away_odds",
+]
+# Columns of match_record after this revision, in the order of the Match model
+MATCH_COLUMNS = [
+    "id", "division", "match_date", "match_time", "full_time_home_goals",
+    "full_time_away_goals", "full_time_result", "half_time_home_goals",
+    "half_time_away_goals", "half_time_result", "home_shots", "away_shots",
+    "home_shots_on_target", "away_shots_on_target", "home_fouls", "away_fouls",
+    "home_corners", "away_corners", "home_yellow_cards", "away_yellow_cards",
+    "home_red_cards", "away_red_cards",
+]
+
+
+def create_match_view(columns) -> None:
+    op.execute(
+        f"""
+        CREATE VIEW match AS
+        SELECT {", ".join(f"m.{column}" for column in columns)},
+            s.name AS season_name,
+            h.name AS home_team_name,
+            a.name AS away_team_name,
+            r.name AS referee_name
+        FROM match_record m
+        JOIN season s ON s.id = m.season_id
+        JOIN team h ON h.id = m.home_team_id
+        JOIN team a ON a.id = m.away_team_id
+        LEFT JOIN referee r ON r.id = m.referee_id
+        """
+    )
+
+
+def upgrade() -> None:
+    op.create_table('match_odds',
+    sa.Column('match_id', sa.Integer(), nullable=False),
+    *[sa.Column(column, sa.Float(), nullable=True) for column in ODDS_COLUMNS],
+    sa.ForeignKeyConstraint(['match_id'], ['match_record.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('match_id')
+    )
+    columns = ", ".join(ODDS_COLUMNS)
+    op.execute(
+        f"INSERT INTO match_odds (match_id, {columns}) SELECT id, {columns} FROM match_record"
+    )
+
+    # The view selects the odds columns, it goes first
+    op.execute('DROP VIEW match')
+    for column in ODDS_COLUMNS:
+        op.drop_column('match_record', column)
+    create_match_view(MATCH_COLUMNS)
+    # Existing rows keep the dropped values on disk until they are rewritten,
+    # run VACUUM FULL match_record to reclaim the space
+
+
+def downgrade() -> None:
+    op.execute('DROP VIEW match')
+    for column in ODDS_COLUMNS:
+        op.add_column('match_record', sa.Column(column, sa.Float(), nullable=True))
+    op.execute(
+        "UPDATE match_record m SET "
+        + ", ".join(f"{column} = o.{column}" for column in ODDS_COLUMNS)
+        + " FROM match_odds o WHERE o.match_id = m.id"
+    )
+    op.drop_table('match_odds')
+    create_match_view(MATCH_COLUMNS + ODDS_COLUMNS)
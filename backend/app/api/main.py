@@ -1,5 +1,5 @@
 from app.api.querying import stats
-from app.api.routes import match, referee, season, stadium, team
+from app.api.routes import imports, match, referee, season, stadium, team
 from fastapi import APIRouter
 
 api_router = APIRouter()
@@ -8,4 +8,5 @@ api_router.include_router(team.router, prefix="/team", tags=["teams"])
 api_router.include_router(stadium.router, prefix="/stadium", tags=["stadiums"])
 api_router.include_router(match.router, prefix="/match", tags=["matches"])
 api_router.include_router(referee.router, prefix="/referee", tags=["referees"])
+api_router.include_router(imports.router, prefix="/import", tags=["imports"])
 api_router.include_router(stats.router, prefix="/query", tags=["querying"])
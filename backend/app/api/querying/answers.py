@@ -0,0 +1,98 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from app.api.querying.normalize import normalize_question
+from app.core.db import async_engine
+from app.core.metrics import Counter
+from app.models import CachedAnswer
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+LOOKUPS = Counter(
+    "answer_cache_lookups_total",
+    "Answer cache lookups by result (hit, miss or stale).",
+    labels=("result",),
+)
+
+AnswerKey = Tuple[str, str]
+
+
+def answer_key(user_question: str, answer_dicts: List[dict]) -> AnswerKey:
+    """
+    The normalized question and a hash of the rows the answer is written from,
+    so that a cached answer never outlives the data it describes.
+    """
+    rows = json.dumps(answer_dicts, default=str, sort_keys=True)
+    return normalize_question(user_question), hashlib.sha256(rows.encode()).hexdigest()
+
+
+class AnswerCache:
+    """
+    Answers of the answer model stored in the `cachedanswer` table, so that every
+    worker can use them and they survive restarts. Answers older than `ttl`
+    seconds are regenerated, and are kept for `max_stale` seconds to be served
+    when the provider cannot be reached.
+    """
+
+    def __init__(self, ttl: int, max_stale: int):
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+
+    async def _get(self, key: AnswerKey, max_age: int) -> Optional[str]:
+        question, data_hash = key
+        oldest = datetime.utcnow() - timedelta(seconds=max_age)
+        statement = select(CachedAnswer.answer).where(
+            CachedAnswer.question == question,
+            CachedAnswer.data_hash == data_hash,
+            CachedAnswer.created_at >= oldest,
+        )
+        async with AsyncSession(async_engine) as session:
+            return (await session.exec(statement)).first()
+
+    async def get(self, key: AnswerKey) -> Optional[str]:
+        answer = await self._get(key, self.ttl)
+        if answer is None:
+            self.misses += 1
+            LOOKUPS.inc(result="miss")
+        else:
+            self.hits += 1
+            LOOKUPS.inc(result="hit")
+        return answer
+
+    async def get_stale(self, key: AnswerKey) -> Optional[str]:
+        """
+        The answer for `key` however old it is, for when it cannot be regenerated.
+        """
+        answer = await self._get(key, self.max_stale)
+        if answer is not None:
+            self.stale_hits += 1
+            LOOKUPS.inc(result="stale")
+        return answer
+
+    async def set(self, key: AnswerKey, answer: str) -> None:
+        question, data_hash = key
+        now = datetime.utcnow()
+        statement = insert(CachedAnswer).values(
+            question=question, data_hash=data_hash, answer=answer, created_at=now
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["question", "data_hash"],
+            set_={"answer": answer, "created_at": now},
+        )
+        async with AsyncSession(async_engine) as session:
+            await session.exec(
+                delete(CachedAnswer).where(
+                    CachedAnswer.created_at < now - timedelta(seconds=self.max_stale)
+                )
+            )
+            await session.exec(statement)
+            await session.commit()
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "stale_hits": self.stale_hits}
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache where every entry also expires `ttl` seconds after it
+    was stored. Keeps hit/miss/eviction counters for the stats endpoint.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SizedTTLCache(TTLCache):
+    """
+    `TTLCache` bounded by the total size (in bytes) of its values instead of the
+    number of entries. Callers pass the size of every value they store.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        super().__init__(maxsize=max_bytes, ttl=ttl)
+        self.current_bytes = 0
+        self._sizes: dict[Hashable, int] = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = super().get(key)
+        if value is None:
+            with self._lock:
+                # Expired entries are dropped by the parent, release their bytes
+                if key not in self._entries and key in self._sizes:
+                    self.current_bytes -= self._sizes.pop(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, size: int = 0) -> None:
+        if size > self.maxsize:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._sizes.pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self.current_bytes += size
+            while self.current_bytes > self.maxsize:
+                evicted, _ = self._entries.popitem(last=False)
+                self.current_bytes -= self._sizes.pop(evicted)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+            self.current_bytes -= self._sizes.pop(key, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["bytes"] = self.current_bytes
+        return stats
@@ -0,0 +1,140 @@
+import asyncio
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from app.api.querying.timing import span
+from app.core.config import settings
+from app.core.db import async_engine
+from app.models import SharedResponse
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, null, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import delete, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one computation. The first
+    caller starts it as a task of its own, so that a caller disconnecting does
+    not cancel it for everyone else waiting on the same key. The stages of the
+    computation are timed for the first caller, the others time a `wait`.
+    """
+
+    def __init__(self):
+        self.leaders = 0
+        self.coalesced = 0
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is None:
+            self.leaders += 1
+            future = asyncio.ensure_future(fn())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            return await asyncio.shield(future)
+
+        self.coalesced += 1
+        with span("wait"):
+            return await asyncio.shield(future)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+def _ago(seconds: float) -> datetime:
+    return datetime.utcnow() - timedelta(seconds=seconds)
+
+
+async def _get_shared_response(session: AsyncSession, key: str) -> Optional[dict]:
+    statement = select(SharedResponse.response).where(
+        SharedResponse.key == key,
+        SharedResponse.response.is_not(None),
+        SharedResponse.created_at >= _ago(settings.SINGLE_FLIGHT_SHARED_TTL_SECONDS),
+    )
+    return (await session.exec(statement)).first()
+
+
+async def _claim(session: AsyncSession, key: str) -> bool:
+    """
+    Makes this worker the one computing `key`, unless another one has a claim on
+    it that has not run out yet. A claim is a row without a response.
+    """
+    statement = insert(SharedResponse).values(
+        key=key, response=null(), created_at=datetime.utcnow()
+    )
+    table = SharedResponse.__table__
+    statement = statement.on_conflict_do_update(
+        index_elements=["key"],
+        set_={"response": null(), "created_at": statement.excluded.created_at},
+        where=or_(
+            and_(
+                table.c.response.is_(None),
+                table.c.created_at < _ago(settings.SINGLE_FLIGHT_SHARED_WAIT_SECONDS),
+            ),
+            and_(
+                table.c.response.is_not(None),
+                table.c.created_at < _ago(settings.SINGLE_FLIGHT_SHARED_TTL_SECONDS),
+            ),
+        ),
+    ).returning(table.c.key)
+    return (await session.exec(statement)).first() is not None
+
+
+async def shared_flight(key: str, fn: Callable[[], Awaitable[dict]]) -> dict:
+    """
+    Cross-worker single flight. The first worker to ask for a key claims it in
+    the `sharedresponse` table and stores its response there, the others poll
+    for it. No connection is held while the response is computed, and a claim
+    runs out after `SINGLE_FLIGHT_SHARED_WAIT_SECONDS` so that a worker that
+    died cannot keep the others waiting.
+    """
+    # Claiming the key or waiting for another worker's response
+    with span("wait"):
+        while True:
+            async with AsyncSession(async_engine) as session:
+                response = await _get_shared_response(session, key)
+                if response is not None:
+                    return response
+                claimed = await _claim(session, key)
+                await session.commit()
+            if claimed:
+                break
+            await asyncio.sleep(settings.SINGLE_FLIGHT_SHARED_POLL_SECONDS)
+
+    try:
+        response = jsonable_encoder(await fn())
+    except BaseException:
+        # The others compute it themselves rather than wait for the claim to run out
+        async with AsyncSession(async_engine) as session:
+            await session.exec(
+                delete(SharedResponse).where(
+                    SharedResponse.key == key, SharedResponse.response.is_(None)
+                )
+            )
+            await session.commit()
+        raise
+
+    async with AsyncSession(async_engine) as session:
+        # Expired responses and abandoned claims go on the way
+        oldest = _ago(
+            max(
+                settings.SINGLE_FLIGHT_SHARED_TTL_SECONDS,
+                settings.SINGLE_FLIGHT_SHARED_WAIT_SECONDS,
+            )
+        )
+        await session.exec(
+            delete(SharedResponse).where(SharedResponse.created_at < oldest)
+        )
+        await session.exec(
+            update(SharedResponse)
+            .where(SharedResponse.key == key)
+            .values(response=response, created_at=datetime.utcnow())
+        )
+        await session.commit()
+    return response
@@ -0,0 +1,118 @@
+import json
+import secrets
+from datetime import datetime, timedelta
+from typing import List
+
+from app.api.querying.schema import estimate_tokens
+from app.api.querying.utils import FOLLOW_UP_PROMPT
+from app.core.config import settings
+from app.core.db import async_engine
+from app.models import Conversation
+from fastapi import HTTPException, status
+from sqlmodel import delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# Characters of result rows kept in the summary of a turn
+SUMMARY_CHARS = 300
+
+
+def _oldest_conversation() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.CONVERSATION_TTL_SECONDS)
+
+
+def summarize_rows(rows: List[dict], more: bool = False) -> str:
+    """
+    The row count and the first rows of a result, cut to `SUMMARY_CHARS`.
+    """
+    count = f"more than {len(rows)}" if more else str(len(rows))
+    first = json.dumps(rows[:3], default=str)
+    if len(first) > SUMMARY_CHARS:
+        first = first[:SUMMARY_CHARS] + "..."
+    return f"{count} rows, starting {first}"
+
+
+def format_history(turns: List[dict]) -> str:
+    """
+    Context for the SQL model to put in front of a follow-up question, empty
+    when there are no earlier turns.
+    """
+    if not turns:
+        return ""
+    lines = "\n".join(
+        f"Q: {turn['question']}\nSQL: {turn['sql']}\nResult: {turn['summary']}"
+        for turn in turns
+    )
+    return FOLLOW_UP_PROMPT.format(turns=lines)
+
+
+def trim_turns(turns: List[dict]) -> List[dict]:
+    """
+    The latest turns whose history fits in `CONVERSATION_MAX_TOKENS`.
+    """
+    while (
+        turns
+        and estimate_tokens(format_history(turns)) > settings.CONVERSATION_MAX_TOKENS
+    ):
+        turns = turns[1:]
+    return turns
+
+
+async def create_conversation() -> str:
+    async with AsyncSession(async_engine) as session:
+        # Conversations idle for longer than the TTL are removed on the way
+        await session.exec(
+            delete(Conversation).where(Conversation.updated_at < _oldest_conversation())
+        )
+        conversation_id = secrets.token_urlsafe(16)
+        session.add(Conversation(id=conversation_id))
+        await session.commit()
+    return conversation_id
+
+
+async def _get_conversation(
+    session: AsyncSession, conversation_id: str, for_update: bool = False
+) -> Conversation:
+    statement = select(Conversation).where(
+        Conversation.id == conversation_id,
+        Conversation.updated_at >= _oldest_conversation(),
+    )
+    if for_update:
+        statement = statement.with_for_update()
+    conversation = (await session.exec(statement)).first()
+    if conversation is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="That conversation has expired. Please start a new one.",
+        )
+    return conversation
+
+
+async def get_turns(conversation_id: str) -> List[dict]:
+    async with AsyncSession(async_engine) as session:
+        return (await _get_conversation(session, conversation_id)).turns
+
+
+async def add_turn(
+    conversation_id: str, question: str, sql: str, params: dict, summary: str
+) -> None:
+    """
+    Appends a question to its conversation, dropping the oldest turns that no
+    longer fit in the token budget.
+    """
+    sql = " ".join(sql.split())
+    if params:
+        sql += f" -- {json.dumps(params, default=str)}"
+    turn = {"question": question, "sql": sql, "summary": summary}
+    async with AsyncSession(async_engine) as session:
+        # Locked so that concurrent questions in one conversation both get added
+        conversation = await _get_conversation(session, conversation_id, for_update=True)
+        conversation.turns = trim_turns([*conversation.turns, turn])
+        conversation.updated_at = datetime.utcnow()
+        session.add(conversation)
+        await session.commit()
+
+
+async def delete_conversation(conversation_id: str) -> None:
+    async with AsyncSession(async_engine) as session:
+        await session.exec(delete(Conversation).where(Conversation.id == conversation_id))
+        await session.commit()
@@ -0,0 +1,81 @@
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import List, Optional
+
+MATCH_KEYS = {
+    "match_date",
+    "home_team_name",
+    "away_team_name",
+    "full_time_home_goals",
+    "full_time_away_goals",
+}
+
+
+def _label(key: str) -> str:
+    return key.replace("_", " ").capitalize()
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return "N/A"
+    if isinstance(value, bool):
+        return "Yes" if value else "No"
+    if isinstance(value, (float, Decimal)):
+        return f"{round(float(value), 2):g}"
+    if isinstance(value, (date, datetime, time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def _format_match(row: dict) -> str:
+    line = (
+        f"*{_format_value(row['match_date'])}*: {row['home_team_name']} "
+        f"**{row['full_time_home_goals']} - {row['full_time_away_goals']}** "
+        f"{row['away_team_name']}"
+    )
+    if row.get("season_name"):
+        line += f" ({row['season_name']})"
+    return f"- {line}"
+
+
+def format_answer(answer_dicts: List[dict]) -> Optional[str]:
+    """
+    Renders the Markdown answer for result shapes that do not need the model:
+    no rows, a single value, a single row, a list of matches and label/count
+    pairs. Returns None for anything else so the caller can fall back to
+    `get_answer`.
+    """
+    if not answer_dicts:
+        return "I couldn't find any data matching that question."
+
+    first = answer_dicts[0]
+    if MATCH_KEYS <= first.keys():
+        count = len(answer_dicts)
+        header = "Here is the match:" if count == 1 else f"Here are the {count} matches:"
+        return "\n".join([header, ""] + [_format_match(row) for row in answer_dicts])
+
+    if len(answer_dicts) == 1:
+        if len(first) == 1:
+            key, value = next(iter(first.items()))
+            return f"**{_label(key)}**: {_format_value(value)}"
+        return "\n".join(
+            f"- **{_label(key)}**: {_format_value(value)}" for key, value in first.items()
+        )
+
+    # Grouped counts, e.g. [{"team": "Arsenal", "wins": 26}, ...]
+    if len(first) == 2:
+        label_key, value_key = first.keys()
+        if all(
+            isinstance(row[label_key], str) and _is_number(row[value_key])
+            for row in answer_dicts
+        ):
+            return "\n".join(
+                f"- **{row[label_key]}**: {_format_value(row[value_key])}"
+                for row in answer_dicts
+            )
+
+    return None
@@ -0,0 +1,172 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator, Deque, Optional
+
+from app.api.querying.sandbox import reject_query
+from app.core.metrics import Counter, Gauge, Histogram
+from fastapi import status
+
+IN_FLIGHT = Gauge("llm_gateway_in_flight", "LLM calls currently running.")
+QUEUE_DEPTH = Gauge("llm_gateway_queue_depth", "LLM calls waiting for a free slot.")
+WAIT_SECONDS = Histogram(
+    "llm_gateway_wait_seconds", "Time LLM calls spent waiting for a free slot."
+)
+REJECTIONS = Counter(
+    "llm_gateway_rejections_total",
+    "LLM calls rejected without calling the provider.",
+    labels=("reason",),
+)
+FAILURES = Counter("llm_gateway_failures_total", "LLM calls that failed at the provider.")
+CIRCUIT_OPEN = Gauge("llm_gateway_circuit_open", "1 while the circuit breaker is open.")
+
+
+class LLMGateway:
+    """
+    Limits the calls to the LLM provider to `max_in_flight` at a time. Calls over
+    the limit wait in a queue of at most `max_queue` for up to `queue_timeout`
+    seconds, and are rejected with a 503 straight away once the queue is full.
+
+    After `failure_threshold` consecutive provider failures the circuit opens and
+    calls are rejected for `reset_timeout` seconds. The first call after that is
+    let through as a trial, and closes the circuit again if it succeeds.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float,
+        failure_threshold: int,
+        reset_timeout: float,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        # Futures are created on the running loop when needed, so the gateway is
+        # not tied to one event loop like an asyncio.Semaphore would be
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def _reject(self, reason: str, message: str):
+        REJECTIONS.inc(reason=reason)
+        return reject_query(status.HTTP_503_SERVICE_UNAVAILABLE, f"llm_{reason}", message)
+
+    def _update_gauges(self) -> None:
+        IN_FLIGHT.set(self.in_flight)
+        QUEUE_DEPTH.set(self.queue_depth)
+        CIRCUIT_OPEN.set(1 if self.opened_at is not None else 0)
+
+    def _check_circuit(self) -> bool:
+        """
+        Returns whether this call is the trial call of a half-open circuit.
+        """
+        if self.opened_at is None:
+            return False
+        if monotonic() - self.opened_at < self.reset_timeout or self._trial_running:
+            raise self._reject(
+                "circuit_open",
+                "The service is temporarily unavailable. Please try again later.",
+            )
+        self._trial_running = True
+        return True
+
+    async def _acquire(self) -> None:
+        if self.in_flight < self.max_in_flight and not self.queue_depth:
+            self.in_flight += 1
+            return
+        if self.queue_depth >= self.max_queue:
+            raise self._reject(
+                "queue_full", "The service is busy right now. Please try again shortly."
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._update_gauges()
+        start = monotonic()
+        try:
+            # `_release` hands its slot over by resolving the future
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject(
+                "queue_timeout",
+                "The service is busy right now. Please try again shortly.",
+            )
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            WAIT_SECONDS.observe(monotonic() - start)
+            self._update_gauges()
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _record(self, success: bool, trial: bool) -> None:
+        if trial:
+            self._trial_running = False
+        if success:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            return
+        FAILURES.inc()
+        self.consecutive_failures += 1
+        if trial or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = monotonic()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Holds a slot for the duration of one provider call (including reading a
+        streamed response). Exceptions raised inside count as provider failures.
+        """
+        trial = self._check_circuit()
+        try:
+            await self._acquire()
+        except BaseException:
+            if trial:
+                self._trial_running = False
+            raise
+        self._update_gauges()
+        try:
+            yield
+        except (asyncio.CancelledError, GeneratorExit):
+            # The caller went away, which says nothing about the provider
+            if trial:
+                self._trial_running = False
+            raise
+        except Exception:
+            self._record(success=False, trial=trial)
+            raise
+        else:
+            self._record(success=True, trial=trial)
+        finally:
+            self._release()
+            self._update_gauges()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "consecutive_failures": self.consecutive_failures,
+            "circuit_open": self.opened_at is not None,
+        }
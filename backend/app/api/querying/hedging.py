@@ -0,0 +1,124 @@
+import asyncio
+from collections import deque
+from time import monotonic
+from typing import Awaitable, Callable, Deque, Optional, TypeVar
+
+from app.core.metrics import Counter
+
+HEDGED_CALLS = Counter(
+    "llm_hedged_calls_total",
+    "Calls that sent a second request, by the request that answered first.",
+    labels=("winner",),
+)
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """
+    Latencies of the most recent `window` calls.
+    """
+
+    def __init__(self, window: int):
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._latencies.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, percentile: float) -> float:
+        ordered = sorted(self._latencies)
+        index = round(percentile / 100 * (len(ordered) - 1))
+        return ordered[min(max(index, 0), len(ordered) - 1)]
+
+
+class Hedger:
+    """
+    Runs a call and, if it has not answered by the `percentile` of its recent
+    latencies, sends the alternate call too and takes whichever answers first.
+    The other one is cancelled. An early failure of the primary fires the
+    alternate straight away. Until `min_samples` latencies have been seen the
+    deadline is `default_delay`.
+    """
+
+    def __init__(
+        self,
+        percentile: float,
+        default_delay: float,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        self.percentile = percentile
+        self.default_delay = default_delay
+        self.min_samples = min_samples
+        self.latencies = LatencyTracker(window)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def deadline(self) -> float:
+        if len(self.latencies) < self.min_samples:
+            return self.default_delay
+        return self.latencies.percentile(self.percentile)
+
+    async def run(
+        self,
+        primary: Callable[[], Awaitable[T]],
+        alternate: Optional[Callable[[], Awaitable[T]]] = None,
+    ) -> T:
+        self.calls += 1
+        if alternate is None:
+            return await self._timed(primary)
+
+        primary_task = asyncio.ensure_future(self._timed(primary))
+        alternate_task: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=self.deadline())
+            if done and not primary_task.exception():
+                return primary_task.result()
+
+            self.hedged += 1
+            alternate_task = asyncio.ensure_future(alternate())
+            tasks = {primary_task, alternate_task}
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        winner = "hedge" if task is alternate_task else "primary"
+                        if winner == "hedge":
+                            self.hedge_wins += 1
+                        HEDGED_CALLS.inc(winner=winner)
+                        return task.result()
+            # Both failed, report the primary's error
+            HEDGED_CALLS.inc(winner="none")
+            return primary_task.result()
+        finally:
+            # Cancels the loser, or both if the caller went away
+            primary_task.cancel()
+            if alternate_task is not None:
+                alternate_task.cancel()
+
+    async def _timed(self, call: Callable[[], Awaitable[T]]) -> T:
+        start = monotonic()
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            # A cancelled call took at least this long, leaving it out would
+            # pull the deadline down to the calls that were fast enough
+            self.latencies.record(monotonic() - start)
+            raise
+        self.latencies.record(monotonic() - start)
+        return result
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": self.hedge_wins / self.hedged if self.hedged else 0.0,
+            "deadline_seconds": self.deadline(),
+        }
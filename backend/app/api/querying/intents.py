@@ -0,0 +1,203 @@
+import re
+import time
+from typing import Dict, List, Optional
+
+from app.api.querying.normalize import normalize_question
+from app.core.config import settings
+from app.core.db import async_engine, get_data_version
+from app.models import Referee, Season, Team
+from pydantic import BaseModel
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+class QueryPlan(BaseModel):
+    """
+    SQL to run for a question, along with how it was produced ("rule" when a
+    template matched, "llm" otherwise).
+    """
+
+    sql: str
+    params: Dict[str, object] = {}
+    path: str = "llm"
+    intent: Optional[str] = None
+    # Model that wrote the SQL on the "llm" path
+    model: Optional[str] = None
+
+
+class EntityNames(BaseModel):
+    # Normalized name -> name as stored in the database
+    teams: Dict[str, str]
+    referees: Dict[str, str]
+    seasons: Dict[str, str]
+
+
+_entity_names: Optional[EntityNames] = None
+_entity_names_version: Optional[int] = None
+_entity_names_loaded_at = float("-inf")
+
+# Questions that ask for an aggregate, a statistic or a relative date need the
+# LLM, even when they mention the same entities as one of the templates below
+_NEEDS_LLM = re.compile(
+    r"\b(how many|how much|most|least|average|avg|total|percent|percentage|odds|"
+    r"cards?|shots?|corners?|fouls?|goals?|biggest|highest|lowest|streak|longest|"
+    r"top|first|never|ever|only|without|unbeaten|half time|halftime|"
+    r"(this|last|current|previous|next) (season|year)|season (after|before)|"
+    r"recent|recently|today|yesterday|week|month|since|before|after|until)\b"
+)
+# Outcome filters that the match templates cannot express (the season winner
+# template is the only one that handles "won")
+_OUTCOME = re.compile(
+    r"\b(win|wins|won|beat|beaten|beats|lost|lose|loses|loss|losses|draw|draws|"
+    r"drew|home|away|at)\b"
+)
+_SEASON = re.compile(r"\b(?:19|20)?(\d{2})(?:/| )(?:19|20)?(\d{2})\b")
+_LAST_N = re.compile(r"\blast (\d+ )?(?:matches|match|games|game|results|fixtures)\b")
+_SEASON_WINNER = re.compile(
+    r"\b(who won|winners?|champions|won the (?:league|title|prem|premier league))\b"
+)
+_HEAD_TO_HEAD = re.compile(
+    r"\b(vs|v|versus|against|and|head to head|h2h|between|play|played|meet|met)\b"
+)
+_MATCHES = re.compile(r"\b(results?|matches|games|fixtures|record|refereed|officiated)\b")
+MAX_LAST_N = 50
+
+MATCH_ORDER = " ORDER BY match_date DESC, match_time DESC"
+SEASON_WINNER_SQL = """
+SELECT team, SUM(points) AS points, SUM(goal_difference) AS goal_difference
+FROM (
+    SELECT home_team_name AS team,
+        CASE full_time_result WHEN 'H' THEN 3 WHEN 'D' THEN 1 ELSE 0 END AS points,
+        full_time_home_goals - full_time_away_goals AS goal_difference
+    FROM "match" WHERE season_name = :season
+    UNION ALL
+    SELECT away_team_name AS team,
+        CASE full_time_result WHEN 'A' THEN 3 WHEN 'D' THEN 1 ELSE 0 END AS points,
+        full_time_away_goals - full_time_home_goals AS goal_difference
+    FROM "match" WHERE season_name = :season
+) AS standings
+GROUP BY team
+ORDER BY points DESC, goal_difference DESC
+LIMIT 1
+"""
+
+
+async def get_entity_names() -> EntityNames:
+    """
+    Team, referee and season names, loaded once per data version and at least
+    every `ENTITY_NAMES_TTL_SECONDS`.
+    """
+    global _entity_names, _entity_names_version, _entity_names_loaded_at
+    version = await get_data_version()
+    expired = (
+        time.monotonic() - _entity_names_loaded_at >= settings.ENTITY_NAMES_TTL_SECONDS
+    )
+    if _entity_names is None or _entity_names_version != version or expired:
+        async with AsyncSession(async_engine) as session:
+            teams = (await session.exec(select(Team.name))).all()
+            referees = (await session.exec(select(Referee.name))).all()
+            seasons = (await session.exec(select(Season.name))).all()
+        _entity_names = EntityNames(
+            teams={normalize_question(name): name for name in teams},
+            referees={normalize_question(name): name for name in referees},
+            seasons={name.lower(): name for name in seasons},
+        )
+        _entity_names_version = version
+        _entity_names_loaded_at = time.monotonic()
+    return _entity_names
+
+
+def find_names(question: str, names: Dict[str, str]) -> List[str]:
+    """
+    Database names mentioned in a normalized question, in order of appearance.
+    """
+    if not names:
+        return []
+    pattern = (
+        r"\b("
+        + "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+        + r")\b"
+    )
+    return [names[m.group(1)] for m in re.finditer(pattern, question)]
+
+
+def find_season(question: str, seasons: Dict[str, str]) -> Optional[str]:
+    for m in _SEASON.finditer(question):
+        start, end = int(m.group(1)), int(m.group(2))
+        if (start + 1) % 100 != end:
+            continue
+        year = (2000 if start < 50 else 1900) + start
+        name = f"english premier league {year}/{end:02d} season"
+        if name in seasons:
+            return seasons[name]
+    return None
+
+
+def match_intent(question: str, names: EntityNames) -> Optional[QueryPlan]:
+    """
+    Matches the common question shapes that can be answered from a template:
+    season winner, last N matches of a team, head-to-head, a team's results in a
+    season and a referee's matches. Returns None for everything else.
+    """
+    question = normalize_question(question)
+    if _NEEDS_LLM.search(question):
+        return None
+
+    season = find_season(question, names.seasons)
+    # Strip the season so that its digits are not read as anything else
+    question = _SEASON.sub(" ", question)
+    teams = list(dict.fromkeys(find_names(question, names.teams)))
+    referees = find_names(question, names.referees)
+
+    if not teams and not referees and season and _SEASON_WINNER.search(question):
+        return QueryPlan(
+            sql=SEASON_WINNER_SQL.strip(),
+            params={"season": season},
+            path="rule",
+            intent="season_winner",
+        )
+
+    last_n = _LAST_N.search(question)
+    # Any other number (a year, a date, a score) is a filter the templates lack
+    if _OUTCOME.search(question) or re.search(r"\d", _LAST_N.sub(" ", question)):
+        return None
+
+    filters: List[str] = []
+    params: Dict[str, object] = {}
+    if season:
+        filters.append("season_name = :season")
+        params["season"] = season
+
+    limit = ""
+    if last_n:
+        n = int(last_n.group(1)) if last_n.group(1) else 1
+        if n < 1 or n > MAX_LAST_N:
+            return None
+        limit = " LIMIT :limit"
+        params["limit"] = n
+
+    if len(teams) == 2 and not referees and (last_n or _HEAD_TO_HEAD.search(question)):
+        filters.insert(
+            0,
+            "((home_team_name = :team_a AND away_team_name = :team_b)"
+            " OR (home_team_name = :team_b AND away_team_name = :team_a))",
+        )
+        params.update(team_a=teams[0], team_b=teams[1])
+        intent = "head_to_head"
+    elif (
+        len(teams) == 1
+        and not referees
+        and (last_n or (season and _MATCHES.search(question)))
+    ):
+        filters.insert(0, "(home_team_name = :team OR away_team_name = :team)")
+        params["team"] = teams[0]
+        intent = "last_matches" if last_n else "team_season_results"
+    elif len(referees) == 1 and not teams and (last_n or _MATCHES.search(question)):
+        filters.insert(0, "referee_name = :referee")
+        params["referee"] = referees[0]
+        intent = "referee_matches"
+    else:
+        return None
+
+    sql = 'SELECT * FROM "match" WHERE ' + " AND ".join(filters) + MATCH_ORDER + limit
+    return QueryPlan(sql=sql, params=params, path="rule", intent=intent)
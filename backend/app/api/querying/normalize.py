@@ -0,0 +1,110 @@
+import re
+
+# Common ways people refer to teams, folded into the name stored in the `team` table.
+# The keys are lowercase and already stripped of punctuation. Canonical names are
+# mapped to themselves so that a shorter alias never matches inside them.
+TEAM_ALIASES = {
+    "man united": "manchester united",
+    "man utd": "manchester united",
+    "man u": "manchester united",
+    "manchester utd": "manchester united",
+    "man city": "manchester city",
+    "spurs": "tottenham hotspur",
+    "tottenham": "tottenham hotspur",
+    "tottenham hotspur": "tottenham hotspur",
+    "nottm forest": "nottingham forest",
+    "forest": "nottingham forest",
+    "nottingham forest": "nottingham forest",
+    "queens park rangers": "qpr",
+    "wolverhampton wanderers": "wolves",
+    "wolverhampton": "wolves",
+    "west ham united": "west ham",
+    "newcastle united": "newcastle",
+    "brighton and hove albion": "brighton",
+    "brighton hove albion": "brighton",
+    "leicester city": "leicester",
+    "leeds united": "leeds",
+    "norwich city": "norwich",
+    "stoke city": "stoke",
+    "swansea city": "swansea",
+    "cardiff city": "cardiff",
+    "hull city": "hull",
+    "sheffield utd": "sheffield united",
+    "sheff utd": "sheffield united",
+    "sheffield wednesday": "sheffield weds",
+    "west bromwich albion": "west brom",
+    "blackburn rovers": "blackburn",
+    "bolton wanderers": "bolton",
+    "ipswich town": "ipswich",
+    "luton town": "luton",
+    "huddersfield town": "huddersfield",
+    "afc bournemouth": "bournemouth",
+    "the gunners": "arsenal",
+    "gunners": "arsenal",
+    "villa": "aston villa",
+    "aston villa": "aston villa",
+    "palace": "crystal palace",
+    "crystal palace": "crystal palace",
+    # Names that contain an alias but are not the team it stands for
+    "forest green": "forest green",
+    "forest green rovers": "forest green rovers",
+    "villa park": "villa park",
+}
+
+# Longest aliases first so that "nottingham forest" wins over "forest"
+_ALIAS_PATTERN = re.compile(
+    r"\b("
+    + "|".join(re.escape(a) for a in sorted(TEAM_ALIASES, key=len, reverse=True))
+    + r")\b"
+)
+# Comparison operators and decimal points change what a question asks for, every
+# other symbol is dropped
+_PUNCTUATION = re.compile(r"(?<!\d)\.|\.(?!\d)|!(?!=)|[^a-zA-Z0-9/<>=!. ]+")
+_OPERATOR = re.compile(r"\s*([<>=!]+)\s*")
+_WHITESPACE = re.compile(r"\s+")
+# Quoted literals and identifiers, which must be kept verbatim
+_SQL_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+
+
+def _is_capitalized(word: str) -> bool:
+    return word[:1].isupper()
+
+
+def _fold_alias(cased: str, match: re.Match) -> str:
+    """
+    The canonical name for an alias found in the question, unless a capitalized
+    word next to it makes it part of a longer name, as in "Villa Park". The first
+    word of the question is capitalized anyway and doesn't count.
+    """
+    alias = match.group(1)
+    before = cased[: match.start()].split()
+    after = cased[match.end() :].split()
+    in_longer_name = (after and _is_capitalized(after[0])) or (
+        len(before) > 1 and _is_capitalized(before[-1])
+    )
+    return alias if in_longer_name else TEAM_ALIASES[alias]
+
+
+def normalize_question(question: str) -> str:
+    """
+    Folds a question into a canonical form so that trivially different phrasings
+    ("Who won the 2015/16 season?" vs "who won the 2015/16 season") compare equal.
+    Team aliases are folded only where they are a whole team name.
+    """
+    cased = question.replace("&", " and ").replace("-", " ")
+    cased = _PUNCTUATION.sub("", cased)
+    cased = _OPERATOR.sub(r" \1 ", cased)
+    cased = _WHITESPACE.sub(" ", cased).strip()
+    # Only ASCII is left, so the offsets of `cased` and its lowercase match
+    return _ALIAS_PATTERN.sub(lambda m: _fold_alias(cased, m), cased.lower())
+
+
+def canonicalize_sql(sql: str) -> str:
+    """
+    Folds SQL text that only differs in case, whitespace or a trailing semicolon
+    into one string. Anything inside quotes is left untouched.
+    """
+    parts = _SQL_QUOTED.split(sql.strip().rstrip(";").strip())
+    for i in range(0, len(parts), 2):
+        parts[i] = _WHITESPACE.sub(" ", parts[i].lower())
+    return "".join(parts).strip()
@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.api.querying.intents import QueryPlan
+from app.api.querying.normalize import normalize_question
+from app.core.config import settings
+from app.core.db import async_engine
+from app.models import PrecomputedPlan
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+def _oldest_plan() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.PRECOMPUTED_PLAN_TTL_SECONDS)
+
+
+async def get_precomputed_plan(user_question: str) -> Optional[QueryPlan]:
+    statement = select(PrecomputedPlan.plan).where(
+        PrecomputedPlan.question == normalize_question(user_question),
+        PrecomputedPlan.created_at >= _oldest_plan(),
+    )
+    async with AsyncSession(async_engine) as session:
+        plan = (await session.exec(statement)).first()
+    return None if plan is None else QueryPlan.model_validate(plan)
+
+
+async def save_precomputed_plan(user_question: str, plan: QueryPlan) -> None:
+    """
+    Stores the plan of a question for every worker, replacing the one of the
+    previous run. Plans past their TTL are deleted on the way.
+    """
+    now = datetime.utcnow()
+    values = {"plan": plan.model_dump(mode="json"), "created_at": now}
+    statement = insert(PrecomputedPlan).values(
+        question=normalize_question(user_question), **values
+    )
+    statement = statement.on_conflict_do_update(index_elements=["question"], set_=values)
+    async with AsyncSession(async_engine) as session:
+        await session.exec(
+            delete(PrecomputedPlan).where(PrecomputedPlan.created_at < _oldest_plan())
+        )
+        await session.exec(statement)
+        await session.commit()
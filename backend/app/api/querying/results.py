@@ -0,0 +1,106 @@
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from app.api.querying.validation import tokenize
+from app.core.config import settings
+from app.models import ResultHandle
+from fastapi import HTTPException, status
+from sqlmodel import delete, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+PAGE_SQL = "{sql} LIMIT :_page_limit OFFSET :_page_offset"
+# SQL with a LIMIT of its own is limited first and paged as a subquery, which is
+# scanned in the order the SQL sorted it
+LIMITED_PAGE_SQL = (
+    "SELECT * FROM ({sql}) AS result LIMIT :_page_limit OFFSET :_page_offset"
+)
+# Clauses that can follow ORDER BY at the end of a statement
+_TAIL = {"limit", "offset", "fetch", "for"}
+
+
+def _oldest_handle() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.RESULT_HANDLE_TTL_SECONDS)
+
+
+def _clauses(sql: str) -> Tuple[bool, Optional[int]]:
+    """
+    Whether the statement ends in an ORDER BY, and where its LIMIT, OFFSET,
+    FETCH or FOR clause starts (None without one).
+    """
+    tokens, _ = tokenize(sql)
+    depth = 0
+    order_by, tail = False, None
+    for i, token in enumerate(tokens):
+        if token.value == "(":
+            depth += 1
+        elif token.value == ")":
+            depth -= 1
+        elif depth == 0 and token.word == "order" and i + 1 < len(tokens):
+            if tokens[i + 1].word == "by":
+                order_by, tail = True, None
+        elif depth == 0 and tail is None and token.word in _TAIL:
+            tail = token.start
+    return order_by, tail
+
+
+def ordered_sql(sql: str, column_count: int) -> str:
+    """
+    The SQL sorted by its own ORDER BY and then by every output column, by
+    position, so that its rows come back in the same order on every run. Rows
+    equal in every column cannot be told apart anyway.
+    """
+    if column_count == 0 or tokenize(sql)[1] is not None:
+        return sql
+    order_by, tail = _clauses(sql)
+    columns = ", ".join(str(position) for position in range(1, column_count + 1))
+    end = len(sql) if tail is None else tail
+    keys = f", {columns}" if order_by else f" ORDER BY {columns}"
+    return f"{sql[:end].rstrip()}{keys} {sql[end:]}".rstrip()
+
+
+async def create_result_handle(
+    session: AsyncSession, sql: str, params: dict, column_count: int
+) -> ResultHandle:
+    """
+    Stores the SQL of a large result, in an order that stays the same between
+    pages, and returns the handle its pages are fetched with. Expired handles
+    are removed on the way.
+    """
+    await session.exec(
+        delete(ResultHandle).where(ResultHandle.created_at < _oldest_handle())
+    )
+    handle = ResultHandle(
+        id=secrets.token_urlsafe(16),
+        sql=ordered_sql(sql, column_count),
+        params=params,
+    )
+    session.add(handle)
+    await session.commit()
+    await session.refresh(handle)
+    return handle
+
+
+async def get_result_handle(session: AsyncSession, handle_id: str) -> ResultHandle:
+    statement = select(ResultHandle).where(
+        ResultHandle.id == handle_id, ResultHandle.created_at >= _oldest_handle()
+    )
+    handle = (await session.exec(statement)).first()
+    if handle is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="That result has expired. Please ask the question again.",
+        )
+    return handle
+
+
+def page_query(handle: ResultHandle, offset: int, limit: int) -> Tuple[str, dict]:
+    """
+    SQL and parameters for `limit` rows of a result starting at `offset`. Rows
+    keep the order of the stored SQL. Every page runs the SQL again, so that no
+    worker has to hold the rows.
+    """
+    params = {**handle.params, "_page_limit": limit, "_page_offset": offset}
+    _, tail = _clauses(handle.sql)
+    page_sql = PAGE_SQL if tail is None else LIMITED_PAGE_SQL
+    return page_sql.format(sql=handle.sql), params
@@ -0,0 +1,53 @@
+import re
+
+from app.api.querying.schema import select_schema_groups
+from app.core.config import settings
+from app.core.metrics import Counter
+
+ROUTED_QUESTIONS = Counter(
+    "nl_sql_routed_questions_total",
+    "Questions sent to each NL-to-SQL model by the complexity router.",
+    labels=("model",),
+)
+ESCALATIONS = Counter(
+    "nl_sql_escalations_total",
+    "Questions escalated from the small to the large NL-to-SQL model.",
+    labels=("reason",),
+)
+
+# Analytical phrasing that usually means grouping, window functions or subqueries
+_ANALYTICAL = re.compile(
+    r"\b(average|avg|mean|percent|percentage|ratio|rate|per (game|match|season)|"
+    r"most|least|highest|lowest|biggest|fewest|best|worst|streak|consecutive|"
+    r"in a row|rank|ranking|table|standings|more than|fewer than|less than|"
+    r"difference|compared?|comparison|both|each|every|top \d+|without|never|"
+    r"unbeaten|cumulative|running|since|between .* and)\b"
+)
+LONG_QUESTION_WORDS = 15
+
+
+def score_complexity(question: str) -> int:
+    """
+    Cheap estimate of how hard a question is to turn into SQL: one point per
+    optional schema group it needs, two per analytical phrase and one more for
+    long questions.
+    """
+    question = question.lower()
+    score = len(select_schema_groups(question))
+    score += 2 * len(_ANALYTICAL.findall(question))
+    if len(question.split()) > LONG_QUESTION_WORDS:
+        score += 1
+    return score
+
+
+def route_sql_model(question: str) -> str:
+    """
+    The model that should write the SQL for a question: `SQL_SMALL_MODEL` for
+    simple questions when it is configured, `SQL_MODEL` otherwise.
+    """
+    if (
+        settings.SQL_SMALL_MODEL
+        and score_complexity(question) <= settings.SQL_SMALL_MODEL_MAX_COMPLEXITY
+    ):
+        return settings.SQL_SMALL_MODEL
+    return settings.SQL_MODEL
@@ -0,0 +1,135 @@
+from functools import lru_cache
+from operator import itemgetter
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import Row
+
+
+excluded_odds = {
+    "interwetten_home_win_odds",
+    "interwetten_draw_odds",
+    "interwetten_away_win_odds",
+    "pinnacle_home_win_odds",
+    "pinnacle_draw_odds",
+    "pinnacle_away_win_odds",
+    "william_hill_home_win_odds",
+    "william_hill_draw_odds",
+    "william_hill_away_win_odds",
+    "asian_handicap_home_win_odds",
+    "asian_handicap_draw_odds",
+    "asian_handicap_away_win_odds",
+    "bet365_over_2_5_odds",
+    "bet365_under_2_5_odds",
+    "pinnacle_over_2_5_odds",
+    "pinnacle_under_2_5_odds",
+    "max_over_2_5_odds",
+    "max_under_2_5_odds",
+    "avg_over_2_5_odds",
+    "avg_under_2_5_odds",
+}
+
+
+class ConvertedRows(NamedTuple):
+    # Every column of every row, in the order of the SQL
+    data: List[dict]
+    # The rows without ids and odds, newest match first when sorted
+    essentials: List[dict]
+    # Length of `essentials` as JSON, counting stops once past the size limit
+    size: int
+
+
+@lru_cache(maxsize=256)
+def essential_columns(keys: Tuple[str, ...]) -> Tuple[int, ...]:
+    """
+    Indexes of the columns that are kept in the essentials of rows with these
+    keys. Worked out once per result shape instead of once per row.
+    """
+    return tuple(
+        index
+        for index, key in enumerate(keys)
+        if key != "id" and key not in excluded_odds
+    )
+
+
+def _sort_by_date(essentials: List[dict], essential_keys: List[str]) -> None:
+    if "match_date" in essential_keys:
+        # Dates the SQL already ordered are a single run for the sort
+        essentials.sort(key=itemgetter("match_date"), reverse=True)
+
+
+def json_size(value) -> int:
+    """
+    Length of `json.dumps(value, default=str)` for a single column value,
+    without building the string. Escaped characters are counted as one.
+    """
+    if value is None or value is True:
+        return 4
+    if value is False:
+        return 5
+    if isinstance(value, (int, float)):
+        return len(repr(value))
+    # Strings are quoted, everything else is quoted after `default=str`
+    return len(value if isinstance(value, str) else str(value)) + 2
+
+
+def _row_size(keys: Sequence[str], indexes: Iterable[int], row: Sequence) -> int:
+    # {"key": value, "key": value}
+    size = 2
+    for count, index in enumerate(indexes):
+        size += (2 if count else 0) + len(keys[index]) + 4 + json_size(row[index])
+    return size
+
+
+def convert_rows(
+    results: List[Row], sort: bool = True, size_limit: Optional[int] = None
+) -> ConvertedRows:
+    """
+    Converts result rows to dicts in a single pass: the full rows for the
+    response and their essentials for the answer model, along with the size of
+    the essentials as JSON. Once the size is past `size_limit` it is no longer
+    counted, since all that is left to know is that the result is too long.
+    """
+    if not results:
+        return ConvertedRows([], [], 2)
+
+    keys = tuple(results[0]._fields)
+    indexes = essential_columns(keys)
+    essential_keys = [keys[index] for index in indexes]
+    everything = len(indexes) == len(keys)
+
+    data = []
+    essentials = []
+    # [row, row]
+    size = 2 + 2 * (len(results) - 1)
+    for row in results:
+        full = dict(zip(keys, row))
+        data.append(full)
+        # Rows without ids or odds share the dict, nothing mutates them
+        essentials.append(
+            full
+            if everything
+            else dict(zip(essential_keys, [row[index] for index in indexes]))
+        )
+        if size_limit is None or size <= size_limit:
+            size += _row_size(keys, indexes, row)
+
+    if sort:
+        _sort_by_date(essentials, essential_keys)
+    return ConvertedRows(data, essentials, size)
+
+
+def convert_rows_to_essentials(results: List[Row], sort: bool = True) -> List[dict]:
+    """
+    The rows without ids and odds, newest match first when `sort` is set.
+    """
+    if not results:
+        return []
+    keys = tuple(results[0]._fields)
+    indexes = essential_columns(keys)
+    essential_keys = [keys[index] for index in indexes]
+    essentials = [
+        dict(zip(essential_keys, [row[index] for index in indexes])) for row in results
+    ]
+    if sort:
+        _sort_by_date(essentials, essential_keys)
+    return essentials
@@ -0,0 +1,98 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+
+from app.core.config import settings
+from fastapi import HTTPException, status
+from psycopg import errors as pg_errors
+from sqlalchemy import Row, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncResult
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+def reject_query(status_code: int, code: str, message: str, **extra) -> HTTPException:
+    return HTTPException(
+        status_code=status_code, detail={"code": code, "message": message, **extra}
+    )
+
+
+async def estimate_cost(session: AsyncSession, sql_query: str, params: dict) -> float:
+    plan = (
+        await session.exec(text(f"EXPLAIN (FORMAT JSON) {sql_query}"), params=params)
+    ).scalar_one()
+    return float(plan[0]["Plan"]["Total Cost"])
+
+
+@asynccontextmanager
+async def guarded_result(
+    session: AsyncSession, sql_query: str, params: Optional[dict] = None
+) -> AsyncIterator[AsyncResult]:
+    """
+    Runs model generated SQL in a read-only transaction with a statement timeout
+    and yields its rows as a server-side cursor. The plan is costed with EXPLAIN
+    first and rejected above `NL_QUERY_MAX_COST`.
+    """
+    if not sql_query.lstrip(" \n\t(").lower().startswith(("select", "with")):
+        raise reject_query(
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            "query_not_read_only",
+            "Only questions that read data can be answered.",
+        )
+
+    timeout_ms = int(settings.NL_QUERY_STATEMENT_TIMEOUT_MS)
+    if session.in_transaction():
+        await session.rollback()
+
+    try:
+        await session.exec(text("SET TRANSACTION READ ONLY"))
+        await session.exec(text(f"SET LOCAL statement_timeout = {timeout_ms}"))
+
+        cost = await estimate_cost(session, sql_query, params or {})
+        if cost > settings.NL_QUERY_MAX_COST:
+            raise reject_query(
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+                "query_too_expensive",
+                "That question needs too much work to answer. Try narrowing it down.",
+                estimated_cost=cost,
+                max_cost=settings.NL_QUERY_MAX_COST,
+            )
+
+        result = await session.stream(text(sql_query), params or {})
+        try:
+            yield result
+        finally:
+            await result.close()
+    except DBAPIError as e:
+        if isinstance(e.orig, pg_errors.QueryCanceled):
+            raise reject_query(
+                status.HTTP_504_GATEWAY_TIMEOUT,
+                "query_timeout",
+                "That question took too long to answer. Try narrowing it down.",
+                timeout_ms=timeout_ms,
+            )
+        # Cursors refuse data-modifying CTEs before the read-only check sees them
+        if isinstance(
+            e.orig, (pg_errors.ReadOnlySqlTransaction, pg_errors.FeatureNotSupported)
+        ):
+            raise reject_query(
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+                "query_not_read_only",
+                "Only questions that read data can be answered.",
+            )
+        raise
+    finally:
+        await session.rollback()
+
+
+async def run_guarded_query(
+    session: AsyncSession,
+    sql_query: str,
+    params: Optional[dict] = None,
+    max_rows: Optional[int] = None,
+) -> List[Row]:
+    """
+    Fetches at most `max_rows` (by default `NL_QUERY_MAX_ROWS`) rows of model
+    generated SQL within the limits of `guarded_result`.
+    """
+    async with guarded_result(session, sql_query, params) as result:
+        return await result.fetchmany(max_rows or settings.NL_QUERY_MAX_ROWS)
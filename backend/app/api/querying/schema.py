@@ -0,0 +1,176 @@
+import re
+from functools import lru_cache
+from typing import FrozenSet, Iterable
+
+from app.models import SQLModel
+from sqlalchemy import Column, Date, Float, Integer, Table, Time
+
+# Columns of `match` that are only sent to the model when the question needs them.
+# Everything not listed here (teams, date, goals, results...) is always sent.
+MATCH_STATS_COLUMNS = [
+    "home_shots",
+    "away_shots",
+    "home_shots_on_target",
+    "away_shots_on_target",
+    "home_fouls",
+    "away_fouls",
+    "home_corners",
+    "away_corners",
+    "home_yellow_cards",
+    "away_yellow_cards",
+    "home_red_cards",
+    "away_red_cards",
+]
+
+# Patterns matched at word starts of the lowercased question that pull in a group
+GROUP_KEYWORDS = {
+    "match_stats": [
+        "shots?",
+        "on target",
+        "foul",
+        "corners?",
+        "cards?",
+        "yellows?",
+        "booking",
+        "booked",
+        "sent off",
+        "sending off",
+        "discipline",
+        "dirtiest",
+    ],
+    "odds": [
+        "odds",
+        r"bet(s|ting|365)?\b",
+        "bookmaker",
+        "bookie",
+        "favou?rite",
+        "underdog",
+        "handicap",
+        r"2\.5",
+        "pinnacle",
+        "william hill",
+        "interwetten",
+        "upset",
+    ],
+    "referee": ["refere", r"refs?\b", "officiat", "whistle"],
+    "stadium": ["stadium", "ground", "venue", "arena"],
+    "teamseason": [
+        "teamseason",
+        "relegat",
+        "promot",
+        "participat",
+        "ever played",
+        "teams (in|played|were)",
+        "which teams",
+        "how many (teams|seasons)",
+        "seasons (has|have|did)",
+    ],
+}
+_GROUP_PATTERNS = {
+    group: re.compile(r"\b(" + "|".join(keywords) + ")")
+    for group, keywords in GROUP_KEYWORDS.items()
+}
+SCHEMA_GROUPS = frozenset(GROUP_KEYWORDS)
+# Tables the model may query, the rest are internal to the service
+SCHEMA_TABLES = [
+    "referee",
+    "season",
+    "team",
+    "match",
+    "match_odds",
+    "stadium",
+    "teamseason",
+]
+# Tables the model reads through a view of the same data
+VIEWS = {"match_record": "match"}
+
+_POSTGRES_TYPES = [(Integer, "int4"), (Float, "float8"), (Date, "date"), (Time, "time")]
+_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def select_schema_groups(question: str) -> FrozenSet[str]:
+    """
+    Decides which optional parts of the schema a question needs. Errs on the side
+    of including a group since a missing column makes the model answer "invalid".
+    """
+    question = question.lower()
+    return frozenset(
+        group for group, pattern in _GROUP_PATTERNS.items() if pattern.search(question)
+    )
+
+
+def _column_ddl(column: Column) -> str:
+    if column.primary_key and not column.foreign_keys:
+        column_type = "serial4"
+    else:
+        column_type = next(
+            (
+                name
+                for sa_type, name in _POSTGRES_TYPES
+                if isinstance(column.type, sa_type)
+            ),
+            "varchar",
+        )
+    nullable = "NULL" if column.nullable else "NOT NULL"
+    name = f'"{column.name}"' if column.name == "name" else column.name
+    return f"\t{name} {column_type} {nullable}"
+
+
+def _table_ddl(table: Table, excluded: Iterable[str] = ()) -> str:
+    columns = [c for c in table.columns if c.name not in excluded]
+    lines = [_column_ddl(c) for c in columns]
+    primary_key = ", ".join(c.name for c in table.primary_key.columns)
+    lines.append(f"\tCONSTRAINT {table.name}_pkey PRIMARY KEY ({primary_key})")
+    for column in columns:
+        for fk in column.foreign_keys:
+            target = fk.column
+            target_table = VIEWS.get(target.table.name, target.table.name)
+            lines.append(
+                f"\tCONSTRAINT {table.name}_{column.name}_fkey FOREIGN KEY ({column.name}) "
+                f'REFERENCES public.{target_table}("{target.name}")'
+            )
+
+    name = f'"{table.name}"' if table.name == "match" else table.name
+    ddl = f"CREATE TABLE public.{name} (\n" + ",\n".join(lines) + "\n);"
+    for index in sorted(table.indexes, key=lambda i: i.name):
+        unique = "UNIQUE " if index.unique else ""
+        index_columns = ", ".join(c.name for c in index.columns)
+        ddl += (
+            f"\nCREATE {unique}INDEX {index.name} ON public.{table.name} "
+            f"USING btree ({index_columns});"
+        )
+    return ddl
+
+
+@lru_cache(maxsize=None)
+def build_schema_prompt(groups: FrozenSet[str]) -> str:
+    """
+    DDL for the tables and columns in `groups`, generated from the SQLModel
+    metadata. `match`, `team` and `season` are always included, the betting odds
+    in `match_odds` only for questions about them.
+    """
+    tables = SQLModel.metadata.tables
+    excluded = []
+    if "match_stats" not in groups:
+        excluded += MATCH_STATS_COLUMNS
+    if "referee" not in groups:
+        excluded.append("referee_name")
+
+    parts = []
+    if "referee" in groups:
+        parts.append(_table_ddl(tables["referee"]))
+    parts.append(_table_ddl(tables["season"]))
+    parts.append(_table_ddl(tables["team"]))
+    parts.append(_table_ddl(tables["match"], excluded))
+    if "odds" in groups:
+        parts.append(_table_ddl(tables["match_odds"]))
+    if "stadium" in groups:
+        parts.append(_table_ddl(tables["stadium"]))
+    if "teamseason" in groups:
+        parts.append(_table_ddl(tables["teamseason"]))
+    return "\n\n".join(parts)
+
+
+def estimate_tokens(text: str) -> int:
+    # Llama tokenizers land close to one token per word or punctuation mark
+    return len(_TOKEN.findall(text))
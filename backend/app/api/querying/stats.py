@@ -1,59 +1,656 @@
+import asyncio
 import json
+from contextlib import asynccontextmanager
+from typing import (
+    AsyncContextManager,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    List,
+    Optional,
+    Tuple,
+)
 
+from app.api.querying.answers import answer_key
+from app.api.querying.coalesce import SingleFlight, shared_flight
+from app.api.querying.conversations import (
+    add_turn,
+    create_conversation,
+    delete_conversation,
+    format_history,
+    get_turns,
+    summarize_rows,
+)
+from app.api.querying.formatting import format_answer
+from app.api.querying.intents import QueryPlan, get_entity_names, match_intent
+from app.api.querying.normalize import canonicalize_sql, normalize_question
+from app.api.querying.plans import get_precomputed_plan
+from app.api.querying.routing import ESCALATIONS, route_sql_model
+from app.api.querying.results import create_result_handle, get_result_handle, page_query
+from app.api.querying.rows import convert_rows, convert_rows_to_essentials, json_size
+from app.api.querying.sandbox import guarded_result, reject_query, run_guarded_query
+from app.api.querying.timing import RequestTimer, request_timer, set_outcome, span
 from app.api.querying.utils import (
+    StatsBatchRequest,
     StatsRequest,
-    convert_rows_to_essentials,
+    answer_cache,
     get_answer,
-    get_sql,
+    get_current_date,
+    forget_sql,
+    get_follow_up_sql,
+    get_sql_cached,
+    llm_gateway,
+    repair_sql,
+    result_cache,
+    sql_cache,
+    sql_hedger,
+    stream_answer,
 )
-from app.core.db import get_session
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import text
-from sqlmodel import Session
+from app.api.querying.validation import check_sql
+from app.core.config import settings
+from app.core.db import async_engine, get_data_version
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import Row
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 router = APIRouter()
+stats_flight = SingleFlight()
 
+# Results longer than this as JSON are sent as data instead of being answered
+LONG_RESULT_CHARS = 600
+
+
+def service_error() -> HTTPException:
+    return HTTPException(
+        status_code=400,
+        detail=f"There currently is a problem with the service. Please try again later.",
+    )
 
-@router.post("/ask_stats")
-def get_stats(request: StatsRequest, session: Session = Depends(get_session)):
-    user_question = request.message
+
+async def plan_query(
+    user_question: str,
+    model: Optional[str] = None,
+    turns: Optional[List[dict]] = None,
+    precomputed: bool = True,
+) -> QueryPlan:
+    """
+    Generates the SQL for a question with `model`, or with the template matcher,
+    the plans of `python -m app.precompute` (unless `precomputed` is False) and
+    then the model picked by `route_sql_model` when it is not given.
+    Follow-up questions carry the earlier `turns` of their conversation. They go
+    to the model as chat turns without the schema first, and with the schema and
+    the history in front of the question when that is not enough.
+    """
+    # Common question shapes are answered from templates without the LLM
+    if model is None and not turns:
+        try:
+            with span("intent"):
+                plan = match_intent(user_question, await get_entity_names())
+        except Exception:
+            print("Failed to match the question against the templates.")
+            plan = None
+        if plan is not None:
+            print(f"Matched {plan.intent}: {plan.sql} {plan.params}")
+            return plan
+
+    # Popular questions have their SQL generated ahead of time
+    if model is None and not turns and precomputed:
+        try:
+            with span("precomputed_plan"):
+                plan = await get_precomputed_plan(user_question)
+        except Exception:
+            print("Failed to look up the precomputed plan.")
+            plan = None
+        if plan is not None:
+            return plan
 
     # Convert the natural language question to SQL
+    sql_question = format_history(turns or []) + user_question
+    routed_model = model or route_sql_model(sql_question)
     try:
-        sql_query = get_sql(user_question)
+        with span("get_sql"):
+            sql_query = "invalid"
+            if turns:
+                sql_query = await get_follow_up_sql(turns, user_question, routed_model)
+            if sql_query.lower().strip() == "invalid":
+                sql_query = await get_sql_cached(sql_question, model=model)
+    except HTTPException:
+        # The LLM gateway is overloaded or the provider is down
+        set_outcome("service_error")
+        raise
     except Exception:
         print("Failed to generate the SQL query.")
-        raise HTTPException(
-            status_code=400,
-            detail=f"There currently is a problem with the service. Please try again later.",
-        )
+        set_outcome("service_error")
+        raise service_error()
 
     # If the SQL query is invalid, return an error
     if sql_query.lower().strip() == "invalid":
+        if routed_model != settings.SQL_MODEL:
+            print(f"{routed_model} could not answer, escalating to {settings.SQL_MODEL}")
+            ESCALATIONS.inc(reason="invalid")
+            return await plan_query(user_question, model=settings.SQL_MODEL, turns=turns)
         print("Failed to parse the question")
+        set_outcome("invalid_question")
         raise HTTPException(
             status_code=400,
             detail=f"Sorry, I couldn't understand your question. Please try again.",
         )
 
-    print(sql_query)
+    # Check the SQL locally, so that broken SQL never costs a round trip
+    with span("check_sql"):
+        checked = check_sql(sql_query)
+    if checked.errors and checked.read_only and routed_model != settings.SQL_MODEL:
+        print(
+            f"SQL from {routed_model} failed the checks, escalating to {settings.SQL_MODEL}"
+        )
+        ESCALATIONS.inc(reason="invalid_sql")
+        return await plan_query(user_question, model=settings.SQL_MODEL, turns=turns)
+    if checked.errors and checked.read_only:
+        # One more try, telling the model what is wrong
+        print(f"SQL failed the checks: {checked.errors}")
+        try:
+            with span("repair_sql"):
+                sql_query = await repair_sql(
+                    sql_question, checked.sql, checked.errors, model=routed_model
+                )
+        except HTTPException:
+            set_outcome("service_error")
+            raise
+        except Exception:
+            print("Failed to repair the SQL query.")
+            set_outcome("service_error")
+            raise service_error()
+        checked = check_sql(sql_query)
+
+    if not checked.read_only:
+        set_outcome("sql_error")
+        raise reject_query(
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            "query_not_read_only",
+            "Only questions that read data can be answered.",
+        )
+    if checked.errors:
+        set_outcome("sql_error")
+        raise reject_query(
+            status.HTTP_422_UNPROCESSABLE_ENTITY,
+            "query_invalid_sql",
+            "Sorry, I couldn't turn your question into a valid query. Please try rephrasing it.",
+            errors=checked.errors,
+        )
+    if checked.repairs:
+        print(f"Repaired the SQL: {', '.join(checked.repairs)}")
+
+    print(checked.sql)
+    return QueryPlan(sql=checked.sql, path="llm", model=routed_model)
+
+
+async def execute_sql(
+    session: AsyncSession,
+    sql_query: str,
+    params: Optional[dict] = None,
+    max_rows: Optional[int] = None,
+) -> List[Row]:
+    params = params or {}
+    # Any write since the rows were cached changes the data version and misses
+    key = (
+        canonicalize_sql(sql_query),
+        tuple(sorted(params.items())),
+        max_rows,
+        await get_data_version(),
+    )
+    results = result_cache.get(key)
+    if results is not None:
+        return results
+
     try:
-        # Execute the SQL query
-        sql = text(sql_query)
-        results = session.exec(sql).all()
+        # Execute the SQL query within the cost, time and row limits
+        with span("execute"):
+            results = await run_guarded_query(session, sql_query, params, max_rows)
+    except HTTPException:
+        set_outcome("sql_error")
+        raise
     except Exception:
-        raise HTTPException(
-            status_code=400,
-            detail=f"There currently is a problem with the service. Please try again later.",
+        set_outcome("sql_error")
+        raise service_error()
+
+    with span("result_cache"):
+        size = sum(json_size(value) for result in results for value in result)
+        result_cache.set(key, results, size=size)
+    return results
+
+
+async def run_plan(
+    open_session: Callable[[], AsyncContextManager[AsyncSession]],
+    user_question: str,
+    plan: QueryPlan,
+    turns: Optional[List[dict]] = None,
+) -> Tuple[QueryPlan, List[Row]]:
+    """
+    Executes a plan, fetching one row more than a page so that large results
+    can be told apart. SQL from the small model that Postgres rejects is
+    regenerated with the large model and executed once more, so the plan that
+    actually ran is returned along with its rows. A session is only open while
+    SQL runs, not while the large model is asked.
+    """
+    max_rows = settings.RESULT_PAGE_SIZE + 1
+    try:
+        async with open_session() as session:
+            return plan, await execute_sql(session, plan.sql, plan.params, max_rows)
+    except HTTPException as e:
+        # Only a 400 means the SQL itself is broken, the 422 and 504 rejections of
+        # the guard would not go any better with the large model
+        if e.status_code != 400 or plan.path != "llm":
+            raise
+        forget_sql(format_history(turns or []) + user_question, plan.model)
+        if plan.model == settings.SQL_MODEL:
+            raise
+
+    print(f"SQL from {plan.model} failed, escalating to {settings.SQL_MODEL}")
+    ESCALATIONS.inc(reason="execution_error")
+    set_outcome("ok")
+    plan = await plan_query(user_question, model=settings.SQL_MODEL, turns=turns)
+    async with open_session() as session:
+        return plan, await execute_sql(session, plan.sql, plan.params, max_rows)
+
+
+async def hold_large_result(
+    open_session: Callable[[], AsyncContextManager[AsyncSession]],
+    plan: QueryPlan,
+    results: List[Row],
+) -> Tuple[List[Row], Optional[str]]:
+    """
+    Cuts results longer than a page down to the first page and returns the
+    handle the rest can be fetched with (None when everything fits). The first
+    page is read again in the order of the handle, so that the pages line up.
+    """
+    if len(results) <= settings.RESULT_PAGE_SIZE:
+        return results, None
+    async with open_session() as session:
+        handle = await create_result_handle(
+            session, plan.sql, plan.params, len(results[0]._fields)
         )
+        handle_id = handle.id
+        sql_query, params = page_query(handle, 0, settings.RESULT_PAGE_SIZE)
+        results = await execute_sql(session, sql_query, params)
+    return results, handle_id
+
+
+def page_fields(handle: Optional[str]) -> dict:
+    return {
+        "handle": handle,
+        "next_cursor": settings.RESULT_PAGE_SIZE if handle else None,
+    }
+
+
+async def cached_answer(user_question: str, answer_dicts: List[dict]) -> Tuple[str, str]:
+    """
+    The model's answer and where it came from. Answers for the same question
+    over the same rows come from the answer cache, which also stands in with an
+    expired answer when the model cannot be reached.
+    """
+    key = answer_key(user_question, answer_dicts)
+    with span("answer_cache"):
+        answer = await answer_cache.get(key)
+    if answer is not None:
+        return answer, "cache"
+
+    try:
+        with span("get_answer"):
+            answer = await get_answer(user_question, answer_dicts)
+    except HTTPException:
+        with span("answer_cache"):
+            answer = await answer_cache.get_stale(key)
+        if answer is None:
+            set_outcome("service_error")
+            raise
+        return answer, "cache"
+
+    with span("answer_cache"):
+        await answer_cache.set(key, answer)
+    return answer, "llm"
+
+
+def new_session() -> AsyncSession:
+    return AsyncSession(async_engine)
+
+
+async def conversation_turns(conversation_id: Optional[str]) -> List[dict]:
+    if conversation_id is None:
+        return []
+    with span("conversation"):
+        return await get_turns(conversation_id)
+
+
+async def remember_turn(
+    conversation_id: Optional[str],
+    user_question: str,
+    plan: QueryPlan,
+    answer_dicts: List[dict],
+    handle: Optional[str],
+) -> None:
+    if conversation_id is None:
+        return
+    with span("conversation"):
+        summary = summarize_rows(answer_dicts, more=handle is not None)
+        await add_turn(conversation_id, user_question, plan.sql, plan.params, summary)
+
+
+async def answer_question(
+    user_question: str,
+    open_session: Callable[[], AsyncContextManager[AsyncSession]] = new_session,
+    conversation_id: Optional[str] = None,
+) -> dict:
+    turns = await conversation_turns(conversation_id)
+    plan = await plan_query(user_question, turns=turns)
+    plan, results = await run_plan(open_session, user_question, plan, turns)
+    # Rows past the first page stay in the database behind a handle
+    results, handle = await hold_large_result(open_session, plan, results)
+
+    with span("convert_rows"):
+        # Pages keep the order of the SQL so that they line up
+        data, answer_dicts, size = convert_rows(
+            results, sort=handle is None, size_limit=LONG_RESULT_CHARS
+        )
+    await remember_turn(conversation_id, user_question, plan, answer_dicts, handle)
+    if handle or size > LONG_RESULT_CHARS:
+        set_outcome("long_result")
+        return {
+            "message": "Click the button to get all the data.",
+            "data": answer_dicts,
+            "path": plan.path,
+            **page_fields(handle),
+        }
+
+    # Simple result shapes are rendered directly, the rest goes to the model
+    with span("format"):
+        answer = format_answer(answer_dicts)
+    answer_path = "template"
+    if answer is None:
+        answer, answer_path = await cached_answer(user_question, answer_dicts)
+    return {
+        "message": answer,
+        "data": data,
+        "path": plan.path,
+        "answer_path": answer_path,
+    }
+
+
+@router.post("/ask_stats")
+async def get_stats(request: StatsRequest) -> JSONResponse:
+    """
+    Identical questions asked while one is already being answered wait for that
+    answer instead of starting their own. The time spent in each stage is sent
+    back in the `Server-Timing` header, including encoding the response.
+    """
+    user_question = request.message
+    conversation_id = request.conversation_id
+    key = f"{get_current_date()}:{normalize_question(user_question)}"
+    if conversation_id is not None:
+        # Follow-ups depend on their conversation
+        key += f":{conversation_id}"
+
+    def answer() -> Awaitable[dict]:
+        return answer_question(user_question, conversation_id=conversation_id)
+
+    with request_timer() as timer:
+        if settings.SINGLE_FLIGHT_SHARED:
+            result = await stats_flight.do(key, lambda: shared_flight(key, answer))
+        else:
+            result = await stats_flight.do(key, answer)
+        with span("encode"):
+            response = JSONResponse(jsonable_encoder(result))
+    response.headers["Server-Timing"] = timer.server_timing()
+    return response
+
+
+@router.post("/ask_stats/batch")
+async def get_stats_batch(request: StatsBatchRequest):
+    """
+    Answers a list of questions. Repeated questions are answered once and the
+    rest concurrently, at most `LLM_MAX_IN_FLIGHT` at a time so that one batch
+    cannot fill the LLM gateway's queue. Their SQL runs one query at a time, so a
+    batch takes at most one database connection, and only while SQL runs.
+    Results are in the order of the questions, each either what `/ask_stats`
+    would return or the `error` it would fail with. Every question is answered
+    on its own, `conversation_id` is not used here.
+    """
+    questions = [question.message for question in request.questions]
+    keys = [normalize_question(question) for question in questions]
+    unique = {}
+    for key, question in zip(keys, questions):
+        unique.setdefault(key, question)
+
+    limit = asyncio.Semaphore(settings.LLM_MAX_IN_FLIGHT)
+    session_lock = asyncio.Lock()
+
+    @asynccontextmanager
+    async def shared_session() -> AsyncIterator[AsyncSession]:
+        # The connection goes back to the pool between queries, so none is held
+        # while the questions wait for the models
+        async with session_lock, new_session() as session:
+            yield session
+
+    async def answer(question: str) -> dict:
+        async with limit:
+            try:
+                with request_timer():
+                    return await answer_question(question, shared_session)
+            except HTTPException as e:
+                return {"error": {"status_code": e.status_code, "detail": e.detail}}
+            except Exception:
+                error = service_error()
+                return {
+                    "error": {
+                        "status_code": error.status_code,
+                        "detail": error.detail,
+                    }
+                }
+
+    answers = await asyncio.gather(*(answer(question) for question in unique.values()))
+
+    by_key = dict(zip(unique, answers))
+    return {
+        "results": [
+            {"question": question, **by_key[key]}
+            for question, key in zip(questions, keys)
+        ]
+    }
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+@router.post("/ask_stats/stream")
+async def get_stats_stream(request: StatsRequest):
+    """
+    Same pipeline as `/ask_stats` but sent as server-sent events in stages:
+    `sql` once the query is generated, `data` once it has run, then one `token`
+    event per chunk of the answer and a final `done` (or `error`) event.
+    The `Server-Timing` header only covers planning, the rest of the stages are
+    recorded in the metrics once the stream ends.
+    """
+    user_question = request.message
+    conversation_id = request.conversation_id
+    timer = RequestTimer()
+    # Generate the SQL before the response starts so that failures keep their status code
+    try:
+        with timer.activate():
+            turns = await conversation_turns(conversation_id)
+            plan = await plan_query(user_question, turns=turns)
+    except BaseException as e:
+        timer.fail(e)
+        raise
+    server_timing = timer.server_timing()
+
+    async def event_stream() -> AsyncIterator[str]:
+        with timer.activate():
+            try:
+                async for event in stream_stages():
+                    yield event
+            except BaseException as e:
+                timer.fail(e)
+                raise
+        timer.finish()
+
+    async def stream_stages() -> AsyncIterator[str]:
+        yield format_sse(
+            "sql", {"sql": plan.sql, "params": plan.params, "path": plan.path}
+        )
+
+        # Dependencies are torn down before a streaming body runs, so the
+        # generator opens its own sessions
+        try:
+            ran, results = await run_plan(new_session, user_question, plan, turns)
+        except HTTPException as e:
+            yield format_sse("error", {"detail": e.detail})
+            return
+        results, handle = await hold_large_result(new_session, ran, results)
+        if ran is not plan:
+            yield format_sse(
+                "sql", {"sql": ran.sql, "params": ran.params, "path": ran.path}
+            )
+
+        with span("convert_rows"):
+            data, answer_dicts, size = convert_rows(
+                results, sort=handle is None, size_limit=LONG_RESULT_CHARS
+            )
+        await remember_turn(conversation_id, user_question, ran, answer_dicts, handle)
+        if handle or size > LONG_RESULT_CHARS:
+            set_outcome("long_result")
+            yield format_sse("data", {"data": answer_dicts, **page_fields(handle)})
+            yield format_sse("done", {"message": "Click the button to get all the data."})
+            return
+
+        yield format_sse("data", {"data": data})
+        with span("format"):
+            formatted = format_answer(answer_dicts)
+        if formatted is not None:
+            yield format_sse("token", {"token": formatted})
+            yield format_sse("done", {"message": formatted, "answer_path": "template"})
+            return
+
+        key = answer_key(user_question, answer_dicts)
+        with span("answer_cache"):
+            cached = await answer_cache.get(key)
+        if cached is not None:
+            yield format_sse("token", {"token": cached})
+            yield format_sse("done", {"message": cached, "answer_path": "cache"})
+            return
+
+        answer = []
+        try:
+            with span("stream_answer"):
+                async for token in stream_answer(user_question, answer_dicts):
+                    answer.append(token)
+                    yield format_sse("token", {"token": token})
+        except Exception as e:
+            # An expired answer can stand in as long as nothing was sent yet
+            if not answer:
+                with span("answer_cache"):
+                    cached = await answer_cache.get_stale(key)
+                if cached is not None:
+                    yield format_sse("token", {"token": cached})
+                    yield format_sse("done", {"message": cached, "answer_path": "cache"})
+                    return
+            set_outcome("service_error")
+            if isinstance(e, HTTPException):
+                detail = e.detail
+            else:
+                detail = (
+                    "There currently is a problem with the service. Please try again."
+                )
+            yield format_sse("error", {"detail": detail})
+            return
+
+        answer = "".join(answer)
+        with span("answer_cache"):
+            await answer_cache.set(key, answer)
+        yield format_sse("done", {"message": answer, "answer_path": "llm"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            "Server-Timing": server_timing,
+        },
+    )
+
+
+@router.get("/ask_stats/results/{handle}")
+async def get_result_page(
+    handle: str,
+    cursor: int = Query(default=0, ge=0),
+    limit: int = Query(
+        default=settings.RESULT_PAGE_SIZE, ge=1, le=settings.NL_QUERY_MAX_ROWS
+    ),
+):
+    """
+    A page of a large result, starting at `cursor`. `next_cursor` is None on the
+    last page.
+    """
+    async with AsyncSession(async_engine) as session:
+        result_handle = await get_result_handle(session, handle)
+        sql_query, params = page_query(result_handle, cursor, limit + 1)
+        results = await execute_sql(session, sql_query, params)
+    return {
+        "data": convert_rows_to_essentials(results[:limit], sort=False),
+        "next_cursor": cursor + limit if len(results) > limit else None,
+    }
+
+
+@router.get("/ask_stats/results/{handle}/ndjson")
+async def stream_result(handle: str):
+    """
+    Every row of a large result as newline delimited JSON. Rows are read through
+    a server-side cursor a page at a time, so memory stays bounded however large
+    the result is. A failure half way ends the stream with an `error` line.
+    """
+    async with AsyncSession(async_engine) as session:
+        result_handle = await get_result_handle(session, handle)
+
+    async def rows() -> AsyncIterator[str]:
+        async with AsyncSession(async_engine) as session:
+            try:
+                async with guarded_result(
+                    session, result_handle.sql, result_handle.params
+                ) as result:
+                    async for page in result.partitions(settings.RESULT_PAGE_SIZE):
+                        yield "".join(
+                            json.dumps(row, default=str) + "\n"
+                            for row in convert_rows_to_essentials(page, sort=False)
+                        )
+            except HTTPException as e:
+                yield json.dumps({"error": e.detail}) + "\n"
+
+    return StreamingResponse(rows(), media_type="application/x-ndjson")
+
+
+@router.post("/conversations")
+async def start_conversation():
+    """
+    Starts a conversation. Questions sent with its `conversation_id` can refer
+    back to the earlier ones, e.g. "and the season after?".
+    """
+    return {"conversation_id": await create_conversation()}
+
+
+@router.delete("/conversations/{conversation_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def end_conversation(conversation_id: str):
+    await delete_conversation(conversation_id)
 
-    # We need to do this because datetime objects need to converted into dictionaries
-    data = [result._asdict() for result in results]
-    answer_dicts = convert_rows_to_essentials(results)
-    # If the answer dictionary is
-    answer_dict_string = json.dumps(answer_dicts, default=str)
-    if len(answer_dict_string) > 600:
-        return {"message": "Click the button to get all the data.", "data": answer_dicts}
 
-    answer = get_answer(user_question, answer_dicts)
-    return {"message": answer, "data": data}
+@router.get("/cache_stats")
+def get_cache_stats():
+    return {
+        "sql": sql_cache.stats(),
+        "results": result_cache.stats(),
+        "answers": answer_cache.stats(),
+        "single_flight": stats_flight.stats(),
+        "llm": llm_gateway.stats(),
+        "sql_hedging": sql_hedger.stats(),
+    }
@@ -0,0 +1,100 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Iterator, List, Optional, Tuple
+
+from app.core.metrics import Histogram
+from fastapi import HTTPException
+
+STAGE_SECONDS = Histogram(
+    "nl_query_stage_seconds",
+    "Time spent in each stage of answering a natural language question.",
+    labels=("stage", "outcome"),
+)
+
+_current_timer: ContextVar[Optional["RequestTimer"]] = ContextVar(
+    "current_timer", default=None
+)
+
+
+class RequestTimer:
+    """
+    Collects the duration of every stage of one question. Once the request is
+    done the spans are recorded in `STAGE_SECONDS`, labeled with the outcome of
+    the request, and sent back in a `Server-Timing` header.
+    """
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+        self.outcome = "ok"
+        self._start = perf_counter()
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((stage, perf_counter() - start))
+
+    @contextmanager
+    def activate(self) -> Iterator["RequestTimer"]:
+        # Lets `span` and `set_outcome` reach this timer from nested calls
+        token = _current_timer.set(self)
+        try:
+            yield self
+        finally:
+            _current_timer.reset(token)
+
+    def finish(self) -> None:
+        self.spans.append(("total", perf_counter() - self._start))
+        for stage, seconds in self.spans:
+            STAGE_SECONDS.observe(seconds, stage=stage, outcome=self.outcome)
+
+    def fail(self, error: BaseException) -> None:
+        """
+        Finishes a failed request. Failures not already labeled with an outcome
+        are counted as "error", and HTTP errors carry the `Server-Timing` header.
+        """
+        if self.outcome == "ok":
+            self.outcome = "error"
+        self.finish()
+        if isinstance(error, HTTPException):
+            error.headers = {
+                **(error.headers or {}),
+                "Server-Timing": self.server_timing(),
+            }
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.spans
+        )
+
+
+@contextmanager
+def request_timer() -> Iterator[RequestTimer]:
+    timer = RequestTimer()
+    with timer.activate():
+        try:
+            yield timer
+        except BaseException as e:
+            timer.fail(e)
+            raise
+    timer.finish()
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    # A no-op outside of a timed request
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.span(stage):
+        yield
+
+
+def set_outcome(outcome: str) -> None:
+    timer = _current_timer.get()
+    if timer is not None:
+        timer.outcome = outcome
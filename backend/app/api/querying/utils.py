@@ -1,15 +1,51 @@
 import os
 from datetime import datetime
-from typing import List
-
+from functools import partial
+from typing import AsyncIterator, FrozenSet, List, Optional
+
+from app.api.querying.answers import AnswerCache
+from app.api.querying.cache import SizedTTLCache, TTLCache
+from app.api.querying.gateway import LLMGateway
+from app.api.querying.hedging import Hedger
+from app.api.querying.normalize import normalize_question
+from app.api.querying.routing import ROUTED_QUESTIONS, route_sql_model
+from app.api.querying.schema import (
+    SCHEMA_GROUPS,
+    build_schema_prompt,
+    estimate_tokens,
+    select_schema_groups,
+)
+from app.api.querying.validation import check_sql
+from app.core.config import settings
 from fastapi import HTTPException
-from pydantic import BaseModel
-from sqlalchemy import Row
-from together import Together
+from pydantic import BaseModel, Field
+from together import AsyncTogether
+
+# The following prompt has 1 variable:
+# - turns: str (earlier questions with their SQL and results, see `format_history`)
+FOLLOW_UP_PROMPT = """
+Earlier questions in this conversation, oldest first:
+{turns}
+
+The next question may refer back to them:
+"""
+
+# The following prompt has 1 variable:
+# - current_date: str
+SQL_FOLLOW_UP_SYSTEM_PROMPT = """
+You are a Natural language to SQL bot for a database of Premier League Matches.
+You must only output a single SQL query to answer the user's latest question, which may refer back to the earlier ones.
+
+Instructions:
+- the earlier queries show the tables and columns you can use. If the question needs any others, return "invalid"
+- if the question is invalid, return "invalid"
+- recall that the current date in YYYY-MM-DD format is {current_date}
+- when asked for a season, you must query season_name with "English Premier League YYYY/YY Season" format
+"""
 
 # The following prompt has 2 variables:
-# - user_question: str
 # - current_date: str
+# - schema: str (DDL of the tables the question needs, see `build_schema_prompt`)
 SQL_BOT_SYSTEM_PROMPT = """
 You are a Natural language to SQL bot for a database of Premier League Matches.
 You must only output a single SQL query to answer the user's question.
@@ -31,125 +67,20 @@ Instructions:
 - half_time_result is either "H" (home win), "A" (away win), or "D" (draw)
 
 The schema is: 
-CREATE TABLE public.referee (
-	id serial4 NOT NULL,
-	"name" varchar NOT NULL,
-	CONSTRAINT referee_pkey PRIMARY KEY (id)
-);
-CREATE UNIQUE INDEX ix_referee_name ON public.referee USING btree (name);
-
-CREATE TABLE public.season (
-	id serial4 NOT NULL,
-	"name" varchar NOT NULL,
-	CONSTRAINT season_pkey PRIMARY KEY (id)
-);
-CREATE UNIQUE INDEX ix_season_name ON public.season USING btree (name);
-
-CREATE TABLE public.team (
-	id serial4 NOT NULL,
-	"name" varchar NOT NULL,
-	CONSTRAINT team_pkey PRIMARY KEY (id)
-);
-CREATE UNIQUE INDEX ix_team_name ON public.team USING btree (name);
-
-
-CREATE TABLE public."match" (
-	id serial4 NOT NULL,
-	season_name varchar NOT NULL,
-	division varchar NOT NULL,
-	match_date date NOT NULL,
-	match_time time NULL,
-	home_team_name varchar NOT NULL,
-	away_team_name varchar NOT NULL,
-	referee_name varchar NULL,
-	full_time_home_goals int4 NOT NULL,
-	full_time_away_goals int4 NOT NULL,
-	full_time_result varchar NOT NULL,
-	half_time_home_goals int4 NULL,
-	half_time_away_goals int4 NULL,
-	half_time_result varchar NULL,
-	home_shots int4 NULL,
-	away_shots int4 NULL,
-	home_shots_on_target int4 NULL,
-	away_shots_on_target int4 NULL,
-	home_fouls int4 NULL,
-	away_fouls int4 NULL,
-	home_corners int4 NULL,
-	away_corners int4 NULL,
-	home_yellow_cards int4 NULL,
-	away_yellow_cards int4 NULL,
-	home_red_cards int4 NULL,
-	away_red_cards int4 NULL,
-	bet365_home_win_odds float8 NULL,
-	bet365_draw_odds float8 NULL,
-	bet365_away_win_odds float8 NULL,
-	bet_and_win_home_win_odds float8 NULL,
-	bet_and_win_draw_odds float8 NULL,
-	bet_and_win_away_win_odds float8 NULL,
-	interwetten_home_win_odds float8 NULL,
-	interwetten_draw_odds float8 NULL,
-	interwetten_away_win_odds float8 NULL,
-	pinnacle_home_win_odds float8 NULL,
-	pinnacle_draw_odds float8 NULL,
-	pinnacle_away_win_odds float8 NULL,
-	william_hill_home_win_odds float8 NULL,
-	william_hill_draw_odds float8 NULL,
-	william_hill_away_win_odds float8 NULL,
-	vc_bet_home_win_odds float8 NULL,
-	vc_bet_draw_odds float8 NULL,
-	vc_bet_away_win_odds float8 NULL,
-	max_home_win_odds float8 NULL,
-	max_draw_odds float8 NULL,
-	max_away_win_odds float8 NULL,
-	avg_home_win_odds float8 NULL,
-	avg_draw_odds float8 NULL,
-	avg_away_win_odds float8 NULL,
-	bet365_over_2_5_odds float8 NULL,
-	bet365_under_2_5_odds float8 NULL,
-	pinnacle_over_2_5_odds float8 NULL,
-	pinnacle_under_2_5_odds float8 NULL,
-	max_over_2_5_odds float8 NULL,
-	max_under_2_5_odds float8 NULL,
-	avg_over_2_5_odds float8 NULL,
-	avg_under_2_5_odds float8 NULL,
-	asian_handicap_line float8 NULL,
-	bet365_asian_handicap_home_odds float8 NULL,
-	bet365_asian_handicap_away_odds float8 NULL,
-	pinnacle_asian_handicap_home_odds float8 NULL,
-	pinnacle_asian_handicap_away_odds float8 NULL,
-	max_asian_handicap_home_odds float8 NULL,
-	max_asian_handicap_away_odds float8 NULL,
-	avg_asian_handicap_home_odds float8 NULL,
-	avg_asian_handicap_away_odds float8 NULL,
-	CONSTRAINT match_pkey PRIMARY KEY (id),
-	CONSTRAINT match_away_team_name_fkey FOREIGN KEY (away_team_name) REFERENCES public.team("name"),
-	CONSTRAINT match_home_team_name_fkey FOREIGN KEY (home_team_name) REFERENCES public.team("name"),
-	CONSTRAINT match_referee_name_fkey FOREIGN KEY (referee_name) REFERENCES public.referee("name"),
-	CONSTRAINT match_season_name_fkey FOREIGN KEY (season_name) REFERENCES public.season("name")
-);
-
-CREATE TABLE public.stadium (
-	id serial4 NOT NULL,
-	"name" varchar NOT NULL,
-	home_team varchar NULL,
-	CONSTRAINT stadium_pkey PRIMARY KEY (id),
-	CONSTRAINT stadium_home_team_fkey FOREIGN KEY (home_team) REFERENCES public.team("name")
-);
-CREATE INDEX ix_stadium_name ON public.stadium USING btree (name);
-
-
-CREATE TABLE public.teamseason (
-	id serial4 NOT NULL,
-	team_name varchar NULL,
-	season_name varchar NULL,
-	CONSTRAINT teamseason_pkey PRIMARY KEY (id),
-	CONSTRAINT teamseason_season_name_fkey FOREIGN KEY (season_name) REFERENCES public.season("name"),
-	CONSTRAINT teamseason_team_name_fkey FOREIGN KEY (team_name) REFERENCES public.team("name")
-);
+{schema}
 
 ```sql
 """
 
+# The following prompt has 1 variable:
+# - errors: str (one problem found by `check_sql` per line)
+SQL_REPAIR_PROMPT = """
+That query cannot be run:
+{errors}
+
+Fix it using only the tables and columns in the schema. Output only the corrected SQL query.
+"""
+
 
 ANSWER_BOT_SYSTEM_PROMPT = """
 You are a question answer bot. The user will provide some dictionaries with match data and their original question. 
@@ -166,24 +97,74 @@ Frame an answer to the question and return the response in Markdown with only bo
 
 class StatsRequest(BaseModel):
     message: str
+    # Follow-up questions are answered with the history of this conversation
+    conversation_id: Optional[str] = None
 
 
-client = Together(api_key=os.environ.get("TOGETHER_API_KEY"))
+class StatsBatchRequest(BaseModel):
+    questions: List[StatsRequest] = Field(
+        min_length=1, max_length=settings.STATS_BATCH_MAX_QUESTIONS
+    )
 
 
-def get_sql(query: str):
-    chat_completions = client.chat.completions.create(
-        messages=[
-            {
-                "role": "system",
-                "content": SQL_BOT_SYSTEM_PROMPT.format(
-                    current_date=datetime.now().strftime("%Y-%m-%d")
-                ),
-            },
-            {"role": "user", "content": query},
-        ],
-        model="meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo",
+client = AsyncTogether(
+    api_key=os.environ.get("TOGETHER_API_KEY"), base_url=settings.TOGETHER_BASE_URL
+)
+hedge_client = (
+    AsyncTogether(
+        api_key=settings.SQL_HEDGE_API_KEY or os.environ.get("TOGETHER_API_KEY"),
+        base_url=settings.SQL_HEDGE_BASE_URL,
     )
+    if settings.SQL_HEDGE_BASE_URL
+    else client
+)
+# Every call to `client` goes through the gateway
+llm_gateway = LLMGateway(
+    max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+    max_queue=settings.LLM_MAX_QUEUE,
+    queue_timeout=settings.LLM_QUEUE_TIMEOUT_SECONDS,
+    failure_threshold=settings.LLM_CIRCUIT_FAILURE_THRESHOLD,
+    reset_timeout=settings.LLM_CIRCUIT_RESET_SECONDS,
+)
+sql_hedger = Hedger(
+    percentile=settings.SQL_HEDGE_PERCENTILE,
+    default_delay=settings.SQL_HEDGE_DEFAULT_DELAY_SECONDS,
+    min_samples=settings.SQL_HEDGE_MIN_SAMPLES,
+)
+
+# Generated SQL keyed by (normalized question, date embedded in the prompt)
+sql_cache = TTLCache(
+    maxsize=settings.SQL_CACHE_MAX_SIZE, ttl=settings.SQL_CACHE_TTL_SECONDS
+)
+# Rows of executed SQL keyed by (canonical SQL, data version)
+result_cache = SizedTTLCache(
+    max_bytes=settings.RESULT_CACHE_MAX_BYTES, ttl=settings.RESULT_CACHE_TTL_SECONDS
+)
+# Answers keyed by (normalized question, hash of the rows), shared between workers
+answer_cache = AnswerCache(
+    ttl=settings.ANSWER_CACHE_TTL_SECONDS,
+    max_stale=settings.ANSWER_CACHE_MAX_STALE_SECONDS,
+)
+
+
+def get_current_date() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def get_sql_system_prompt(groups: FrozenSet[str]) -> str:
+    schema = build_schema_prompt(groups)
+    return SQL_BOT_SYSTEM_PROMPT.format(current_date=get_current_date(), schema=schema)
+
+
+async def complete_sql_messages(
+    messages: List[dict],
+    model: Optional[str] = None,
+    llm: Optional[AsyncTogether] = None,
+) -> str:
+    async with llm_gateway.slot():
+        chat_completions = await (llm or client).chat.completions.create(
+            messages=messages, model=model or settings.SQL_MODEL
+        )
 
     sql = chat_completions.choices[0].message.content
     sql = sql.replace("```sql", "")
@@ -191,20 +172,156 @@ def get_sql(query: str):
     return sql
 
 
-def get_answer(user_question: str, data):
-    prompt = ANSWER_BOT_USER_PROMPT.format(user_question=user_question, match_data=data)
-    try:
-        chat_completions = client.chat.completions.create(
-            messages=[
-                {
-                    "role": "system",
-                    "content": ANSWER_BOT_SYSTEM_PROMPT,
-                },
-                {"role": "user", "content": prompt},
-            ],
-            model="meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo",
+async def complete_sql(
+    query: str,
+    system_prompt: str,
+    model: Optional[str] = None,
+    llm: Optional[AsyncTogether] = None,
+) -> str:
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": query},
+    ]
+    return await complete_sql_messages(messages, model=model, llm=llm)
+
+
+async def repair_sql(
+    query: str, sql: str, errors: List[str], model: Optional[str] = None
+) -> str:
+    """
+    Asks the model once more for the SQL of a question, with the problems
+    `check_sql` found in its previous answer. The full schema is sent so that a
+    trimmed one cannot be the cause again.
+    """
+    messages = [
+        {"role": "system", "content": get_sql_system_prompt(SCHEMA_GROUPS)},
+        {"role": "user", "content": query},
+        {"role": "assistant", "content": sql},
+        {
+            "role": "user",
+            "content": SQL_REPAIR_PROMPT.format(
+                errors="\n".join(f"- {error}" for error in errors)
+            ),
+        },
+    ]
+    return await complete_sql_messages(messages, model=model)
+
+
+def get_follow_up_messages(turns: List[dict], query: str) -> List[dict]:
+    """
+    A follow-up question with the earlier turns of its conversation as chat turns,
+    each result in front of the question after it.
+    """
+    messages = [
+        {
+            "role": "system",
+            "content": SQL_FOLLOW_UP_SYSTEM_PROMPT.format(
+                current_date=get_current_date()
+            ),
+        }
+    ]
+    result = ""
+    for turn in turns:
+        messages.append({"role": "user", "content": result + turn["question"]})
+        messages.append({"role": "assistant", "content": turn["sql"]})
+        result = f"Result: {turn['summary']}\n\n"
+    messages.append({"role": "user", "content": result + query})
+    return messages
+
+
+async def get_follow_up_sql(turns: List[dict], query: str, model: str) -> str:
+    """
+    The SQL of a follow-up question without the schema, which the earlier SQL of
+    the conversation stands in for. "invalid" when that is not enough.
+    """
+    ROUTED_QUESTIONS.inc(model=model)
+    return await complete_sql_messages(get_follow_up_messages(turns, query), model=model)
+
+
+async def hedged_complete_sql(query: str, system_prompt: str) -> str:
+    """
+    `complete_sql` hedged with `SQL_HEDGE_MODEL` when one is configured.
+    """
+    alternate = None
+    if settings.SQL_HEDGE_MODEL:
+        alternate = lambda: complete_sql(
+            query, system_prompt, model=settings.SQL_HEDGE_MODEL, llm=hedge_client
         )
+    return await sql_hedger.run(lambda: complete_sql(query, system_prompt), alternate)
+
+
+async def get_sql(query: str, model: Optional[str] = None):
+    model = model or route_sql_model(query)
+    ROUTED_QUESTIONS.inc(model=model)
+    if model == settings.SQL_MODEL:
+        complete = hedged_complete_sql
+    else:
+        complete = partial(complete_sql, model=model)
+
+    # Only send the parts of the schema the question needs
+    groups = select_schema_groups(query)
+    tokens = estimate_tokens(build_schema_prompt(groups))
+    saved = estimate_tokens(build_schema_prompt(SCHEMA_GROUPS)) - tokens
+    print(f"Schema groups {sorted(groups)}: ~{tokens} schema tokens, ~{saved} saved")
+
+    sql = await complete(query, get_sql_system_prompt(groups))
+    if sql.lower().strip() == "invalid" and groups != SCHEMA_GROUPS:
+        # The trimmed schema may have left out a column the question needs
+        sql = await complete(query, get_sql_system_prompt(SCHEMA_GROUPS))
+    return sql
+
+
+def _sql_cache_key(query: str, model: Optional[str]) -> tuple:
+    # The date is part of the key because the prompt embeds it (e.g. "last season")
+    model = model or route_sql_model(query)
+    return normalize_question(query), get_current_date(), model
+
+
+async def get_sql_cached(query: str, model: Optional[str] = None) -> str:
+    """
+    Same as `get_sql` but serves repeated questions from `sql_cache`. Only SQL
+    that passes `check_sql` is kept, so "invalid" and broken SQL are asked for
+    again.
+    """
+    key = _sql_cache_key(query, model)
+    sql = sql_cache.get(key)
+    if sql is None:
+        sql = await get_sql(query, key[2])
+        checked = check_sql(sql)
+        if not checked.errors and checked.read_only:
+            sql_cache.set(key, sql)
+    return sql
+
 
+def forget_sql(query: str, model: Optional[str] = None) -> None:
+    """
+    Drops the cached SQL of a question, for SQL that Postgres rejected.
+    """
+    sql_cache.delete(_sql_cache_key(query, model))
+
+
+def get_answer_messages(user_question: str, data) -> list[dict]:
+    prompt = ANSWER_BOT_USER_PROMPT.format(user_question=user_question, match_data=data)
+    return [
+        {
+            "role": "system",
+            "content": ANSWER_BOT_SYSTEM_PROMPT,
+        },
+        {"role": "user", "content": prompt},
+    ]
+
+
+async def get_answer(user_question: str, data):
+    try:
+        async with llm_gateway.slot():
+            chat_completions = await client.chat.completions.create(
+                messages=get_answer_messages(user_question, data),
+                model=settings.ANSWER_MODEL,
+            )
+
+    except HTTPException:
+        # Rejected by the gateway
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=400,
@@ -215,44 +332,17 @@ def get_answer(user_question: str, data):
     return response
 
 
-excluded_odds = {
-    "interwetten_home_win_odds",
-    "interwetten_draw_odds",
-    "interwetten_away_win_odds",
-    "pinnacle_home_win_odds",
-    "pinnacle_draw_odds",
-    "pinnacle_away_win_odds",
-    "william_hill_home_win_odds",
-    "william_hill_draw_odds",
-    "william_hill_away_win_odds",
-    "asian_handicap_home_win_odds",
-    "asian_handicap_draw_odds",
-    "asian_handicap_away_win_odds",
-    "bet365_over_2_5_odds",
-    "bet365_under_2_5_odds",
-    "pinnacle_over_2_5_odds",
-    "pinnacle_under_2_5_odds",
-    "max_over_2_5_odds",
-    "max_under_2_5_odds",
-    "avg_over_2_5_odds",
-    "avg_under_2_5_odds",
-}
-
-
-def convert_rows_to_essentials(results: List[Row]) -> dict:
-    dicts = [row._asdict() for row in results]
-
-    # Remove None values and odds information
-    for d in dicts:
-        if "id" in d:
-            del d["id"]
-        for k, v in list(d.items()):
-            if k in excluded_odds:
-                del d[k]
-
-    # Check if 'season_name' exists in any of the dictionaries and sort based on it
-    if any("match_date" in d for d in dicts):
-        sorted_dicts = sorted(dicts, key=lambda x: x.get("match_date", ""), reverse=True)
-    else:
-        sorted_dicts = dicts  # Keep original order if 'season_name' is not present
-    return sorted_dicts
+async def stream_answer(user_question: str, data) -> AsyncIterator[str]:
+    """
+    Streaming variant of `get_answer` that yields the answer as the model
+    generates it.
+    """
+    async with llm_gateway.slot():
+        stream = await client.chat.completions.create(
+            messages=get_answer_messages(user_question, data),
+            model=settings.ANSWER_MODEL,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
@@ -0,0 +1,356 @@
+import re
+from difflib import get_close_matches
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from app.api.querying.schema import SCHEMA_TABLES
+from app.models import SQLModel
+from pydantic import BaseModel
+
+_TOKEN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+    |(?P<string>[eE]?'(?:[^']|'')*')
+    |(?P<dollar>\$(?P<tag>\w*)\$.*?\$(?P=tag)\$)
+    |(?P<quoted>"(?:[^"]|"")*")
+    |(?P<backtick>`[^`]*`)
+    |(?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+)
+    |(?P<param>(?<!:):\w+)
+    |(?P<ident>[A-Za-z_][\w$]*)
+    |(?P<op>::|<>|!=|==|<=|>=|\|\||[^\s\w])
+    """,
+    re.S | re.X,
+)
+_STATEMENT_START = re.compile(r"^\s*(select|with)\b", re.I | re.M)
+# A paragraph after the query that does not start like SQL is the model talking
+_PROSE = re.compile(
+    r"\n\s*\n\s*(?!(select|from|where|group|order|limit|having|join|union|and|or|"
+    r"with|inner|left|right|full|cross|offset)\b)[A-Za-z]",
+    re.I,
+)
+
+WRITE_KEYWORDS = set(
+    """
+    insert update delete merge drop alter create truncate grant revoke copy vacuum
+    call lock reindex cluster refresh into set
+    """.split()
+)
+KEYWORDS = set(
+    """
+    select from where and or not in is null as on join inner left right full outer
+    cross natural using lateral only group by order having limit offset fetch next
+    rows row asc desc nulls first last case when then else end between like ilike
+    similar to escape union all intersect except exists distinct with recursive
+    materialized true false unknown interval date time timestamp timestamptz zone
+    at filter over partition window range groups preceding following unbounded
+    current current_date current_time current_timestamp localtime localtimestamp
+    any some array year month day hour minute second epoch dow isodow doy week
+    quarter century decade isoyear int int2 int4 int8 integer smallint bigint
+    numeric decimal float float4 float8 real double precision text varchar char
+    character varying boolean bool collate values ties percent within ordinality
+    default public for
+    """.split()
+)
+# Keywords that end the list of tables after FROM
+_CLAUSE_END = set(
+    "where group order having limit offset fetch union intersect except window for".split()
+)
+_JOINS = set("join inner left right full outer cross natural".split())
+# Functions whose arguments can contain FROM
+_FROM_FUNCTIONS = set("extract substring trim overlay position".split())
+_MYSQL_FUNCTIONS = {"ifnull": "COALESCE"}
+
+
+class Token(NamedTuple):
+    kind: str
+    value: str
+    start: int
+    end: int
+
+    @property
+    def word(self) -> Optional[str]:
+        # Identifiers are case insensitive unless they are quoted
+        if self.kind == "ident":
+            return self.value.lower()
+        if self.kind == "quoted":
+            return self.value[1:-1].replace('""', '"')
+        return None
+
+
+class SQLCheck(BaseModel):
+    """
+    Generated SQL after `check_sql`. `sql` has the repairs applied, `errors` are
+    the problems that could not be repaired and `read_only` is False when the
+    statement could write anything.
+    """
+
+    sql: str
+    errors: List[str] = []
+    repairs: List[str] = []
+    read_only: bool = True
+
+
+def _columns_by_table() -> Dict[str, Set[str]]:
+    return {
+        name: {column.name for column in SQLModel.metadata.tables[name].columns}
+        for name in SCHEMA_TABLES
+    }
+
+
+def tokenize(sql: str) -> Tuple[List[Token], Optional[str]]:
+    """
+    Splits SQL into tokens, dropping comments. The error is set when part of
+    the text is not a token, e.g. an unterminated string.
+    """
+    tokens = []
+    position = 0
+    for m in _TOKEN.finditer(sql):
+        if sql[position : m.start()].strip():
+            break
+        position = m.end()
+        kind = "dollar" if m.lastgroup == "tag" else m.lastgroup
+        if kind == "op" and m.group() in "'\"`":
+            return tokens, f"unterminated {m.group()} quote"
+        if kind != "comment":
+            tokens.append(Token(kind, m.group(), m.start(), m.end()))
+    rest = sql[position:].strip()
+    if rest:
+        return tokens, f"could not parse {rest[:20]!r}"
+    return tokens, None
+
+
+def extract_sql(text: str) -> Tuple[str, List[str]]:
+    """
+    Pulls the statement out of a model answer, dropping Markdown fences and any
+    prose before or after it.
+    """
+    repairs = []
+    fenced = re.search(r"```[a-zA-Z]*\s*(.*?)```", text, re.S)
+    if fenced:
+        text = fenced.group(1)
+        repairs.append("removed Markdown fences")
+    elif "```" in text:
+        text = re.sub(r"```[a-zA-Z]*", " ", text)
+        repairs.append("removed Markdown fences")
+
+    start = _STATEMENT_START.search(text)
+    if start and text[: start.start()].strip():
+        text = text[start.start() :]
+        repairs.append("removed text before the query")
+    prose = _PROSE.search(text)
+    if prose:
+        text = text[: prose.start()]
+        repairs.append("removed text after the query")
+    return text.strip(), repairs
+
+
+def repair_tokens(sql: str, tokens: List[Token]) -> Tuple[str, List[str]]:
+    """
+    Fixes MySQL backticks and functions, `==`, wrongly cased quoted names and
+    table names written as strings.
+    """
+    columns = _columns_by_table()
+    known = set(columns).union(*columns.values())
+    replacements: List[Tuple[Token, str]] = []
+    repairs = []
+    for i, token in enumerate(tokens):
+        previous = tokens[i - 1].word if i else None
+        following = tokens[i + 1].value if i + 1 < len(tokens) else None
+        if token.kind == "backtick":
+            replacements.append((token, f'"{token.value[1:-1]}"'))
+            repairs.append("replaced backticks with double quotes")
+        elif token.value == "==":
+            replacements.append((token, "="))
+            repairs.append("replaced == with =")
+        elif token.kind == "quoted" and token.word not in known:
+            if token.word.lower() in known:
+                replacements.append((token, f'"{token.word.lower()}"'))
+                repairs.append("lowercased quoted names")
+        elif token.kind == "string" and previous in ("from", "join"):
+            if token.value[1:-1].lower() in columns:
+                replacements.append((token, f'"{token.value[1:-1].lower()}"'))
+                repairs.append("quoted table names as identifiers")
+        elif token.word in _MYSQL_FUNCTIONS and following == "(":
+            replacements.append((token, _MYSQL_FUNCTIONS[token.word]))
+            repairs.append(f"replaced {token.value} with {_MYSQL_FUNCTIONS[token.word]}")
+
+    for token, value in reversed(replacements):
+        sql = sql[: token.start] + value + sql[token.end :]
+    return sql, list(dict.fromkeys(repairs))
+
+
+def _cte_names(tokens: List[Token]) -> Tuple[Set[str], Set[str]]:
+    """
+    Names of the CTEs of a WITH statement and of the columns they declare.
+    """
+    names: Set[str] = set()
+    declared: Set[str] = set()
+    if not tokens or tokens[0].word != "with":
+        return names, declared
+    depth = 0
+    for i, token in enumerate(tokens[1:], 1):
+        if token.value == "(":
+            depth += 1
+        elif token.value == ")":
+            depth -= 1
+        elif depth == 0:
+            if token.word == "select":
+                break
+            if token.word is not None and token.word not in KEYWORDS:
+                names.add(token.word)
+        elif depth == 1 and tokens[i - 1].value in ("(", ",") and token.word:
+            # Column list of `name (a, b) AS (...)`, the body starts with SELECT
+            j = i
+            while tokens[j].value != "(":
+                j -= 1
+            if tokens[j - 1].word in names:
+                declared.add(token.word)
+    return names, declared
+
+
+def _unknown_column(reference: str, word: str, candidates: Set[str]) -> str:
+    message = f"unknown column {reference}"
+    suggestions = get_close_matches(word, sorted(candidates), n=3, cutoff=0.6)
+    if suggestions:
+        message += f" (did you mean {', '.join(suggestions)}?)"
+    return message
+
+
+def analyze_sql(tokens: List[Token]) -> Tuple[List[str], bool]:
+    """
+    Checks that the tokens are a single read-only statement whose tables and
+    columns exist. Returns the errors and whether the statement is read-only.
+    """
+    if not tokens:
+        return ["the query is empty"], True
+    writes = [t for t in tokens if t.kind == "ident" and t.word in WRITE_KEYWORDS]
+    read_only = not writes
+    if tokens[0].word not in ("select", "with") and tokens[0].value != "(":
+        return [f"the query must start with SELECT, not {tokens[0].value}"], read_only
+    errors = [f"{t.value.upper()} is not allowed, only SELECT" for t in writes]
+
+    statement_end = next((i for i, t in enumerate(tokens) if t.value == ";"), None)
+    if statement_end is not None:
+        errors.append("only a single statement is allowed")
+        tokens = tokens[:statement_end]
+
+    columns = _columns_by_table()
+    all_columns = set().union(*columns.values())
+    ctes, defined = _cte_names(tokens)
+    # Alias or table name -> table it refers to (None for CTEs and subqueries)
+    tables: Dict[str, Optional[str]] = {}
+
+    # Function (or None) that opened each open parenthesis
+    stack: List[Optional[str]] = []
+    # Parenthesis depths with a FROM list in progress
+    from_depths: Set[int] = set()
+    expect_table = False
+    for i, token in enumerate(tokens):
+        word = token.word
+        previous = tokens[i - 1] if i else None
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+
+        if token.value == "(":
+            stack.append(previous.word if previous and previous.kind == "ident" else None)
+            # A subquery or VALUES list, its alias is collected below
+            expect_table = False
+        elif token.value == ")":
+            if stack:
+                stack.pop()
+            from_depths = {depth for depth in from_depths if depth <= len(stack)}
+        elif token.kind == "ident" and word in ("from", "join"):
+            in_function = stack and stack[-1] in _FROM_FUNCTIONS
+            if not in_function and not (previous and previous.word == "distinct"):
+                from_depths.add(len(stack))
+                expect_table = True
+        elif token.value == "," and len(stack) in from_depths:
+            expect_table = True
+        elif token.kind == "ident" and word in _CLAUSE_END:
+            from_depths.discard(len(stack))
+        elif expect_table and word is not None and word not in ("lateral", "only"):
+            if following is not None and following.value in ("(", "."):
+                # A set returning function, or a schema qualified table
+                expect_table = following.value == "."
+                continue
+            expect_table = False
+            if word in columns:
+                tables[word] = word
+            elif word in ctes:
+                tables[word] = None
+            else:
+                errors.append(f"unknown table {token.value}")
+                tables[word] = None
+            alias = following.word if following is not None else None
+            if alias == "as" and i + 2 < len(tokens):
+                alias = tokens[i + 2].word
+            if alias and alias not in KEYWORDS and alias not in _CLAUSE_END | _JOINS:
+                tables[alias] = tables[word]
+
+        # Column aliases: after AS, or right after an expression (a bare column too)
+        if word is None or (token.kind == "ident" and word in KEYWORDS):
+            continue
+        if previous is not None and previous.word == "as":
+            defined.add(word)
+            if following is not None and following.value == "(":
+                # Column list of an aliased subquery or VALUES
+                for inner in tokens[i + 2 :]:
+                    if inner.value == ")":
+                        break
+                    if inner.word is not None:
+                        defined.add(inner.word)
+        elif previous is not None and (
+            previous.value == ")"
+            or previous.kind in ("number", "string", "quoted")
+            or (previous.kind == "ident" and previous.word not in KEYWORDS)
+            # The type of a cast, as in `x::numeric total`
+            or (previous.kind == "ident" and i >= 2 and tokens[i - 2].value == "::")
+        ):
+            defined.add(word)
+        elif following is not None and following.word == "as" and i + 2 < len(tokens):
+            # `WINDOW w AS (...)`, referred to as `OVER w`
+            if tokens[i + 2].value == "(":
+                defined.add(word)
+
+    # Column references, now that every alias is known
+    for i, token in enumerate(tokens):
+        word = token.word
+        if word is None or (token.kind == "ident" and word in KEYWORDS | WRITE_KEYWORDS):
+            continue
+        previous = tokens[i - 1] if i else None
+        following = tokens[i + 1] if i + 1 < len(tokens) else None
+        if following is not None and following.value in ("(", "."):
+            continue
+        if previous is not None and previous.value == "::":
+            continue
+        if previous is not None and previous.value == "." and i >= 2:
+            qualifier = tokens[i - 2].word
+            table = tables.get(qualifier, qualifier if qualifier in columns else None)
+            if table is not None and word not in columns[table]:
+                errors.append(
+                    _unknown_column(f"{qualifier}.{token.value}", word, columns[table])
+                )
+            continue
+        if word in all_columns or word in defined or word in tables or word in ctes:
+            continue
+        errors.append(_unknown_column(token.value, word, all_columns))
+
+    return list(dict.fromkeys(errors)), read_only
+
+
+def check_sql(text: str) -> SQLCheck:
+    """
+    Extracts the statement from a model answer, repairs what can be repaired
+    and checks the rest against the SQLModel metadata: a single SELECT that only
+    refers to tables and columns that exist.
+    """
+    sql, repairs = extract_sql(text)
+    tokens, error = tokenize(sql)
+    if error is None:
+        sql, fixed = repair_tokens(sql, tokens)
+        repairs += fixed
+        sql = sql.rstrip("; \n\t")
+        tokens, error = tokenize(sql)
+    if error is not None:
+        return SQLCheck(sql=sql, errors=[error], repairs=repairs)
+
+    errors, read_only = analyze_sql(tokens)
+    return SQLCheck(sql=sql, errors=errors, repairs=repairs, read_only=read_only)
@@ -0,0 +1,111 @@
+import zipfile
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, BinaryIO, Optional
+
+import psycopg
+from app.core.config import settings
+from app.core.db import async_engine, bump_data_version
+from app.core.imports import ImportResult, import_csv, season_from_file_name
+from app.core.security import verify_add_token
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.exc import DBAPIError
+
+router = APIRouter()
+
+ZIP_MAGIC = b"PK\x03\x04"
+
+
+async def _prepend(first: bytes, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield first
+    async for chunk in chunks:
+        yield chunk
+
+
+async def _read_member(archive: zipfile.ZipFile, name: str) -> AsyncIterator[bytes]:
+    with archive.open(name) as member:
+        while chunk := member.read(settings.IMPORT_CHUNK_SIZE):
+            yield chunk
+
+
+async def _spool(chunks: AsyncIterator[bytes]) -> BinaryIO:
+    """
+    Writes an upload to a file that stays in memory up to `IMPORT_SPOOL_SIZE` bytes
+    and moves to disk past it. Zips have their directory at the end, so they can't
+    be read while they arrive.
+    """
+    spooled = SpooledTemporaryFile(max_size=settings.IMPORT_SPOOL_SIZE)
+    async for chunk in chunks:
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def _bad_request(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+@router.post(
+    "/matches",
+    response_model=ImportResult,
+    include_in_schema=(settings.ENVIRONMENT == "local"),
+)
+async def import_matches(
+    request: Request,
+    file_name: Optional[str] = None,
+    season_name: Optional[str] = None,
+    token: str = Depends(verify_add_token),
+):
+    """
+    Loads match data from the request body: either one season CSV, whose season
+    comes from `season_name` or a `prem_<yy>_<yy>_stats.csv` style `file_name`, or
+    the whole prem_stats_data.zip. Files are loaded with COPY and merged into the
+    tables in a single transaction, so a file that fails to load changes nothing.
+    """
+    chunks = request.stream()
+    first = b""
+    async for chunk in chunks:
+        first += chunk
+        if len(first) >= len(ZIP_MAGIC):
+            break
+    chunks = _prepend(first, chunks)
+
+    result = ImportResult()
+    try:
+        async with async_engine.begin() as connection:
+            if first.startswith(ZIP_MAGIC):
+                with await _spool(chunks) as spooled, zipfile.ZipFile(spooled) as archive:
+                    for name in sorted(archive.namelist()):
+                        member_season = season_from_file_name(name)
+                        if member_season is None:
+                            continue
+                        result.files.append(
+                            await import_csv(
+                                connection,
+                                member_season,
+                                _read_member(archive, name),
+                                file_name=name,
+                            )
+                        )
+            else:
+                season_name = season_name or season_from_file_name(file_name or "")
+                if season_name is None:
+                    raise _bad_request(
+                        "Give the season_name, or a file_name like prem_00_01_stats.csv"
+                    )
+                result.files.append(
+                    await import_csv(connection, season_name, chunks, file_name=file_name)
+                )
+    except zipfile.BadZipFile as e:
+        raise _bad_request(f"Invalid zip file: {e}")
+    except ValueError as e:
+        raise _bad_request(str(e))
+    except DBAPIError as e:
+        raise _bad_request(str(e.orig).splitlines()[0])
+    except psycopg.Error as e:
+        # Raised by COPY, which goes to the driver directly
+        raise _bad_request(str(e).splitlines()[0])
+
+    if result.files:
+        await run_in_threadpool(bump_data_version)
+    return result
@@ -1,17 +1,176 @@
-from datetime import date
-from typing import Annotated, List
+from collections import defaultdict
+from typing import Dict, List
 
+from app.core.bulk import BulkUpsertResult, RowOutcome, bulk_upsert
 from app.core.config import settings
-from app.core.db import get_session
+from app.core.db import bump_data_version, get_session
 from app.core.security import verify_add_token, verify_delete_token, verify_update_token
-from app.models import Match, MatchFilter, Referee
-from fastapi import APIRouter, Depends, HTTPException, status
+from app.models import (
+    Match,
+    MatchFilter,
+    MatchOdds,
+    MatchOddsBase,
+    MatchRecord,
+    MatchWithOdds,
+    Referee,
+    Season,
+    Team,
+)
+from fastapi import APIRouter, Body, Depends, HTTPException, status
 from fastapi_filter import FilterDepends
-from pydantic import AfterValidator, ValidationError
+from sqlalchemy import literal, union_all
+from sqlalchemy.dialects.postgresql import insert
 from sqlmodel import Session, select
 
 router = APIRouter()
 
+# Names in match rows, with the table they are looked up in and the column of
+# `MatchRecord` their id goes to
+MATCH_NAMES = {
+    "season_name": (Season, "season_id"),
+    "home_team_name": (Team, "home_team_id"),
+    "away_team_name": (Team, "away_team_id"),
+    "referee_name": (Referee, "referee_id"),
+}
+NATURAL_KEY = ["season_id", "home_team_id", "away_team_id", "match_date"]
+ODDS_COLUMNS = list(MatchOddsBase.model_fields)
+
+
+def _name_ids(session: Session, rows: List[dict]) -> Dict[str, Dict[str, int]]:
+    """
+    Ids of the seasons, teams and referees named in match rows by table name, in
+    one query.
+    """
+    names = defaultdict(set)
+    for row in rows:
+        for column, (model, _) in MATCH_NAMES.items():
+            if isinstance(row.get(column), str):
+                names[model.__tablename__].add(row[column])
+    models = [Season, Team, Referee]
+    statement = union_all(
+        *[
+            select(literal(model.__tablename__), model.name, model.id).where(
+                model.name.in_(names[model.__tablename__])
+            )
+            for model in models
+        ]
+    )
+    ids = {model.__tablename__: {} for model in models}
+    for table, name, name_id in session.exec(statement):
+        ids[table][name] = name_id
+    return ids
+
+
+def _match_record(row: dict, ids: Dict[str, Dict[str, int]]) -> dict:
+    """
+    The values of a `MatchRecord` for a match row, with the names swapped for
+    ids. Raises a ValueError for names that don't exist or invalid odds, which
+    are written separately.
+    """
+    MatchOddsBase.model_validate(row)
+    record = {column: value for column, value in row.items() if column not in MATCH_NAMES}
+    for column, (model, id_column) in MATCH_NAMES.items():
+        if column not in row:
+            continue
+        name = row[column]
+        if name is None:
+            record[id_column] = None
+        elif isinstance(name, str) and name in ids[model.__tablename__]:
+            record[id_column] = ids[model.__tablename__][name]
+        else:
+            raise ValueError(f"{column}: unknown {model.__tablename__} {name!r}")
+    return record
+
+
+def _to_record(session: Session, row: dict) -> dict:
+    try:
+        return _match_record(row, _name_ids(session, [row]))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _upsert_with_odds(session: Session, record: MatchRecord, row: dict) -> int:
+    """
+    Inserts or updates a match by its natural key and then its odds, in one
+    `INSERT ... ON CONFLICT DO UPDATE` statement for both. Returns the id of the
+    match.
+    """
+    values = record.model_dump(exclude={"id"})
+    statement = insert(MatchRecord).values(**values)
+    written = (
+        statement.on_conflict_do_update(
+            index_elements=NATURAL_KEY,
+            set_={
+                column: statement.excluded[column]
+                for column in values
+                if column not in NATURAL_KEY
+            },
+        )
+        .returning(MatchRecord.id)
+        .cte("written")
+    )
+    odds_table = MatchOdds.__table__
+    odds = insert(odds_table).from_select(
+        ["match_id", *ODDS_COLUMNS],
+        select(
+            written.c.id,
+            *[literal(row[column], odds_table.c[column].type) for column in ODDS_COLUMNS],
+        ),
+    )
+    odds = (
+        odds.on_conflict_do_update(
+            index_elements=["match_id"],
+            set_={column: odds.excluded[column] for column in ODDS_COLUMNS},
+        )
+        .returning(odds_table.c.match_id)
+        .add_cte(written)
+    )
+    return session.exec(odds).scalar_one()
+
+
+def _upsert_odds(
+    session: Session,
+    rows: List[dict],
+    ids: Dict[str, Dict[str, int]],
+    result: BulkUpsertResult,
+) -> Dict[int, str]:
+    """
+    Upserts the odds of the matches `bulk_upsert` wrote or left unchanged. A
+    match of which only the odds changed counts as updated. Returns the errors
+    of the rows whose odds were rejected, by index.
+    """
+    outcomes: Dict[tuple, RowOutcome] = {}
+    for outcome in result.rows:
+        if outcome.outcome != "failed":
+            record = MatchRecord.model_validate(_match_record(rows[outcome.index], ids))
+            outcomes[tuple(getattr(record, column) for column in NATURAL_KEY)] = outcome
+    if not outcomes:
+        return {}
+
+    # Unchanged matches are not returned by `bulk_upsert`, so look their ids up
+    statement = select(
+        MatchRecord.id, *[MatchRecord.__table__.c[column] for column in NATURAL_KEY]
+    ).where(MatchRecord.season_id.in_({key[0] for key in outcomes}))
+    match_ids = {tuple(row[1:]): row[0] for row in session.exec(statement)}
+    odds_result = bulk_upsert(
+        session,
+        MatchOdds,
+        [
+            {**rows[outcome.index], "match_id": match_ids[key]}
+            for key, outcome in outcomes.items()
+        ],
+        ["match_id"],
+    )
+    failed = {}
+    for (key, outcome), odds_outcome in zip(outcomes.items(), odds_result.rows):
+        if odds_outcome.outcome == "failed":
+            failed[outcome.index] = odds_outcome.error
+        elif outcome.outcome == "unchanged" and odds_outcome.outcome != "unchanged":
+            result.unchanged -= 1
+            result.updated += 1
+            outcome.outcome, outcome.id = "updated", match_ids[key]
+    return failed
+
 
 # Match CRUD operations
 @router.post(
@@ -21,14 +180,17 @@ router = APIRouter()
     include_in_schema=(settings.ENVIRONMENT == "local"),
 )
 def create_match(
-    match: Match,
+    match: MatchWithOdds,
     session: Session = Depends(get_session),
     token: str = Depends(verify_add_token),
 ):
-    session.add(match)
+    row = match.model_dump()
+    record = MatchRecord.model_validate(_to_record(session, row))
+    record.odds = MatchOdds.model_validate(row)
+    session.add(record)
     session.commit()
-    session.refresh(match)
-    return match
+    bump_data_version()
+    return session.get(Match, record.id)
 
 
 @router.post(
@@ -38,35 +200,72 @@ def create_match(
     status_code=status.HTTP_201_CREATED,
 )
 def upsert_match(
-    match: Match,
+    match: MatchWithOdds,
+    session: Session = Depends(get_session),
+    token: str = Depends(verify_add_token),
+):
+    row = match.model_dump()
+    record = MatchRecord.model_validate(_to_record(session, row))
+    # Insert or update by season, home team, away team and match_date, and the
+    # odds by the id of the match
+    match_id = _upsert_with_odds(session, record, row)
+    session.commit()
+    bump_data_version()
+    return session.get(Match, match_id)
+
+
+@router.post(
+    "/bulk_upsert",
+    response_model=BulkUpsertResult,
+    include_in_schema=(settings.ENVIRONMENT == "local"),
+)
+def bulk_upsert_matches(
+    matches: List[MatchWithOdds] = Body(max_length=settings.BULK_UPSERT_MAX_ROWS),
     session: Session = Depends(get_session),
     token: str = Depends(verify_add_token),
 ):
-    # Get the existing match by season, home_team_name, away_team_name, and match_date
-    date_parsed = date.fromisoformat(match.match_date)
-    statement = select(Match).where(
-        Match.season_name == match.season_name,
-        Match.home_team_name == match.home_team_name,
-        Match.away_team_name == match.away_team_name,
-        Match.match_date == date_parsed,
+    """
+    Upserts many matches with their odds at once. Every row gets an outcome:
+    inserted, updated, unchanged or failed (with the reason). A match is only
+    written along with its odds, when the odds of a row are rejected its match
+    is left alone too.
+    """
+    rows = [match.model_dump() for match in matches]
+    ids = _name_ids(session, rows)
+    # Indexes of the rows whose odds were rejected, with the reason
+    rejected: Dict[int, str] = {}
+    while True:
+        kept = [index for index in range(len(rows)) if index not in rejected]
+        savepoint = session.begin_nested()
+        result = bulk_upsert(
+            session,
+            MatchRecord,
+            [rows[index] for index in kept],
+            NATURAL_KEY,
+            prepare=lambda row: _match_record(row, ids),
+        )
+        failed = _upsert_odds(session, [rows[index] for index in kept], ids, result)
+        if not failed:
+            savepoint.commit()
+            break
+        # Write the others again without the matches of the rejected odds
+        savepoint.rollback()
+        rejected.update({kept[index]: error for index, error in failed.items()})
+
+    for outcome in result.rows:
+        outcome.index = kept[outcome.index]
+    result.rows = sorted(
+        result.rows
+        + [
+            RowOutcome(index=index, outcome="failed", error=error)
+            for index, error in rejected.items()
+        ],
+        key=lambda outcome: outcome.index,
     )
-    db_match = session.exec(statement).first()
-
-    if db_match is None:
-        db_match = match
-    else:
-        # Otherwise, update the data (not the id)
-        try:
-            match = Match.model_validate(match)
-        except ValidationError:
-            raise HTTPException(status_code=400, detail="Invalid match data")
-        for key, value in match.model_dump(exclude={"id"}).items():
-            setattr(db_match, key, value)
-
-    session.add(db_match)
+    result.failed += len(rejected)
     session.commit()
-    session.refresh(db_match)
-    return db_match
+    bump_data_version()
+    return result
 
 
 @router.get("/list", response_model=List[Match])
@@ -91,6 +290,14 @@ def read_match(match_id: int, session: Session = Depends(get_session)):
     return match
 
 
+@router.get("/odds/{match_id}", response_model=MatchOdds)
+def read_match_odds(match_id: int, session: Session = Depends(get_session)):
+    odds = session.get(MatchOdds, match_id)
+    if not odds:
+        raise HTTPException(status_code=404, detail="Match odds not found")
+    return odds
+
+
 @router.put(
     "/update/{match_id}",
     response_model=Match,
@@ -98,19 +305,25 @@ def read_match(match_id: int, session: Session = Depends(get_session)):
 )
 def update_match(
     match_id: int,
-    match: Annotated[Match, AfterValidator(Match.model_validate)],
+    match: MatchWithOdds,
     session: Session = Depends(get_session),
     token: str = Depends(verify_update_token),
 ):
-    db_match = session.get(Match, match_id)
-    if not db_match:
+    db_record = session.get(MatchRecord, match_id)
+    if not db_record:
         raise HTTPException(status_code=404, detail="Match not found")
     match_data = match.model_dump(exclude_unset=True)
-    db_match.sqlmodel_update(match_data)
-    session.add(db_match)
+    db_record.sqlmodel_update(_to_record(session, match_data))
+    odds = {column: match_data[column] for column in ODDS_COLUMNS if column in match_data}
+    if odds:
+        # Only now are the odds loaded
+        if db_record.odds is None:
+            db_record.odds = MatchOdds()
+        db_record.odds.sqlmodel_update(odds)
+    session.add(db_record)
     session.commit()
-    session.refresh(db_match)
-    return db_match
+    bump_data_version()
+    return session.get(Match, match_id)
 
 
 @router.delete(
@@ -123,8 +336,9 @@ def delete_match(
     session: Session = Depends(get_session),
     token: str = Depends(verify_delete_token),
 ):
-    match = session.get(Match, match_id)
-    if not match:
+    record = session.get(MatchRecord, match_id)
+    if not record:
         raise HTTPException(status_code=404, detail="Match not found")
-    session.delete(match)
+    session.delete(record)
     session.commit()
+    bump_data_version()
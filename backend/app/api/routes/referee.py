@@ -1,9 +1,11 @@
 from typing import Annotated, List
 
-from app.core.db import get_session
+from app.core.bulk import BulkUpsertResult, bulk_upsert
+from app.core.config import settings
+from app.core.db import bump_data_version, get_session, upsert
 from app.core.security import verify_add_token, verify_delete_token, verify_update_token
 from app.models import Referee, RefereeFilter
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, status
 from fastapi_filter import FilterDepends
 from pydantic import AfterValidator
 from sqlalchemy.exc import IntegrityError
@@ -28,6 +30,7 @@ def create_referee(
     try:
         session.add(referee)
         session.commit()
+        bump_data_version()
         session.refresh(referee)
         return referee
     except IntegrityError as e:
@@ -54,22 +57,34 @@ def upsert_referee(
     session: Session = Depends(get_session),
     token: str = Depends(verify_add_token),
 ):
+    # Insert or update by the unique name in one statement
+    db_referee = upsert(session, referee, ["name"])
+    session.commit()
+    bump_data_version()
+    return db_referee
 
-    # Get the existing referee by the unique name
-    statement = select(Referee).where(Referee.name == referee.name)
-    db_referee = session.exec(statement).first()
-    # If there is no referee in the database then take the whole model
-    if db_referee is None:
-        db_referee = referee
-    else:
-        # Otherwise, update the data (not the id)
-        for key, value in referee.model_dump(exclude={"id"}).items():
-            setattr(db_referee, key, value)
 
-    session.add(db_referee)
+@router.post(
+    "/bulk_upsert",
+    response_model=BulkUpsertResult,
+    include_in_schema=False,
+)
+def bulk_upsert_referees(
+    rows: List[Annotated[Referee, AfterValidator(Referee.model_validate)]] = Body(
+        max_length=settings.BULK_UPSERT_MAX_ROWS
+    ),
+    session: Session = Depends(get_session),
+    token: str = Depends(verify_add_token),
+):
+    """
+    Upserts many referees at once. Every row gets an outcome: inserted, updated,
+    unchanged or failed (with the reason).
+    """
+    data = [row.model_dump(exclude_unset=True) for row in rows]
+    result = bulk_upsert(session, Referee, data, ["name"])
     session.commit()
-    session.refresh(db_referee)
-    return db_referee
+    bump_data_version()
+    return result
 
 
 @router.get("/list", response_model=List[Referee])
@@ -106,6 +121,7 @@ def update_referee(
     db_referee.sqlmodel_update(referee_data)
     session.add(db_referee)
     session.commit()
+    bump_data_version()
     session.refresh(db_referee)
     return db_referee
 
@@ -125,3 +141,4 @@ def delete_referee(
         raise HTTPException(status_code=404, detail="Referee not found")
     session.delete(referee)
     session.commit()
+    bump_data_version()
@@ -1,9 +1,11 @@
 from typing import Annotated, List
 
-from app.core.db import get_session
+from app.core.bulk import BulkUpsertResult, bulk_upsert
+from app.core.config import settings
+from app.core.db import bump_data_version, get_session, upsert
 from app.core.security import verify_add_token, verify_delete_token, verify_update_token
 from app.models import Season, SeasonFilter
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, status
 from fastapi_filter import FilterDepends, with_prefix
 from pydantic import AfterValidator
 from sqlalchemy.exc import IntegrityError
@@ -26,6 +28,7 @@ def create_season(
     try:
         session.add(season)
         session.commit()
+        bump_data_version()
         session.refresh(season)
         return season
     except IntegrityError as e:
@@ -52,23 +55,36 @@ def upsert_season(
     session: Session = Depends(get_session),
     token: str = Depends(verify_add_token),
 ):
-    # Get the existing referee by the unique name
-    statement = select(Season).where(Season.name == season.name)
-    db_season = session.exec(statement).first()
-    # If there is no season in the database then take the whole model
-    if db_season is None:
-        db_season = season
-    else:
-        # Otherwise, update the data (not the id)
-        for key, value in season.model_dump(exclude={"id"}).items():
-            setattr(db_season, key, value)
-
-    session.add(db_season)
+    # Insert or update by the unique name in one statement
+    db_season = upsert(session, season, ["name"])
     session.commit()
-    session.refresh(db_season)
+    bump_data_version()
     return db_season
 
 
+@router.post(
+    "/bulk_upsert",
+    response_model=BulkUpsertResult,
+    include_in_schema=False,
+)
+def bulk_upsert_seasons(
+    rows: List[Annotated[Season, AfterValidator(Season.model_validate)]] = Body(
+        max_length=settings.BULK_UPSERT_MAX_ROWS
+    ),
+    session: Session = Depends(get_session),
+    token: str = Depends(verify_add_token),
+):
+    """
+    Upserts many seasons at once. Every row gets an outcome: inserted, updated,
+    unchanged or failed (with the reason).
+    """
+    data = [row.model_dump(exclude_unset=True) for row in rows]
+    result = bulk_upsert(session, Season, data, ["name"])
+    session.commit()
+    bump_data_version()
+    return result
+
+
 @router.get("/list", response_model=List[Season])
 def read_seasons(
     season_filter: SeasonFilter = FilterDepends(SeasonFilter),
@@ -103,6 +119,7 @@ def update_season(
     db_season.sqlmodel_update(season_data)
     session.add(db_season)
     session.commit()
+    bump_data_version()
     session.refresh(db_season)
     return db_season
 
@@ -122,3 +139,4 @@ def delete_season(
         raise HTTPException(status_code=404, detail="Season not found")
     session.delete(season)
     session.commit()
+    bump_data_version()
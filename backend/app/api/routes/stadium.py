@@ -1,9 +1,11 @@
 from typing import Annotated, List
 
-from app.core.db import get_session
+from app.core.bulk import BulkUpsertResult, bulk_upsert
+from app.core.config import settings
+from app.core.db import bump_data_version, get_session, upsert
 from app.core.security import verify_add_token, verify_delete_token, verify_update_token
 from app.models import Stadium, StadiumFilter, Team
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, status
 from fastapi_filter import FilterDepends
 from pydantic import AfterValidator
 from sqlalchemy.exc import IntegrityError
@@ -37,6 +39,7 @@ def create_stadium(
 
         session.add(stadium)
         session.commit()
+        bump_data_version()
         session.refresh(stadium)
         return stadium
     except IntegrityError as e:
@@ -63,22 +66,34 @@ def upsert_stadium(
     session: Session = Depends(get_session),
     token: str = Depends(verify_add_token),
 ):
+    # Insert or update by the unique name in one statement
+    db_stadium = upsert(session, stadium, ["name"])
+    session.commit()
+    bump_data_version()
+    return db_stadium
 
-    # Get the existing Stadium by the unique name
-    statement = select(Stadium).where(Stadium.name == stadium.name)
-    db_stadium = session.exec(statement).first()
-    # If there is no Stadium in the database then take the whole model
-    if db_stadium is None:
-        db_stadium = stadium
-    else:
-        # Otherwise, update the data (not the id)
-        for key, value in stadium.model_dump(exclude={"id"}).items():
-            setattr(db_stadium, key, value)
 
-    session.add(db_stadium)
+@router.post(
+    "/bulk_upsert",
+    response_model=BulkUpsertResult,
+    include_in_schema=False,
+)
+def bulk_upsert_stadiums(
+    rows: List[Annotated[Stadium, AfterValidator(Stadium.model_validate)]] = Body(
+        max_length=settings.BULK_UPSERT_MAX_ROWS
+    ),
+    session: Session = Depends(get_session),
+    token: str = Depends(verify_add_token),
+):
+    """
+    Upserts many stadiums at once. Every row gets an outcome: inserted, updated,
+    unchanged or failed (with the reason).
+    """
+    data = [row.model_dump(exclude_unset=True) for row in rows]
+    result = bulk_upsert(session, Stadium, data, ["name"])
     session.commit()
-    session.refresh(db_stadium)
-    return db_stadium
+    bump_data_version()
+    return result
 
 
 @router.get("/list", response_model=List[Stadium])
@@ -115,6 +130,7 @@ def update_stadium(
     db_stadium.sqlmodel_update(stadium_data)
     session.add(db_stadium)
     session.commit()
+    bump_data_version()
     session.refresh(db_stadium)
     return db_stadium
 
@@ -134,3 +150,4 @@ def delete_Stadium(
         raise HTTPException(status_code=404, detail="Stadium not found")
     session.delete(stadium)
     session.commit()
+    bump_data_version()
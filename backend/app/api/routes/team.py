@@ -1,9 +1,11 @@
 from typing import Annotated, List
 
-from app.core.db import get_session
+from app.core.bulk import BulkUpsertResult, bulk_upsert
+from app.core.config import settings
+from app.core.db import bump_data_version, get_session, upsert
 from app.core.security import verify_add_token, verify_delete_token, verify_update_token
 from app.models import Team, TeamFilter, TeamSeason, TeamSeasonFilter
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, status
 from fastapi_filter import FilterDepends
 from pydantic import AfterValidator
 from sqlalchemy.exc import IntegrityError
@@ -26,6 +28,7 @@ def create_team(
     try:
         session.add(team)
         session.commit()
+        bump_data_version()
         session.refresh(team)
         return team
     except IntegrityError as e:
@@ -52,23 +55,36 @@ def upsert_team(
     session: Session = Depends(get_session),
     token: str = Depends(verify_add_token),
 ):
-    # Get the existing referee by the unique name
-    statement = select(Team).where(Team.name == team.name)
-    db_team = session.exec(statement).first()
-    # If there is no team in the database then take the whole model
-    if db_team is None:
-        db_team = team
-    else:
-        # Otherwise, update the data (not the id)
-        for key, value in team.model_dump(exclude={"id"}).items():
-            setattr(db_team, key, value)
-
-    session.add(db_team)
+    # Insert or update by the unique name in one statement
+    db_team = upsert(session, team, ["name"])
     session.commit()
-    session.refresh(db_team)
+    bump_data_version()
     return db_team
 
 
+@router.post(
+    "/bulk_upsert",
+    response_model=BulkUpsertResult,
+    include_in_schema=False,
+)
+def bulk_upsert_teams(
+    rows: List[Annotated[Team, AfterValidator(Team.model_validate)]] = Body(
+        max_length=settings.BULK_UPSERT_MAX_ROWS
+    ),
+    session: Session = Depends(get_session),
+    token: str = Depends(verify_add_token),
+):
+    """
+    Upserts many teams at once. Every row gets an outcome: inserted, updated,
+    unchanged or failed (with the reason).
+    """
+    data = [row.model_dump(exclude_unset=True) for row in rows]
+    result = bulk_upsert(session, Team, data, ["name"])
+    session.commit()
+    bump_data_version()
+    return result
+
+
 @router.get("/list", response_model=List[Team])
 def read_referees(
     team_filter: TeamFilter = FilterDepends(TeamFilter),
@@ -103,6 +119,7 @@ def update_team(
     db_team.sqlmodel_update(team_data)
     session.add(db_team)
     session.commit()
+    bump_data_version()
     session.refresh(db_team)
     return db_team
 
@@ -122,6 +139,7 @@ def delete_team(
         raise HTTPException(status_code=404, detail="Team not found")
     session.delete(team)
     session.commit()
+    bump_data_version()
 
 
 @router.post(
@@ -135,27 +153,36 @@ def upsert_team_season(
     session: Session = Depends(get_session),
     token: str = Depends(verify_add_token),
 ):
-    # Get the existing team_season by the unique combination of team_id and season_id
-    statement = select(TeamSeason).where(
-        TeamSeason.team_name == team_season.team_name,
-        TeamSeason.season_name == team_season.season_name,
-    )
-    db_team_season = session.exec(statement).first()
-
-    # If there is no team_season in the database then take the whole model
-    if db_team_season is None:
-        db_team_season = team_season
-    else:
-        # Otherwise, update the data (not the id)
-        for key, value in team_season.model_dump(exclude={"id"}).items():
-            setattr(db_team_season, key, value)
-
-    session.add(db_team_season)
+    # Insert or update by the unique team and season in one statement
+    db_team_season = upsert(session, team_season, ["team_name", "season_name"])
     session.commit()
-    session.refresh(db_team_season)
+    bump_data_version()
     return db_team_season
 
 
+@router.post(
+    "/season/bulk_upsert",
+    response_model=BulkUpsertResult,
+    include_in_schema=False,
+)
+def bulk_upsert_team_seasons(
+    rows: List[Annotated[TeamSeason, AfterValidator(TeamSeason.model_validate)]] = Body(
+        max_length=settings.BULK_UPSERT_MAX_ROWS
+    ),
+    session: Session = Depends(get_session),
+    token: str = Depends(verify_add_token),
+):
+    """
+    Upserts many team seasons at once. Every row gets an outcome: inserted, updated,
+    unchanged or failed (with the reason).
+    """
+    data = [row.model_dump(exclude_unset=True) for row in rows]
+    result = bulk_upsert(session, TeamSeason, data, ["team_name", "season_name"])
+    session.commit()
+    bump_data_version()
+    return result
+
+
 @router.get("/season/list", response_model=List[TeamSeason])
 def read_team_seasons(
     skip: int = 0,
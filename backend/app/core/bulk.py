@@ -0,0 +1,164 @@
+from typing import Callable, Dict, List, Literal, Optional, Sequence, Tuple, Type
+
+from app.core.config import settings
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import literal_column, tuple_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import Session, SQLModel
+
+# Postgres takes at most 65535 parameters per statement, leave some headroom
+MAX_PARAMETERS = 60000
+
+
+class RowOutcome(BaseModel):
+    index: int
+    outcome: Literal["inserted", "updated", "unchanged", "failed"]
+    # Only known for rows that were written
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BulkUpsertResult(BaseModel):
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    rows: List[RowOutcome] = []
+
+
+def _validate(
+    model: Type[SQLModel],
+    rows: List[dict],
+    keys: Sequence[str],
+    prepare: Optional[Callable[[dict], dict]] = None,
+) -> Tuple[Dict[tuple, Tuple[int, dict]], List[RowOutcome]]:
+    """
+    Validates every row in one pass. Returns the valid rows by their natural key
+    along with the outcomes of the invalid ones. Of rows with the same key the
+    last one wins, like it would with one upsert after the other.
+    """
+    valid: Dict[tuple, Tuple[int, dict]] = {}
+    failed = []
+    for index, row in enumerate(rows):
+        try:
+            if prepare is not None:
+                row = prepare(row)
+            values = model.model_validate(row).model_dump(exclude={"id"})
+        except ValidationError as e:
+            errors = "; ".join(
+                f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+                for error in e.errors()
+            )
+            failed.append(RowOutcome(index=index, outcome="failed", error=errors))
+            continue
+        except ValueError as e:
+            failed.append(RowOutcome(index=index, outcome="failed", error=str(e)))
+            continue
+        key = tuple(values[column] for column in keys)
+        if key in valid:
+            duplicate = valid[key][0]
+            failed.append(
+                RowOutcome(
+                    index=duplicate,
+                    outcome="failed",
+                    error=f"Replaced by row {index} with the same key",
+                )
+            )
+        valid[key] = (index, values)
+    return valid, failed
+
+
+def _upsert_batch(
+    session: Session,
+    model: Type[SQLModel],
+    batch: List[Tuple[int, dict]],
+    keys: Sequence[str],
+) -> List[RowOutcome]:
+    table = model.__table__
+    columns = list(batch[0][1])
+    updated = [column for column in columns if column not in keys]
+    statement = insert(table).values([values for _, values in batch])
+    if updated:
+        # Rows that would not change are left alone, and so not returned
+        statement = statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={column: statement.excluded[column] for column in updated},
+            where=tuple_(*[table.c[column] for column in updated]).is_distinct_from(
+                tuple_(*[statement.excluded[column] for column in updated])
+            ),
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=list(keys))
+    # xmax is only set on rows that existed before the statement
+    statement = statement.returning(
+        list(table.primary_key)[0].label("id"),
+        literal_column("xmax = 0").label("inserted"),
+        *[table.c[column] for column in keys],
+    )
+
+    written = {
+        tuple(row[2:]): (row.id, row.inserted) for row in session.exec(statement).all()
+    }
+    outcomes = []
+    for index, values in batch:
+        key = tuple(values[column] for column in keys)
+        if key not in written:
+            outcomes.append(RowOutcome(index=index, outcome="unchanged"))
+            continue
+        row_id, inserted = written[key]
+        outcome = "inserted" if inserted else "updated"
+        outcomes.append(RowOutcome(index=index, outcome=outcome, id=row_id))
+    return outcomes
+
+
+def _upsert_rows_one_by_one(
+    session: Session,
+    model: Type[SQLModel],
+    batch: List[Tuple[int, dict]],
+    keys: Sequence[str],
+) -> List[RowOutcome]:
+    outcomes = []
+    for row in batch:
+        try:
+            with session.begin_nested():
+                outcomes += _upsert_batch(session, model, [row], keys)
+        except DBAPIError as e:
+            error = str(e.orig).splitlines()[0]
+            outcomes.append(RowOutcome(index=row[0], outcome="failed", error=error))
+    return outcomes
+
+
+def bulk_upsert(
+    session: Session,
+    model: Type[SQLModel],
+    rows: List[dict],
+    keys: Sequence[str],
+    prepare: Optional[Callable[[dict], dict]] = None,
+) -> BulkUpsertResult:
+    """
+    Inserts or updates many rows by their natural `keys` with multi-row
+    `INSERT ... ON CONFLICT DO UPDATE` statements of up to
+    `BULK_UPSERT_BATCH_SIZE` rows. A batch the database rejects (e.g. for a
+    missing team) is retried row by row, so that only the offending rows fail.
+    `prepare` maps each row before it is validated, a ValueError it raises fails
+    the row. Returns the outcome of every row in the order they were given. The
+    caller commits.
+    """
+    valid, outcomes = _validate(model, rows, keys, prepare)
+    pending = sorted(valid.values(), key=lambda row: row[0])
+    if pending:
+        columns = len(pending[0][1])
+        size = max(1, min(settings.BULK_UPSERT_BATCH_SIZE, MAX_PARAMETERS // columns))
+        for start in range(0, len(pending), size):
+            batch = pending[start : start + size]
+            try:
+                with session.begin_nested():
+                    outcomes += _upsert_batch(session, model, batch, keys)
+            except DBAPIError:
+                outcomes += _upsert_rows_one_by_one(session, model, batch, keys)
+
+    result = BulkUpsertResult(rows=sorted(outcomes, key=lambda outcome: outcome.index))
+    for outcome in result.rows:
+        setattr(result, outcome.outcome, getattr(result, outcome.outcome) + 1)
+    return result
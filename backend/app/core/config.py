@@ -77,6 +77,97 @@ class Settings(BaseSettings):
 
     # OpenAI API settings
     TOGETHER_API_KEY: str
+    TOGETHER_BASE_URL: str | None = None
+    SQL_MODEL: str = "meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo"
+    ANSWER_MODEL: str = "meta-llama/Meta-Llama-3.1-70B-Instruct-Turbo"
+
+    # Questions scoring at most SQL_SMALL_MODEL_MAX_COMPLEXITY go to the small
+    # model, and are escalated to SQL_MODEL if its SQL is invalid or fails to run.
+    # Set SQL_SMALL_MODEL to an empty string to send everything to SQL_MODEL
+    SQL_SMALL_MODEL: str = "meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo"
+    SQL_SMALL_MODEL_MAX_COMPLEXITY: int = 1
+
+    # Hedged NL-to-SQL requests. When the SQL model has not answered by the given
+    # percentile of its recent latencies, the same request is sent to the hedge
+    # model (on its own endpoint if a base URL is set) and the first answer wins
+    SQL_HEDGE_MODEL: str | None = None
+    SQL_HEDGE_BASE_URL: str | None = None
+    SQL_HEDGE_API_KEY: str | None = None
+    SQL_HEDGE_PERCENTILE: float = 95.0
+    SQL_HEDGE_DEFAULT_DELAY_SECONDS: float = 3.0
+    SQL_HEDGE_MIN_SAMPLES: int = 20
+
+    # NL-to-SQL cache settings
+    SQL_CACHE_MAX_SIZE: int = 1024
+    SQL_CACHE_TTL_SECONDS: int = 3600
+
+    # Query result cache settings
+    RESULT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESULT_CACHE_TTL_SECONDS: int = 600
+    # How long a worker goes without seeing writes made through other workers
+    DATA_VERSION_TTL_SECONDS: float = 2.0
+
+    # Team, referee and season names the question templates match against are
+    # reloaded on writes, and at least this often for changes made outside the API
+    ENTITY_NAMES_TTL_SECONDS: int = 300
+
+    # Limits for running model generated SQL
+    NL_QUERY_STATEMENT_TIMEOUT_MS: int = 5000
+    NL_QUERY_MAX_COST: float = 50000.0
+    NL_QUERY_MAX_ROWS: int = 5000
+
+    # Results larger than a page are returned one page at a time behind a handle
+    RESULT_PAGE_SIZE: int = 100
+    RESULT_HANDLE_TTL_SECONDS: int = 3600
+
+    # Conversations keep their latest turns within the token budget, and are
+    # dropped once they have not been used for the TTL
+    CONVERSATION_MAX_TOKENS: int = 800
+    CONVERSATION_TTL_SECONDS: int = 1800
+
+    # /bulk_upsert routes: rows per request, and rows per INSERT statement
+    BULK_UPSERT_MAX_ROWS: int = 20000
+    BULK_UPSERT_BATCH_SIZE: int = 1000
+
+    # /import/matches: bytes read at a time, and bytes of an uploaded zip kept in
+    # memory before it is spooled to disk
+    IMPORT_CHUNK_SIZE: int = 64 * 1024
+    IMPORT_SPOOL_SIZE: int = 8 * 1024 * 1024
+
+    # Most questions a single /ask_stats/batch request may ask
+    STATS_BATCH_MAX_QUESTIONS: int = 50
+
+    # Coalescing of identical in-flight questions. Shared mode also coalesces
+    # across workers through claims in the sharedresponse table: the others poll
+    # for the response, and take over a claim older than the wait
+    SINGLE_FLIGHT_SHARED: bool = False
+    SINGLE_FLIGHT_SHARED_TTL_SECONDS: int = 30
+    SINGLE_FLIGHT_SHARED_WAIT_SECONDS: int = 60
+    SINGLE_FLIGHT_SHARED_POLL_SECONDS: float = 0.1
+
+    # Answers of the answer model, kept in the cachedanswer table. Answers past
+    # the TTL are regenerated, but still served while the provider is down
+    ANSWER_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    ANSWER_CACHE_MAX_STALE_SECONDS: int = 90 * 24 * 3600
+
+    # Questions whose SQL and answers `python -m app.precompute` stores ahead of time,
+    # the suggestions on the frontend's home page by default
+    PRECOMPUTE_QUESTIONS: list[str] = [
+        "What seasons has Norwich played in",
+        "Matches that Mike Dean refereed in 18/19 season",
+        "Betting odds for Liverpool vs ManU 22/23 away game",
+    ]
+    # The SQL the job generates for them is used by every worker for this long,
+    # a day and some slack when it runs nightly
+    PRECOMPUTED_PLAN_TTL_SECONDS: int = 36 * 3600
+
+    # LLM gateway: concurrent provider calls, the queue behind them and the
+    # circuit breaker that stops calling a failing provider
+    LLM_MAX_IN_FLIGHT: int = 8
+    LLM_MAX_QUEUE: int = 32
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 10.0
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 5
+    LLM_CIRCUIT_RESET_SECONDS: float = 30.0
 
     @model_validator(mode="after")
     def _enforce_non_default_secrets(self) -> Self:
@@ -1,10 +1,18 @@
-from collections.abc import Generator
+import time
+from collections.abc import AsyncGenerator, Generator
+from typing import Sequence, TypeVar
 
-from sqlmodel import Session, create_engine
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.core.config import settings
+from app.models import DataVersion
 
 engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
+# psycopg 3 speaks asyncio natively, so the same URI works for the async engine
+async_engine = create_async_engine(str(settings.SQLALCHEMY_DATABASE_URI))
 
 
 # make sure all SQLModel models are imported (app.models) before initializing DB
@@ -12,6 +20,70 @@ engine = create_engine(str(settings.SQLALCHEMY_DATABASE_URI))
 # for more details: https://github.com/fastapi/full-stack-fastapi-template/issues/28
 
 
+ModelT = TypeVar("ModelT", bound=SQLModel)
+
+
+def upsert(session: Session, row: ModelT, keys: Sequence[str]) -> ModelT:
+    """
+    Inserts `row`, or updates the row with the same natural `keys`, in a single
+    `INSERT ... ON CONFLICT DO UPDATE ... RETURNING` statement. The id is never
+    updated. The stored row is returned detached, so that it can still be read
+    after the caller commits without loading it again.
+    """
+    model = type(row)
+    values = row.model_dump(exclude={"id"})
+    statement = insert(model).values(**values)
+    # Rows that are nothing but their key still need an update for RETURNING
+    # to return them on a conflict
+    updated = [column for column in values if column not in keys] or list(keys)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: statement.excluded[column] for column in updated},
+    ).returning(model)
+    # A copy of the row already in the session is overwritten with what was stored
+    statement = statement.execution_options(populate_existing=True)
+    db_row = session.exec(statement).scalar_one()
+    session.expunge(db_row)
+    return db_row
+
+
 def get_session() -> Generator[Session, None, None]:
     with Session(engine) as session:
         yield session
+
+
+async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+    async with AsyncSession(async_engine) as session:
+        yield session
+
+
+# Bumped by every write route so caches of query results know when they are
+# stale. The version is kept in the data_version table so that a write through
+# any worker reaches the caches of all of them. Each worker reads it again once
+# its copy is older than DATA_VERSION_TTL_SECONDS.
+_data_version = 0
+_data_version_read_at = float("-inf")
+
+
+def _remember_data_version(version: int) -> int:
+    global _data_version, _data_version_read_at
+    _data_version, _data_version_read_at = version, time.monotonic()
+    return version
+
+
+async def get_data_version() -> int:
+    if time.monotonic() - _data_version_read_at >= settings.DATA_VERSION_TTL_SECONDS:
+        statement = select(DataVersion.version).where(DataVersion.id == 1)
+        async with async_engine.connect() as connection:
+            version = (await connection.execute(statement)).scalar_one_or_none()
+        _remember_data_version(version or 0)
+    return _data_version
+
+
+def bump_data_version() -> int:
+    statement = insert(DataVersion).values(id=1, version=1)
+    statement = statement.on_conflict_do_update(
+        index_elements=["id"], set_={"version": DataVersion.version + 1}
+    ).returning(DataVersion.version)
+    with engine.begin() as connection:
+        return _remember_data_version(connection.execute(statement).scalar_one())
@@ -0,0 +1,303 @@
+import csv
+import re
+from pathlib import PurePosixPath
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.models import MatchOdds, MatchRecord
+from pydantic import BaseModel
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# Football-data CSV headers and the match columns they load into, the same
+# mapping as `match_row` in data/upsert_match_data.py
+CSV_COLUMNS: Dict[str, str] = {
+    "Div": "division",
+    "Date": "match_date",
+    "Time": "match_time",
+    "HomeTeam": "home_team_name",
+    "AwayTeam": "away_team_name",
+    "Referee": "referee_name",
+    "FTHG": "full_time_home_goals",
+    "FTAG": "full_time_away_goals",
+    "FTR": "full_time_result",
+    "HTHG": "half_time_home_goals",
+    "HTAG": "half_time_away_goals",
+    "HTR": "half_time_result",
+    "HS": "home_shots",
+    "AS": "away_shots",
+    "HST": "home_shots_on_target",
+    "AST": "away_shots_on_target",
+    "HF": "home_fouls",
+    "AF": "away_fouls",
+    "HC": "home_corners",
+    "AC": "away_corners",
+    "HY": "home_yellow_cards",
+    "AY": "away_yellow_cards",
+    "HR": "home_red_cards",
+    "AR": "away_red_cards",
+    "B365H": "bet365_home_win_odds",
+    "B365D": "bet365_draw_odds",
+    "B365A": "bet365_away_win_odds",
+    "BWH": "bet_and_win_home_win_odds",
+    "BWD": "bet_and_win_draw_odds",
+    "BWA": "bet_and_win_away_win_odds",
+    "IWH": "interwetten_home_win_odds",
+    "IWD": "interwetten_draw_odds",
+    "IWA": "interwetten_away_win_odds",
+    "PSH": "pinnacle_home_win_odds",
+    "PSD": "pinnacle_draw_odds",
+    "PSA": "pinnacle_away_win_odds",
+    "WHH": "william_hill_home_win_odds",
+    "WHD": "william_hill_draw_odds",
+    "WHA": "william_hill_away_win_odds",
+    "VCH": "vc_bet_home_win_odds",
+    "VCD": "vc_bet_draw_odds",
+    "VCA": "vc_bet_away_win_odds",
+    "MaxH": "max_home_win_odds",
+    "MaxD": "max_draw_odds",
+    "MaxA": "max_away_win_odds",
+    "AvgH": "avg_home_win_odds",
+    "AvgD": "avg_draw_odds",
+    "AvgA": "avg_away_win_odds",
+    "B365>2.5": "bet365_over_2_5_odds",
+    "B365<2.5": "bet365_under_2_5_odds",
+    "P>2.5": "pinnacle_over_2_5_odds",
+    "P<2.5": "pinnacle_under_2_5_odds",
+    "Max>2.5": "max_over_2_5_odds",
+    "Max<2.5": "max_under_2_5_odds",
+    "Avg>2.5": "avg_over_2_5_odds",
+    "Avg<2.5": "avg_under_2_5_odds",
+    "AHh": "asian_handicap_line",
+    "B365AHH": "bet365_asian_handicap_home_odds",
+    "B365AHA": "bet365_asian_handicap_away_odds",
+    "PAHH": "pinnacle_asian_handicap_home_odds",
+    "PAHA": "pinnacle_asian_handicap_away_odds",
+    "MaxAHH": "max_asian_handicap_home_odds",
+    "MaxAHA": "max_asian_handicap_away_odds",
+    "AvgAHH": "avg_asian_handicap_home_odds",
+    "AvgAHA": "avg_asian_handicap_away_odds",
+}
+REQUIRED_HEADERS = ["Date", "HomeTeam", "AwayTeam"]
+# Columns of names, which are stored as the ids of `MatchRecord`
+NAME_COLUMNS = ["home_team_name", "away_team_name", "referee_name"]
+NATURAL_KEY = ["season_id", "home_team_id", "away_team_id", "match_date"]
+
+
+class ImportedFile(BaseModel):
+    file_name: Optional[str] = None
+    season_name: str
+    # Distinct matches in the file
+    rows: int
+    inserted: int
+    updated: int
+    unchanged: int
+    # Headers without a match column
+    ignored_columns: List[str] = []
+
+
+class ImportResult(BaseModel):
+    files: List[ImportedFile] = []
+
+
+def season_from_file_name(file_name: str) -> Optional[str]:
+    """
+    The season of a `prem_<yy>_<yy>_stats.csv` file, e.g. "English Premier League
+    2000/01 Season" for prem_00_01_stats.csv. None for any other file.
+    """
+    match = re.fullmatch(
+        r"prem_(\d{2})_(\d{2})_stats\.csv", PurePosixPath(file_name).name
+    )
+    if match is None:
+        return None
+    start_year = int(match.group(1))
+    full_start_year = (2000 if start_year < 50 else 1900) + start_year
+    return f"English Premier League {full_start_year}/{match.group(2)} Season"
+
+
+def _value(staged: Dict[str, str], column: str) -> str:
+    table = (
+        MatchOdds.__table__ if column in MatchOdds.__table__.c else MatchRecord.__table__
+    )
+    column_type = table.c[column].type.compile(dialect=postgresql.dialect())
+    value = f"NULLIF({staged[column]}, '')" if column in staged else "NULL"
+    return f"CAST({value} AS {column_type})"
+
+
+def merge_statements(header: List[str]) -> List[str]:
+    """
+    SQL that merges the staged rows of one season into the seasons, teams, team
+    seasons, referees and finally the matches with their odds, each in a single
+    statement. Match columns missing from the file are set to NULL, like the
+    per-row upsert does. Of rows with the same natural key the last one wins, and
+    those are collected in `match_source` first. The last statement returns the
+    number of matches in the file, inserted and updated, where a match counts as
+    updated when only its odds changed.
+    """
+    staged = {
+        CSV_COLUMNS[name]: f"c{index}"
+        for index, name in enumerate(header)
+        if name in CSV_COLUMNS
+    }
+    home, away, day = (staged[column] for column in NAME_COLUMNS[:2] + ["match_date"])
+    # Football-data files sometimes end in rows of empty fields
+    rows = f"match_import WHERE {home} <> '' AND {away} <> ''"
+    statements = [
+        "INSERT INTO season (name) VALUES (:season_name) ON CONFLICT (name) DO NOTHING",
+        f"""
+        INSERT INTO team (name)
+        SELECT {home} FROM {rows} UNION SELECT {away} FROM {rows}
+        ON CONFLICT (name) DO NOTHING
+        """,
+        f"""
+        INSERT INTO teamseason (team_name, season_name)
+        SELECT {home}, :season_name FROM {rows}
+        UNION SELECT {away}, :season_name FROM {rows}
+        ON CONFLICT (team_name, season_name) DO NOTHING
+        """,
+    ]
+    if "referee_name" in staged:
+        referee = staged["referee_name"]
+        statements.append(
+            f"""
+            INSERT INTO referee (name)
+            SELECT DISTINCT {referee} FROM {rows} AND {referee} <> ''
+            ON CONFLICT (name) DO NOTHING
+            """
+        )
+
+    odds = [column for column in CSV_COLUMNS.values() if column in MatchOdds.__table__.c]
+    values = [
+        column
+        for column in CSV_COLUMNS.values()
+        if column not in NAME_COLUMNS and column not in odds
+    ]
+    columns = ["season_id", "home_team_id", "away_team_id", "referee_id"] + values
+    updated = [column for column in columns if column not in NATURAL_KEY]
+    key = ", ".join(NATURAL_KEY)
+    if "referee_name" in staged:
+        referee_id = "referee.id"
+        referee_join = f"LEFT JOIN referee ON referee.name = {staged['referee_name']}"
+    else:
+        referee_id, referee_join = "CAST(NULL AS INTEGER)", ""
+    # The rows are kept in an analyzed table, so the joins below are planned for
+    # their real number and not the one row assumed for the CTE of a fresh table
+    statements += [
+        f"""
+        CREATE TEMP TABLE match_source ON COMMIT DROP AS
+        SELECT DISTINCT ON ({home}, {away}, {day})
+                season.id AS season_id,
+                home.id AS home_team_id,
+                away.id AS away_team_id,
+                {referee_id} AS referee_id,
+                {", ".join(f"{_value(staged, column)} AS {column}" for column in values + odds)}
+            FROM match_import
+            JOIN season ON season.name = :season_name
+            JOIN team home ON home.name = {home}
+            JOIN team away ON away.name = {away}
+            {referee_join}
+            WHERE {home} <> '' AND {away} <> ''
+            ORDER BY {home}, {away}, {day}, match_import.ctid DESC
+        """,
+        "ANALYZE match_source",
+        f"""
+        WITH written AS (
+            INSERT INTO match_record ({", ".join(columns)})
+            SELECT {", ".join(columns)} FROM match_source
+            ON CONFLICT ({key}) DO UPDATE
+            SET {", ".join(f"{column} = EXCLUDED.{column}" for column in updated)}
+            WHERE ({", ".join(f"match_record.{column}" for column in updated)})
+                IS DISTINCT FROM ({", ".join(f"EXCLUDED.{column}" for column in updated)})
+            RETURNING id, xmax = 0 AS inserted, {key}
+        ),
+        -- Only the matches that changed are returned above, the ids of the
+        -- others are already in match_record
+        match_ids AS (
+            SELECT id, {key} FROM written WHERE inserted
+            UNION ALL
+            SELECT match_record.id, {key}
+            FROM match_source JOIN match_record USING ({key})
+        ),
+        odds_written AS (
+            INSERT INTO match_odds (match_id, {", ".join(odds)})
+            SELECT match_ids.id, {", ".join(odds)}
+            FROM match_source JOIN match_ids USING ({key})
+            ON CONFLICT (match_id) DO UPDATE
+            SET {", ".join(f"{column} = EXCLUDED.{column}" for column in odds)}
+            WHERE ({", ".join(f"match_odds.{column}" for column in odds)})
+                IS DISTINCT FROM ({", ".join(f"EXCLUDED.{column}" for column in odds)})
+            RETURNING match_id
+        )
+        SELECT
+            (SELECT count(*) FROM match_source),
+            (SELECT count(*) FROM written WHERE inserted),
+            (
+                SELECT count(*) FROM (
+                    SELECT id FROM written WHERE NOT inserted
+                    UNION SELECT match_id FROM odds_written
+                    EXCEPT SELECT id FROM written WHERE inserted
+                ) AS changed
+            )
+        """,
+    ]
+    return statements
+
+
+async def _header(chunks: AsyncIterator[bytes]) -> Tuple[List[str], bytes]:
+    """
+    Reads up to the end of the header line. Returns the header and whatever was
+    read past it.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        if b"\n" in buffer:
+            break
+    line, _, rest = buffer.partition(b"\n")
+    header = next(csv.reader([line.decode("utf-8-sig").strip()]), [])
+    return header, rest
+
+
+async def import_csv(
+    connection: AsyncConnection,
+    season_name: str,
+    chunks: AsyncIterator[bytes],
+    file_name: Optional[str] = None,
+) -> ImportedFile:
+    """
+    Loads a season CSV into the matches: the rows are streamed into a staging
+    table with COPY and merged from there with `merge_statements`, so memory use
+    does not depend on the size of the file. The caller commits.
+    """
+    header, rest = await _header(chunks)
+    missing = [name for name in REQUIRED_HEADERS if name not in header]
+    if missing:
+        raise ValueError(f"{file_name or season_name} has no {', '.join(missing)} column")
+
+    # Every column of the file is staged as text and cast when merged
+    staging = ", ".join(f"c{index} text" for index in range(len(header)))
+    await connection.execute(text("DROP TABLE IF EXISTS match_import, match_source"))
+    await connection.execute(
+        text(f"CREATE TEMP TABLE match_import ({staging}) ON COMMIT DROP")
+    )
+    raw_connection = (await connection.get_raw_connection()).driver_connection
+    async with raw_connection.cursor() as cursor:
+        async with cursor.copy("COPY match_import FROM STDIN WITH (FORMAT csv)") as copy:
+            await copy.write(rest)
+            async for chunk in chunks:
+                await copy.write(chunk)
+
+    params = {"season_name": season_name}
+    *dimensions, matches = merge_statements(header)
+    for statement in dimensions:
+        await connection.execute(text(statement), params)
+    rows, inserted, updated = (await connection.execute(text(matches), params)).one()
+    return ImportedFile(
+        file_name=file_name,
+        season_name=season_name,
+        rows=rows,
+        inserted=inserted,
+        updated=updated,
+        unchanged=rows - inserted - updated,
+        ignored_columns=[name for name in header if name not in CSV_COLUMNS],
+    )
@@ -1,8 +1,10 @@
 from app.api.main import api_router
 from app.core.config import settings
+from app.core.metrics import render_metrics
 from app.pre_start import main
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 app = FastAPI(
     title="premstats", description="Service to query any English Premier League stat."
@@ -28,5 +30,11 @@ async def healthcheck():
     return {"message": "Thus spoke St. Alia-of-the-Knife"}
 
 
+# Metrics in the Prometheus text format
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return render_metrics()
+
+
 # API
 app.include_router(api_router, prefix="/api")
@@ -1,8 +1,10 @@
-from datetime import date, time
+from datetime import date, datetime, time
 from typing import List, Optional
 
 from fastapi_filter import FilterDepends, with_prefix
 from fastapi_filter.contrib.sqlalchemy import Filter
+from sqlalchemy import Column, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlmodel import Field, Relationship, SQLModel
 
 
@@ -63,6 +65,12 @@ class TeamSeason(SQLModel, table=True):
     Mapping between every season a team played in
     """
 
+    __table_args__ = (
+        Index(
+            "ix_teamseason_team_name_season_name", "team_name", "season_name", unique=True
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     team_name: Optional[str] = Field(foreign_key="team.name", description="Team name")
     season_name: Optional[str] = Field(foreign_key="season.name", description="Season")
@@ -83,7 +91,7 @@ class TeamSeasonFilter(Filter):
 
 class Stadium(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    name: str = Field(default=None, index=True)
+    name: str = Field(default=None, index=True, unique=True)
     home_team: Optional[str] = Field(foreign_key="team.name", description="Home Team")
 
 
@@ -122,42 +130,19 @@ class RefereeFilter(Filter):
         search_model_fields = ["name"]
 
 
-class Match(SQLModel, table=True):
+class MatchBase(SQLModel):
     """
-    Represents a football match with detailed statistics and betting odds.
+    Result and statistics of a football match, shared by the stored
+    `MatchRecord` and the `Match` view.
     """
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
     # Basic Match Information
-    season_name: str = Field(foreign_key="season.name", description="The season year")
-    season: "Season" = Relationship(back_populates="matches")
     division: str = Field(description="League Division")
     match_date: date = Field(description="Match Date (YYYY-MM-DD)")
     match_time: Optional[time] = Field(description="Match Kick-off Time (HH:MM)")
 
-    # Team Relationships
-    home_team_name: str = Field(
-        foreign_key="team.name", description="Name of the Home Team"
-    )
-    away_team_name: str = Field(
-        foreign_key="team.name", description="Name of the Away Team"
-    )
-    home_team: "Team" = Relationship(
-        back_populates="home_matches",
-        sa_relationship_kwargs={"foreign_keys": "Match.home_team_name"},
-    )
-    away_team: "Team" = Relationship(
-        back_populates="away_matches",
-        sa_relationship_kwargs={"foreign_keys": "Match.away_team_name"},
-    )
-
-    # Referee Relationship
-    referee_name: Optional[str] = Field(
-        default=None, foreign_key="referee.name", description="ID of the Referee"
-    )
-    referee: Optional["Referee"] = Relationship(back_populates="matches")
-
     # Full Time Results
     full_time_home_goals: int = Field(description="Full Time Home Team Goals")
     full_time_away_goals: int = Field(description="Full Time Away Team Goals")
@@ -198,6 +183,12 @@ class Match(SQLModel, table=True):
     home_red_cards: Optional[int] = Field(default=None, description="Home Team Red Cards")
     away_red_cards: Optional[int] = Field(default=None, description="Away Team Red Cards")
 
+
+class MatchOddsBase(SQLModel):
+    """
+    Betting odds of a football match.
+    """
+
     # Betting Odds - 1X2 (Match Result)
     bet365_home_win_odds: Optional[float] = Field(
         default=None, description="Bet365 Home Win Odds"
@@ -328,6 +319,115 @@ class Match(SQLModel, table=True):
     )
 
 
+class MatchOdds(MatchOddsBase, table=True):
+    """
+    The betting odds of a match, kept apart from the match so that queries and
+    routes that only need results don't read them.
+    """
+
+    __tablename__ = "match_odds"
+
+    match_id: Optional[int] = Field(
+        default=None,
+        primary_key=True,
+        foreign_key="match_record.id",
+        ondelete="CASCADE",
+        description="ID of the Match",
+    )
+
+
+class MatchRecord(MatchBase, table=True):
+    """
+    A stored football match. Seasons, teams and referees are referenced by id,
+    the `match` view puts their names back.
+    """
+
+    __tablename__ = "match_record"
+    # The natural key upserts conflict on, also the index for season lookups
+    __table_args__ = (
+        Index(
+            "ix_match_record_natural_key",
+            "season_id",
+            "home_team_id",
+            "away_team_id",
+            "match_date",
+            unique=True,
+        ),
+    )
+
+    season_id: int = Field(foreign_key="season.id", description="ID of the Season")
+    home_team_id: int = Field(
+        foreign_key="team.id", index=True, description="ID of the Home Team"
+    )
+    away_team_id: int = Field(
+        foreign_key="team.id", index=True, description="ID of the Away Team"
+    )
+    referee_id: Optional[int] = Field(
+        default=None,
+        foreign_key="referee.id",
+        index=True,
+        description="ID of the Referee",
+    )
+
+    # Relationships
+    # Only loaded when read, the match routes and queries mostly don't need them
+    odds: Optional["MatchOdds"] = Relationship(
+        sa_relationship_kwargs={
+            "lazy": "select",
+            "uselist": False,
+            "cascade": "all, delete-orphan",
+            "passive_deletes": True,
+        }
+    )
+
+
+class MatchNames(SQLModel):
+    """
+    Season, team and referee names of a football match, stored as ids in
+    `MatchRecord`.
+    """
+
+    season_name: str = Field(foreign_key="season.name", description="The season year")
+    home_team_name: str = Field(
+        foreign_key="team.name", description="Name of the Home Team"
+    )
+    away_team_name: str = Field(
+        foreign_key="team.name", description="Name of the Away Team"
+    )
+    referee_name: Optional[str] = Field(
+        default=None, foreign_key="referee.name", description="ID of the Referee"
+    )
+
+
+class Match(MatchNames, MatchBase, table=True):
+    """
+    Represents a football match with detailed statistics. Read from the `match`
+    view, which joins the season, team and referee names to `match_record`.
+    Writes go to `MatchRecord`, the betting odds are in `MatchOdds`.
+    """
+
+    # A view created by the migrations, Alembic leaves it alone
+    __table_args__ = {"info": {"is_view": True}}
+
+    season: "Season" = Relationship(back_populates="matches")
+    home_team: "Team" = Relationship(
+        back_populates="home_matches",
+        sa_relationship_kwargs={"foreign_keys": "Match.home_team_name"},
+    )
+    away_team: "Team" = Relationship(
+        back_populates="away_matches",
+        sa_relationship_kwargs={"foreign_keys": "Match.away_team_name"},
+    )
+    referee: Optional["Referee"] = Relationship(back_populates="matches")
+
+
+class MatchWithOdds(MatchNames, MatchBase, MatchOddsBase):
+    """
+    A football match with its betting odds, as the match routes and the data
+    scripts write it.
+    """
+
+
 class MatchFilter(Filter):
     season_name: Optional[str] = None
     division: Optional[str] = None
@@ -346,3 +446,76 @@ class MatchFilter(Filter):
     class Constants(Filter.Constants):
         model = Match
         search_model_fields = ["home_team_name", "away_team_name", "referee_name"]
+
+
+class SharedResponse(SQLModel, table=True):
+    """
+    Recently computed `/ask_stats` responses, shared between workers so that an
+    identical question in flight on several workers is only answered once, and
+    the claims of the workers computing them.
+    """
+
+    key: str = Field(primary_key=True, description="Normalized question and date")
+    # None while a worker is computing it
+    response: Optional[dict] = Field(
+        default=None, sa_column=Column(JSONB(none_as_null=True), nullable=True)
+    )
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class ResultHandle(SQLModel, table=True):
+    """
+    SQL of a large `/ask_stats` result, kept so that any worker can serve the
+    rest of its rows page by page or as a stream.
+    """
+
+    id: str = Field(primary_key=True)
+    sql: str
+    params: dict = Field(default_factory=dict, sa_column=Column(JSONB, nullable=False))
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class CachedAnswer(SQLModel, table=True):
+    """
+    Answers of the answer model by question and the rows they were written from,
+    shared between workers and kept across restarts.
+    """
+
+    question: str = Field(primary_key=True, description="Normalized question")
+    data_hash: str = Field(primary_key=True, description="SHA-256 of the rows as JSON")
+    answer: str
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class PrecomputedPlan(SQLModel, table=True):
+    """
+    SQL that `python -m app.precompute` generated for a popular question, so that
+    every worker can skip the SQL model for it until the next run.
+    """
+
+    question: str = Field(primary_key=True, description="Normalized question")
+    plan: dict = Field(sa_column=Column(JSONB, nullable=False))
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class Conversation(SQLModel, table=True):
+    """
+    Recent questions of a conversation with their SQL and a summary of their
+    results, so that follow-up questions can refer back to them.
+    """
+
+    id: str = Field(primary_key=True)
+    turns: list = Field(default_factory=list, sa_column=Column(JSONB, nullable=False))
+    updated_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class DataVersion(SQLModel, table=True):
+    """
+    A single row counting writes to the football data, shared by every worker so
+    that caches of query results everywhere know when they are stale.
+    """
+
+    __tablename__ = "data_version"
+
+    id: int = Field(default=1, primary_key=True)
+    version: int = Field(default=0)
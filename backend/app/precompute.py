@@ -0,0 +1,94 @@
+""" Runs popular questions through the `/ask_stats` pipeline so that their SQL
+and answers are stored before anyone asks them. Meant to be run off-peak, e.g.
+nightly from cron:
+
+    python -m app.precompute                  # settings.PRECOMPUTE_QUESTIONS
+    python -m app.precompute "Question" ...   # the given questions
+    python -m app.precompute --file questions.txt
+"""
+
+import argparse
+import asyncio
+import sys
+from typing import List, NamedTuple, Optional
+
+from app.api.querying.plans import save_precomputed_plan
+from app.api.querying.stats import answer_question, plan_query
+from app.api.querying.timing import request_timer
+from app.core.config import settings
+from app.core.db import async_engine
+from fastapi import HTTPException
+
+
+class Precomputed(NamedTuple):
+    question: str
+    seconds: float
+    # Where the answer came from, "data" for results too long to answer
+    answer_path: Optional[str] = None
+    error: Optional[str] = None
+    stages: str = ""
+
+
+async def precompute_question(question: str) -> Precomputed:
+    answer_path, error = None, None
+    try:
+        with request_timer() as timer:
+            # Generated anew, the plan of the previous run may be out of date. Every
+            # worker then plans the question from the stored one.
+            plan = await plan_query(question, precomputed=False)
+            if plan.path == "llm":
+                await save_precomputed_plan(question, plan)
+            result = await answer_question(question)
+        answer_path = result.get("answer_path", "data")
+    except Exception as e:
+        error = str(e.detail) if isinstance(e, HTTPException) else repr(e)
+
+    # The timer ends with the total, after the stages
+    *spans, (_, seconds) = timer.spans
+    stages = " ".join(f"{stage}={duration:.2f}s" for stage, duration in spans)
+    return Precomputed(question, seconds, answer_path, error, stages)
+
+
+async def precompute(questions: List[str]) -> List[Precomputed]:
+    """
+    Answers the questions one at a time, leaving the rest of the LLM gateway's
+    capacity to live traffic.
+    """
+    results = [await precompute_question(question) for question in questions]
+    # The pooled connections belong to this event loop
+    await async_engine.dispose()
+    return results
+
+
+def print_report(results: List[Precomputed]) -> None:
+    for result in results:
+        if result.error is None:
+            print(
+                f"ok     {result.seconds:6.2f}s  {result.answer_path:8}  {result.question}"
+            )
+        else:
+            print(f"FAILED {result.seconds:6.2f}s  {result.question}: {result.error}")
+        if result.stages:
+            print(f"       {result.stages}")
+    failures = sum(1 for result in results if result.error is not None)
+    total = sum(result.seconds for result in results)
+    print(f"{len(results) - failures} answered, {failures} failed in {total:.2f}s")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0].strip())
+    parser.add_argument("questions", nargs="*", help="defaults to PRECOMPUTE_QUESTIONS")
+    parser.add_argument("--file", help="file with one question per line")
+    args = parser.parse_args(argv)
+
+    questions = list(args.questions)
+    if args.file:
+        with open(args.file) as f:
+            questions += [line.strip() for line in f if line.strip()]
+    results = asyncio.run(precompute(questions or settings.PRECOMPUTE_QUESTIONS))
+    print_report(results)
+    return 1 if any(result.error is not None for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
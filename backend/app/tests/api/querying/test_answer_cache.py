@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+from app.api.querying import stats
+from app.api.querying.answers import answer_key
+from app.api.querying.normalize import normalize_question
+from app.core.db import engine
+from app.models import CachedAnswer
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlmodel import Session, update
+
+TABLE_SQL = (
+    "SELECT * FROM (VALUES ('Arsenal', 3, 1), ('Chelsea', 2, 2)) "
+    "AS t(team, scored, conceded)"
+)
+
+
+def test_answer_key_ignores_question_formatting() -> None:
+    rows = [{"team": "Arsenal", "scored": 3}]
+    assert answer_key("Goals  by Arsenal?", rows) == answer_key("goals by arsenal", rows)
+    assert answer_key("Goals by Arsenal?", rows) != answer_key("Goals by Arsenal?", [])
+
+
+def test_answers_are_cached_and_served_stale(client: TestClient, monkeypatch) -> None:
+    calls = []
+
+    async def fake_get_sql(query: str, model=None) -> str:
+        return TABLE_SQL
+
+    async def fake_get_answer(user_question: str, data) -> str:
+        calls.append(user_question)
+        return "Arsenal scored more."
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    monkeypatch.setattr(stats, "get_answer", fake_get_answer)
+    question = {"message": "Who scored more, cached?"}
+
+    first = client.post("/api/query/ask_stats", json=question).json()
+    second = client.post("/api/query/ask_stats", json=question).json()
+    assert (first["answer_path"], second["answer_path"]) == ("llm", "cache")
+    assert second["message"] == "Arsenal scored more."
+    assert len(calls) == 1
+
+    # Expire the answer and take the provider down
+    with Session(engine) as session:
+        session.exec(
+            update(CachedAnswer)
+            .where(CachedAnswer.question == normalize_question(question["message"]))
+            .values(created_at=datetime.utcnow() - timedelta(days=30))
+        )
+        session.commit()
+
+    async def failing_get_answer(user_question: str, data) -> str:
+        raise HTTPException(status_code=503, detail="down")
+
+    monkeypatch.setattr(stats, "get_answer", failing_get_answer)
+    response = client.post("/api/query/ask_stats", json=question)
+    assert response.status_code == 200
+    assert response.json()["message"] == "Arsenal scored more."
+
+    response = client.post("/api/query/ask_stats", json={"message": "Never asked?"})
+    assert response.status_code == 503
@@ -0,0 +1,119 @@
+from app.api.querying import stats
+from app.core.config import settings
+from fastapi.testclient import TestClient
+
+# Several rows with more than two columns, which only the model can answer
+TABLE_SQL = (
+    "SELECT * FROM (VALUES ('Arsenal', 3, 1), ('Chelsea', 2, 2)) "
+    "AS t(team, scored, conceded)"
+)
+
+
+def test_ask_stats_runs_generated_sql(client: TestClient, monkeypatch) -> None:
+    async def fake_get_sql(query: str, model=None) -> str:
+        return "SELECT 2 AS goals"
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+
+    response = client.post("/api/query/ask_stats", json={"message": "How many goals?"})
+    assert response.status_code == 200
+    content = response.json()
+    assert content["message"] == "**Goals**: 2"
+    assert content["data"] == [{"goals": 2}]
+    assert content["path"] == "llm"
+    assert content["answer_path"] == "template"
+
+
+def test_ask_stats_uses_model_for_other_shapes(client: TestClient, monkeypatch) -> None:
+    async def fake_get_sql(query: str, model=None) -> str:
+        return TABLE_SQL
+
+    async def fake_get_answer(user_question: str, data) -> str:
+        return f"{len(data)} rows"
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    monkeypatch.setattr(stats, "get_answer", fake_get_answer)
+
+    response = client.post("/api/query/ask_stats", json={"message": "Goals by team?"})
+    assert response.status_code == 200
+    content = response.json()
+    assert content["message"] == "2 rows"
+    assert content["answer_path"] == "llm"
+
+
+def test_ask_stats_invalid_question(client: TestClient, monkeypatch) -> None:
+    async def fake_get_sql(query: str, model=None) -> str:
+        return "invalid"
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+
+    response = client.post("/api/query/ask_stats", json={"message": "What is love?"})
+    assert response.status_code == 400
+
+
+def test_ask_stats_stream_emits_stages(client: TestClient, monkeypatch) -> None:
+    async def fake_get_sql(query: str, model=None) -> str:
+        return TABLE_SQL
+
+    async def fake_stream_answer(user_question: str, data):
+        for token in ["**2**", " goals"]:
+            yield token
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    monkeypatch.setattr(stats, "stream_answer", fake_stream_answer)
+
+    response = client.post(
+        "/api/query/ask_stats/stream", json={"message": "How many goals?"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        line.removeprefix("event: ")
+        for line in response.text.splitlines()
+        if line.startswith("event: ")
+    ]
+    assert events == ["sql", "data", "token", "token", "done"]
+    assert 'data: {"message": "**2** goals", "answer_path": "llm"}' in response.text
+
+
+def ask_with_sql(client: TestClient, monkeypatch, sql_query: str):
+    async def fake_get_sql(query: str, model=None) -> str:
+        return sql_query
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    stats.result_cache.clear()
+    return client.post("/api/query/ask_stats", json={"message": "Anything?"})
+
+
+def test_ask_stats_rejects_expensive_plans(client: TestClient, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "NL_QUERY_MAX_COST", 1.0)
+    response = ask_with_sql(
+        client, monkeypatch, 'SELECT * FROM "match" m1 CROSS JOIN teamseason t1'
+    )
+    assert response.status_code == 422
+    detail = response.json()["detail"]
+    assert detail["code"] == "query_too_expensive"
+    assert detail["estimated_cost"] > detail["max_cost"]
+
+
+def test_ask_stats_rejects_writes(client: TestClient, monkeypatch) -> None:
+    response = ask_with_sql(client, monkeypatch, "DELETE FROM teamseason")
+    assert response.status_code == 422
+    assert response.json()["detail"]["code"] == "query_not_read_only"
+
+
+def test_ask_stats_times_out(client: TestClient, monkeypatch) -> None:
+    monkeypatch.setattr(settings, "NL_QUERY_STATEMENT_TIMEOUT_MS", 10)
+    response = ask_with_sql(client, monkeypatch, "SELECT pg_sleep(1)")
+    assert response.status_code == 504
+    assert response.json()["detail"]["code"] == "query_timeout"
+
+
+def test_ask_stats_rejects_writes_in_ctes(client: TestClient, monkeypatch) -> None:
+    response = ask_with_sql(
+        client,
+        monkeypatch,
+        "WITH gone AS (DELETE FROM teamseason RETURNING id) SELECT count(*) FROM gone",
+    )
+    assert response.status_code == 422
+    assert response.json()["detail"]["code"] == "query_not_read_only"
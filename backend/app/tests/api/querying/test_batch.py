@@ -0,0 +1,81 @@
+import asyncio
+
+from app.api.querying import stats
+from app.core.config import settings
+from fastapi.testclient import TestClient
+
+
+def test_batch_answers_in_order(client: TestClient, monkeypatch) -> None:
+    calls = []
+    running = 0
+    most_running = 0
+
+    async def fake_get_sql(query: str, model=None) -> str:
+        nonlocal running, most_running
+        calls.append(query)
+        running += 1
+        most_running = max(most_running, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        if "love" in query:
+            return "invalid"
+        return f"SELECT {len(query)} AS goals"
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    questions = ["How many goals?", "What is love?", "how many  goals", "Goals, batched?"]
+
+    response = client.post(
+        "/api/query/ask_stats/batch",
+        json={"questions": [{"message": question} for question in questions]},
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["question"] for result in results] == questions
+    assert results[0]["data"] == results[2]["data"] == [{"goals": 15}]
+    assert results[1]["error"]["status_code"] == 400
+    assert results[3]["data"] == [{"goals": 15}]
+    # Duplicates are asked once and the rest at the same time
+    assert set(calls) == {"How many goals?", "What is love?", "Goals, batched?"}
+    assert most_running == 3
+
+
+def test_batch_runs_sql_while_a_question_escalates(
+    client: TestClient, monkeypatch
+) -> None:
+    events = []
+    execute_sql = stats.execute_sql
+
+    async def fake_get_sql(query: str, model=None) -> str:
+        if model == settings.SQL_MODEL:
+            await asyncio.sleep(0.2)
+            events.append("escalated")
+            return "SELECT 2 AS meetings"
+        if "Arsenal" in query:
+            # Passes the checks but fails in Postgres
+            return "SELECT 1 / 0 AS meetings"
+        await asyncio.sleep(0.05)
+        return "SELECT 7 AS goals"
+
+    async def recording_execute_sql(session, sql_query, *args):
+        results = await execute_sql(session, sql_query, *args)
+        events.append(sql_query)
+        return results
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    monkeypatch.setattr(stats, "execute_sql", recording_execute_sql)
+
+    questions = ["Arsenal vs Chelsea last season", "Goals while escalating?"]
+    response = client.post(
+        "/api/query/ask_stats/batch",
+        json={"questions": [{"message": question} for question in questions]},
+    )
+    results = response.json()["results"]
+    assert results[0]["data"] == [{"meetings": 2}]
+    assert results[1]["data"] == [{"goals": 7}]
+    # The other question's SQL doesn't wait for the large model
+    assert events == ["SELECT 7 AS goals", "escalated", "SELECT 2 AS meetings"]
+
+
+def test_batch_limits_questions(client: TestClient) -> None:
+    response = client.post("/api/query/ask_stats/batch", json={"questions": []})
+    assert response.status_code == 422
@@ -0,0 +1,75 @@
+from app.api.querying import stats
+from app.api.querying.conversations import trim_turns
+from app.api.querying.utils import get_follow_up_messages
+from app.core.config import settings
+from fastapi.testclient import TestClient
+
+
+def test_follow_up_gets_history(client: TestClient, monkeypatch) -> None:
+    queries, follow_ups = [], []
+
+    async def fake_get_sql(query: str, model=None) -> str:
+        queries.append(query)
+        return f"SELECT {len(queries)} AS wins"
+
+    async def fake_get_follow_up_sql(turns, query: str, model: str) -> str:
+        follow_ups.append((turns, query))
+        return "invalid" if "Ipswich" in query else "SELECT 2 AS wins"
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    monkeypatch.setattr(stats, "get_follow_up_sql", fake_get_follow_up_sql)
+    conversation_id = client.post("/api/query/conversations").json()["conversation_id"]
+
+    def ask(message: str):
+        return client.post(
+            "/api/query/ask_stats",
+            json={"message": message, "conversation_id": conversation_id},
+        )
+
+    assert ask("Wins for Norwich in 2019/20?").status_code == 200
+    assert queries == ["Wins for Norwich in 2019/20?"]
+    assert follow_ups == []
+
+    # Follow-ups go without the schema
+    assert ask("and the season after?").status_code == 200
+    assert len(queries) == 1
+    turns, query = follow_ups[-1]
+    assert query == "and the season after?"
+    assert turns[0]["question"] == "Wins for Norwich in 2019/20?"
+    assert turns[0]["sql"] == "SELECT 1 AS wins"
+
+    # and with it, and the history, when the earlier SQL is not enough
+    assert ask("and for Ipswich?").status_code == 200
+    follow_up = queries[-1]
+    assert "Q: Wins for Norwich in 2019/20?" in follow_up
+    assert "SQL: SELECT 1 AS wins" in follow_up
+    assert 'Result: 1 rows, starting [{"wins": 1}]' in follow_up
+    assert follow_up.endswith("and for Ipswich?")
+
+    response = client.delete(f"/api/query/conversations/{conversation_id}")
+    assert response.status_code == 204
+    assert ask("and the one after that?").status_code == 404
+
+
+def test_follow_up_messages_are_chat_turns() -> None:
+    turns = [{"question": "Wins for Norwich?", "sql": "SELECT 1", "summary": "1 rows"}]
+    messages = get_follow_up_messages(turns, "and Ipswich?")
+    assert [message["role"] for message in messages] == [
+        "system",
+        "user",
+        "assistant",
+        "user",
+    ]
+    assert "CREATE TABLE" not in messages[0]["content"]
+    assert messages[-1]["content"] == "Result: 1 rows\n\nand Ipswich?"
+
+
+def test_history_is_trimmed_to_budget(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "CONVERSATION_MAX_TOKENS", 60)
+    turns = [
+        {"question": f"Question {index}?", "sql": "SELECT 1", "summary": "1 rows"}
+        for index in range(10)
+    ]
+    trimmed = trim_turns(turns)
+    assert 0 < len(trimmed) < len(turns)
+    assert trimmed[-1] == turns[-1]
@@ -0,0 +1,50 @@
+from datetime import date
+from decimal import Decimal
+
+from app.api.querying.formatting import format_answer
+
+
+def test_format_no_rows() -> None:
+    assert format_answer([]) == "I couldn't find any data matching that question."
+
+
+def test_format_single_value() -> None:
+    assert format_answer([{"total_goals": 74}]) == "**Total goals**: 74"
+    assert format_answer([{"avg_goals": Decimal("2.6666")}]) == "**Avg goals**: 2.67"
+
+
+def test_format_single_row() -> None:
+    answer = format_answer([{"team": "Leicester", "points": 81}])
+    assert answer == "- **Team**: Leicester\n- **Points**: 81"
+
+
+def test_format_matches() -> None:
+    answer = format_answer(
+        [
+            {
+                "season_name": "English Premier League 2015/16 Season",
+                "match_date": date(2016, 5, 15),
+                "home_team_name": "Arsenal",
+                "away_team_name": "Aston Villa",
+                "full_time_home_goals": 4,
+                "full_time_away_goals": 0,
+            }
+        ]
+    )
+    assert answer.startswith("Here is the match:")
+    assert "*2016-05-15*: Arsenal **4 - 0** Aston Villa" in answer
+
+
+def test_format_grouped_counts() -> None:
+    answer = format_answer(
+        [{"team": "Arsenal", "wins": 26}, {"team": "Chelsea", "wins": 25}]
+    )
+    assert answer == "- **Arsenal**: 26\n- **Chelsea**: 25"
+
+
+def test_format_falls_back_for_other_shapes() -> None:
+    rows = [
+        {"team": "Arsenal", "scored": 3, "conceded": 1},
+        {"team": "Chelsea", "scored": 2, "conceded": 2},
+    ]
+    assert format_answer(rows) is None
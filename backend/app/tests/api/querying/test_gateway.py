@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+from app.api.querying import stats
+from app.api.querying.gateway import LLMGateway
+from app.api.querying.sandbox import reject_query
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+
+def make_gateway(**overrides) -> LLMGateway:
+    options = dict(
+        max_in_flight=1,
+        max_queue=1,
+        queue_timeout=1.0,
+        failure_threshold=2,
+        reset_timeout=60.0,
+    )
+    options.update(overrides)
+    return LLMGateway(**options)
+
+
+async def hold(gateway: LLMGateway, seconds: float) -> None:
+    async with gateway.slot():
+        await asyncio.sleep(seconds)
+
+
+def test_gateway_rejects_when_queue_is_full() -> None:
+    gateway = make_gateway()
+
+    async def main():
+        return await asyncio.gather(
+            hold(gateway, 0.05),
+            hold(gateway, 0.05),
+            hold(gateway, 0.05),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(main())
+    assert results[:2] == [None, None]
+    assert isinstance(results[2], HTTPException)
+    assert results[2].status_code == 503
+    assert results[2].detail["code"] == "llm_queue_full"
+    assert gateway.stats() == {
+        "in_flight": 0,
+        "queue_depth": 0,
+        "consecutive_failures": 0,
+        "circuit_open": False,
+    }
+
+
+def test_gateway_rejects_after_queue_timeout() -> None:
+    gateway = make_gateway(queue_timeout=0.01)
+
+    async def main():
+        return await asyncio.gather(
+            hold(gateway, 0.1), hold(gateway, 0), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert results[1].detail["code"] == "llm_queue_timeout"
+    assert gateway.in_flight == 0
+
+
+def test_circuit_opens_and_recovers() -> None:
+    gateway = make_gateway(reset_timeout=0.05)
+
+    async def fail():
+        async with gateway.slot():
+            raise ValueError("429")
+
+    async def main():
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                await fail()
+        with pytest.raises(HTTPException) as e:
+            await hold(gateway, 0)
+        assert e.value.detail["code"] == "llm_circuit_open"
+
+        # A failed trial call opens the circuit again
+        await asyncio.sleep(0.06)
+        with pytest.raises(ValueError):
+            await fail()
+        assert gateway.stats()["circuit_open"]
+
+        await asyncio.sleep(0.06)
+        await hold(gateway, 0)
+        assert not gateway.stats()["circuit_open"]
+
+    asyncio.run(main())
+
+
+def test_ask_stats_returns_503_when_busy(client: TestClient, monkeypatch) -> None:
+    async def busy_get_sql(query: str, model=None) -> str:
+        raise reject_query(503, "llm_queue_full", "The service is busy right now.")
+
+    monkeypatch.setattr(stats, "get_sql_cached", busy_get_sql)
+
+    response = client.post("/api/query/ask_stats", json={"message": "Busy?"})
+    assert response.status_code == 503
+    assert response.json()["detail"]["code"] == "llm_queue_full"
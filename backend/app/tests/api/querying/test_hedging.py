@@ -0,0 +1,102 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from app.api.querying import utils
+from app.api.querying.hedging import Hedger
+from together import AsyncTogether
+
+# Seconds the stub takes to answer for each model, a negative delay is an error
+MODEL_DELAYS = {"slow": 0.5, "fast": 0.0, "broken": -1}
+
+
+class StubCompletions(BaseHTTPRequestHandler):
+    """
+    Minimal OpenAI-compatible chat completions endpoint.
+    """
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        delay = MODEL_DELAYS[body["model"]]
+        if delay < 0:
+            self.send_response(500)
+            self.end_headers()
+            return
+        time.sleep(delay)
+        response = json.dumps(
+            {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": f"SELECT '{body['model']}' AS model",
+                        },
+                        "finish_reason": "stop",
+                    }
+                ],
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture(scope="module")
+def stub_client():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCompletions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield AsyncTogether(
+        api_key="stub",
+        base_url=f"http://127.0.0.1:{server.server_port}/v1",
+        max_retries=0,
+    )
+    server.shutdown()
+
+
+def hedged_sql(hedger: Hedger, client: AsyncTogether, primary: str, alternate: str):
+    return asyncio.run(
+        hedger.run(
+            lambda: utils.complete_sql("q", "prompt", model=primary, llm=client),
+            lambda: utils.complete_sql("q", "prompt", model=alternate, llm=client),
+        )
+    )
+
+
+def test_hedge_wins_when_primary_is_slow(stub_client) -> None:
+    hedger = Hedger(percentile=95, default_delay=0.05)
+    assert hedged_sql(hedger, stub_client, "slow", "fast") == "SELECT 'fast' AS model"
+    assert hedger.stats()["hedged"] == 1
+    assert hedger.stats()["hedge_win_rate"] == 1.0
+
+
+def test_no_hedge_when_primary_is_fast(stub_client) -> None:
+    hedger = Hedger(percentile=95, default_delay=0.3)
+    assert hedged_sql(hedger, stub_client, "fast", "slow") == "SELECT 'fast' AS model"
+    assert hedger.stats()["hedged"] == 0
+
+
+def test_failover_when_primary_fails(stub_client) -> None:
+    hedger = Hedger(percentile=95, default_delay=10)
+    assert hedged_sql(hedger, stub_client, "broken", "fast") == "SELECT 'fast' AS model"
+    assert hedger.stats()["hedge_wins"] == 1
+
+
+def test_deadline_follows_recent_latencies() -> None:
+    hedger = Hedger(percentile=90, default_delay=3, min_samples=10)
+    assert hedger.deadline() == 3
+    for i in range(1, 11):
+        hedger.latencies.record(i / 10)
+    assert hedger.deadline() == pytest.approx(0.9)
@@ -0,0 +1,93 @@
+import asyncio
+
+from app.api.querying import intents, stats
+from app.api.querying.intents import EntityNames, match_intent
+from app.core.config import settings
+from app.core.db import async_engine, engine
+from app.models import Team
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+SEASON = "English Premier League 2015/16 Season"
+NAMES = EntityNames(
+    teams={
+        "arsenal": "Arsenal",
+        "chelsea": "Chelsea",
+        "manchester united": "Manchester United",
+    },
+    referees={"michael oliver": "Michael Oliver"},
+    seasons={SEASON.lower(): SEASON},
+)
+
+
+def test_season_winner() -> None:
+    plan = match_intent("Who won the 2015/16 season?", NAMES)
+    assert plan.intent == "season_winner"
+    assert plan.path == "rule"
+    assert plan.params == {"season": SEASON}
+
+
+def test_head_to_head_folds_aliases() -> None:
+    plan = match_intent("Man Utd vs Arsenal", NAMES)
+    assert plan.intent == "head_to_head"
+    assert plan.params == {"team_a": "Manchester United", "team_b": "Arsenal"}
+
+
+def test_team_results_in_season() -> None:
+    plan = match_intent("Chelsea results in 2015-16", NAMES)
+    assert plan.intent == "team_season_results"
+    assert plan.params == {"team": "Chelsea", "season": SEASON}
+
+
+def test_last_n_matches() -> None:
+    plan = match_intent("Show me the last 5 games for Arsenal", NAMES)
+    assert plan.intent == "last_matches"
+    assert plan.params == {"team": "Arsenal", "limit": 5}
+    assert plan.sql.endswith("LIMIT :limit")
+
+
+def test_referee_matches() -> None:
+    plan = match_intent("Matches refereed by Michael Oliver", NAMES)
+    assert plan.intent == "referee_matches"
+    assert plan.params == {"referee": "Michael Oliver"}
+
+
+def test_unmatched_questions_fall_through() -> None:
+    assert match_intent("How many goals did Arsenal score vs Chelsea?", NAMES) is None
+    assert match_intent("Arsenal vs Chelsea last season", NAMES) is None
+    assert match_intent("Did Arsenal beat Chelsea in 2004?", NAMES) is None
+    assert match_intent("Who won the 1850/51 season?", NAMES) is None
+
+
+def test_ask_stats_reports_rule_path(client: TestClient, monkeypatch) -> None:
+    async def fake_get_entity_names() -> EntityNames:
+        return NAMES
+
+    async def fake_get_answer(user_question: str, data) -> str:
+        return "No matches."
+
+    monkeypatch.setattr(stats, "get_entity_names", fake_get_entity_names)
+    monkeypatch.setattr(stats, "get_answer", fake_get_answer)
+
+    response = client.post("/api/query/ask_stats", json={"message": "Arsenal v Chelsea"})
+    assert response.status_code == 200
+    assert response.json()["path"] == "rule"
+
+
+def test_entity_names_reload_after_ttl(monkeypatch) -> None:
+    async def load() -> EntityNames:
+        try:
+            return await intents.get_entity_names()
+        finally:
+            await async_engine.dispose()
+
+    monkeypatch.setattr(settings, "ENTITY_NAMES_TTL_SECONDS", 1000)
+    asyncio.run(load())
+    # Added without going through the API, so the data version stays the same
+    with Session(engine) as session:
+        session.add(Team(name="Tleilaxu"))
+        session.commit()
+    assert "tleilaxu" not in asyncio.run(load()).teams
+
+    monkeypatch.setattr(settings, "ENTITY_NAMES_TTL_SECONDS", 0)
+    assert asyncio.run(load()).teams["tleilaxu"] == "Tleilaxu"
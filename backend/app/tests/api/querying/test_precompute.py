@@ -0,0 +1,58 @@
+from app import precompute
+from app.api.querying import stats
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+TABLE_SQL = (
+    "SELECT * FROM (VALUES ('Norwich', 5, 1), ('Wolves', 6, 2)) "
+    "AS t(team, seasons, relegations)"
+)
+
+
+def test_precompute_fills_answer_cache(monkeypatch, capsys) -> None:
+    async def fake_get_sql(query: str, model=None) -> str:
+        if query == "Broken?":
+            raise HTTPException(status_code=503, detail="The service is busy.")
+        return TABLE_SQL
+
+    async def fake_get_answer(user_question: str, data) -> str:
+        return "Wolves have played more seasons."
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    monkeypatch.setattr(stats, "get_answer", fake_get_answer)
+
+    assert precompute.main(["Who played more seasons, precomputed?", "Broken?"]) == 1
+    report = capsys.readouterr().out
+    assert "ok" in report and "llm" in report
+    assert "FAILED" in report and "Broken?: The service is busy." in report
+    assert "1 answered, 1 failed" in report
+
+    # Asking again is answered from the cache
+    precompute.main(["Who played more seasons, precomputed?"])
+    assert "cache" in capsys.readouterr().out
+
+
+def test_precomputed_questions_skip_the_sql_model(
+    client: TestClient, monkeypatch
+) -> None:
+    async def fake_get_sql(query: str, model=None) -> str:
+        return TABLE_SQL
+
+    async def fake_get_answer(user_question: str, data) -> str:
+        return "Wolves have played more seasons."
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    monkeypatch.setattr(stats, "get_answer", fake_get_answer)
+    assert precompute.main(["Which teams have played the most seasons?"]) == 0
+
+    # Another worker, or this one after a restart, never calls the SQL model
+    async def unavailable_get_sql(query: str, model=None) -> str:
+        raise HTTPException(status_code=503, detail="The service is busy.")
+
+    monkeypatch.setattr(stats, "get_sql_cached", unavailable_get_sql)
+    response = client.post(
+        "/api/query/ask_stats",
+        json={"message": "which teams have played the most seasons"},
+    )
+    assert response.status_code == 200
+    assert response.json()["answer_path"] == "cache"
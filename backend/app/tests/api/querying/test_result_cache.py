@@ -0,0 +1,72 @@
+from app.api.querying import stats
+from app.api.querying.cache import SizedTTLCache
+from app.api.querying.normalize import canonicalize_sql
+from app.core.config import settings
+from app.core.db import engine
+from app.models import DataVersion, Team
+from fastapi.testclient import TestClient
+from sqlmodel import Session, update
+
+
+def test_canonicalize_sql_keeps_literals() -> None:
+    assert (
+        canonicalize_sql("SELECT  *\n FROM \"match\" WHERE home_team_name = 'Arsenal' ;")
+        == "select * from \"match\" where home_team_name = 'Arsenal'"
+    )
+
+
+def test_sized_cache_evicts_by_bytes() -> None:
+    cache = SizedTTLCache(max_bytes=10, ttl=60)
+    cache.set("a", [1], size=6)
+    cache.set("b", [2], size=6)
+    assert cache.get("a") is None
+    assert cache.get("b") == [2]
+    assert cache.current_bytes == 6
+
+    cache.set("c", [3], size=11)
+    assert cache.get("c") is None
+
+
+def test_write_routes_invalidate_cached_results(client: TestClient, monkeypatch) -> None:
+    async def fake_get_sql(query: str, model=None) -> str:
+        return "SELECT count(*) AS teams FROM team WHERE name = 'Sardaukar'"
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    stats.result_cache.clear()
+
+    response = client.post("/api/query/ask_stats", json={"message": "Sardaukar?"})
+    assert response.json()["data"] == [{"teams": 0}]
+    assert stats.result_cache.stats()["size"] == 1
+
+    response = client.post(
+        "/api/team/add",
+        json={"name": "Sardaukar"},
+        headers={"Authorization": f"Bearer {settings.ADD_ACCESS_TOKEN}"},
+    )
+    assert response.status_code == 201
+
+    response = client.post("/api/query/ask_stats", json={"message": "Sardaukar?"})
+    assert response.json()["data"] == [{"teams": 1}]
+
+
+def test_writes_through_other_workers_invalidate_cached_results(
+    client: TestClient, monkeypatch
+) -> None:
+    async def fake_get_sql(query: str, model=None) -> str:
+        return "SELECT count(*) AS teams FROM team WHERE name = 'Ixian'"
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    monkeypatch.setattr(settings, "DATA_VERSION_TTL_SECONDS", 0)
+    stats.result_cache.clear()
+
+    response = client.post("/api/query/ask_stats", json={"message": "Ixian?"})
+    assert response.json()["data"] == [{"teams": 0}]
+
+    # Another worker adds the team and bumps the version it shares with this one
+    with Session(engine) as session:
+        session.add(Team(name="Ixian"))
+        session.exec(update(DataVersion).values(version=DataVersion.version + 1))
+        session.commit()
+
+    response = client.post("/api/query/ask_stats", json={"message": "Ixian?"})
+    assert response.json()["data"] == [{"teams": 1}]
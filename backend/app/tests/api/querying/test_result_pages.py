@@ -0,0 +1,97 @@
+import json
+
+from app.api.querying import stats
+from app.api.querying.results import ordered_sql
+from fastapi.testclient import TestClient
+
+ROWS_SQL = "SELECT g AS n, g * 2 AS doubled FROM generate_series(1, 250) AS g ORDER BY g"
+
+
+def ask_for_rows(client: TestClient, monkeypatch, sql: str = ROWS_SQL) -> dict:
+    async def fake_get_sql(query: str, model=None) -> str:
+        return sql
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    response = client.post("/api/query/ask_stats", json={"message": f"Rows of {sql}?"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_large_results_are_paged(client: TestClient, monkeypatch) -> None:
+    content = ask_for_rows(client, monkeypatch)
+    assert len(content["data"]) == 100
+    assert content["data"][0] == {"n": 1, "doubled": 2}
+    assert content["next_cursor"] == 100
+
+    rows = content["data"]
+    cursor = content["next_cursor"]
+    while cursor is not None:
+        page = client.get(
+            f"/api/query/ask_stats/results/{content['handle']}", params={"cursor": cursor}
+        ).json()
+        rows += page["data"]
+        cursor = page["next_cursor"]
+    assert [row["n"] for row in rows] == list(range(1, 251))
+
+
+def test_pages_keep_the_order_of_the_sql(client: TestClient, monkeypatch) -> None:
+    content = ask_for_rows(client, monkeypatch, ROWS_SQL + " DESC")
+    page = client.get(
+        f"/api/query/ask_stats/results/{content['handle']}",
+        params={"cursor": content["next_cursor"], "limit": 2},
+    ).json()
+    assert page["data"] == [{"n": 150, "doubled": 300}, {"n": 149, "doubled": 298}]
+
+
+def all_pages(client: TestClient, content: dict) -> list:
+    rows = content["data"]
+    cursor = content["next_cursor"]
+    while cursor is not None:
+        page = client.get(
+            f"/api/query/ask_stats/results/{content['handle']}",
+            params={"cursor": cursor, "limit": 70},
+        ).json()
+        rows += page["data"]
+        cursor = page["next_cursor"]
+    return rows
+
+
+def test_pages_of_unordered_sql_line_up(client: TestClient, monkeypatch) -> None:
+    # Scrambled and without an ORDER BY, the pages are sorted by every column
+    sql = "SELECT g * 37 % 250 AS n FROM generate_series(1, 250) AS g"
+    rows = all_pages(client, ask_for_rows(client, monkeypatch, sql))
+    assert [row["n"] for row in rows] == list(range(250))
+
+    # Ties of the SQL's own order are broken by the columns
+    sql = "SELECT g % 3 AS k, 250 - g AS n FROM generate_series(1, 250) AS g ORDER BY k"
+    rows = all_pages(client, ask_for_rows(client, monkeypatch, sql))
+    assert [(row["k"], row["n"]) for row in rows] == sorted(
+        (g % 3, 250 - g) for g in range(1, 251)
+    )
+
+
+def test_ordered_sql_adds_every_column() -> None:
+    assert ordered_sql("SELECT a, b FROM t", 2) == "SELECT a, b FROM t ORDER BY 1, 2"
+    assert (
+        ordered_sql("SELECT a, b FROM t ORDER BY b DESC LIMIT 500", 2)
+        == "SELECT a, b FROM t ORDER BY b DESC, 1, 2 LIMIT 500"
+    )
+    assert (
+        ordered_sql("SELECT rank() OVER (ORDER BY a) FROM (SELECT a FROM t LIMIT 9) s", 1)
+        == "SELECT rank() OVER (ORDER BY a) FROM (SELECT a FROM t LIMIT 9) s ORDER BY 1"
+    )
+
+
+def test_large_results_stream_as_ndjson(client: TestClient, monkeypatch) -> None:
+    content = ask_for_rows(client, monkeypatch)
+
+    response = client.get(f"/api/query/ask_stats/results/{content['handle']}/ndjson")
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 250
+    assert rows[-1] == {"n": 250, "doubled": 500}
+
+
+def test_unknown_handles_are_not_found(client: TestClient) -> None:
+    response = client.get("/api/query/ask_stats/results/arrakis")
+    assert response.status_code == 404
@@ -0,0 +1,76 @@
+from app.api.querying import stats, utils
+from app.api.querying.routing import route_sql_model, score_complexity
+from app.core.config import settings
+from fastapi.testclient import TestClient
+
+
+def test_simple_questions_go_to_the_small_model() -> None:
+    assert score_complexity("Arsenal vs Chelsea last season") == 0
+    assert route_sql_model("Arsenal vs Chelsea last season") == settings.SQL_SMALL_MODEL
+
+
+def test_analytical_questions_go_to_the_large_model() -> None:
+    question = "Which team has the longest unbeaten streak at home since 2010?"
+    assert score_complexity(question) > settings.SQL_SMALL_MODEL_MAX_COMPLEXITY
+    assert route_sql_model(question) == settings.SQL_MODEL
+    assert route_sql_model("Average corners per game in 2015/16") == settings.SQL_MODEL
+
+
+def test_routing_can_be_disabled(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "SQL_SMALL_MODEL", "")
+    assert route_sql_model("Arsenal vs Chelsea last season") == settings.SQL_MODEL
+
+
+def test_failed_small_model_sql_escalates(client: TestClient, monkeypatch) -> None:
+    models = []
+
+    async def fake_get_sql(query: str, model=None) -> str:
+        models.append(model)
+        if model == settings.SQL_MODEL:
+            return "SELECT 2 AS meetings"
+        return "SELECT meetings FROM arrakis"
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+
+    response = client.post(
+        "/api/query/ask_stats", json={"message": "Arsenal vs Chelsea last season"}
+    )
+    assert response.status_code == 200
+    assert response.json()["data"] == [{"meetings": 2}]
+    assert models == [None, settings.SQL_MODEL]
+
+
+def test_invalid_small_model_answer_escalates(client: TestClient, monkeypatch) -> None:
+    async def fake_get_sql(query: str, model=None) -> str:
+        return "SELECT 3 AS meetings" if model == settings.SQL_MODEL else "invalid"
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+
+    response = client.post(
+        "/api/query/ask_stats", json={"message": "Arsenal vs Chelsea last season"}
+    )
+    assert response.json()["data"] == [{"meetings": 3}]
+
+
+def test_rejected_sql_leaves_the_sql_cache(client: TestClient, monkeypatch) -> None:
+    models = []
+
+    async def fake_get_sql(query: str, model=None) -> str:
+        models.append(model)
+        # Passes the checks but fails in Postgres
+        return "SELECT 4 AS meetings" if model == settings.SQL_MODEL else "SELECT 1 / 0"
+
+    monkeypatch.setattr(utils, "get_sql", fake_get_sql)
+    utils.sql_cache.clear()
+
+    for _ in range(2):
+        response = client.post(
+            "/api/query/ask_stats", json={"message": "Arsenal vs Chelsea this season"}
+        )
+        assert response.json()["data"] == [{"meetings": 4}]
+    # The small model is asked again, the large model's SQL comes from the cache
+    assert models == [
+        settings.SQL_SMALL_MODEL,
+        settings.SQL_MODEL,
+        settings.SQL_SMALL_MODEL,
+    ]
@@ -0,0 +1,53 @@
+import json
+from datetime import date
+from decimal import Decimal
+
+from app.api.querying.rows import convert_rows, convert_rows_to_essentials, json_size
+from sqlalchemy import create_engine, literal, select, union_all
+
+
+def make_rows():
+    engine = create_engine("sqlite://")
+    selects = [
+        select(
+            literal(index).label("id"),
+            literal(match_date).label("match_date"),
+            literal(team).label("home_team_name"),
+            literal(goals).label("full_time_home_goals"),
+            literal(odds).label("pinnacle_draw_odds"),
+        )
+        for index, match_date, team, goals, odds in [
+            (1, "2021-08-14", "Arsenal", 0, 3.4),
+            (2, "2023-05-28", 'Brighton "Seagulls"', None, None),
+            (3, "2022-02-10", "Wolves", 2, 3.1),
+        ]
+    ]
+    with engine.connect() as connection:
+        return connection.execute(union_all(*selects)).all()
+
+
+def test_convert_rows_in_one_pass() -> None:
+    rows = make_rows()
+    data, essentials, size = convert_rows(rows)
+
+    assert data == [row._asdict() for row in rows]
+    assert [row["match_date"] for row in essentials] == [
+        "2023-05-28",
+        "2022-02-10",
+        "2021-08-14",
+    ]
+    assert all("id" not in row and "pinnacle_draw_odds" not in row for row in essentials)
+    assert essentials == convert_rows_to_essentials(rows)
+    # Escaped quotes are counted once
+    assert size == len(json.dumps(essentials, default=str)) - 2
+
+
+def test_convert_rows_stops_counting_past_limit() -> None:
+    rows = make_rows()
+    assert 20 < convert_rows(rows, size_limit=20).size < convert_rows(rows).size
+    assert convert_rows([]) == ([], [], 2)
+
+
+def test_json_size_of_column_types() -> None:
+    for value in [None, True, False, 12, 2.5, "Spurs", date(2020, 1, 1), Decimal("1.5")]:
+        assert json_size(value) == len(json.dumps(value, default=str))
@@ -0,0 +1,56 @@
+import asyncio
+
+from app.api.querying import utils
+from app.api.querying.schema import (
+    SCHEMA_GROUPS,
+    build_schema_prompt,
+    estimate_tokens,
+    select_schema_groups,
+)
+from app.models import Match, MatchOdds
+
+
+def test_select_schema_groups() -> None:
+    assert select_schema_groups("Who won the 2015/16 season?") == frozenset()
+    assert select_schema_groups("Who scored the most goals between 2010 and 2012") == (
+        frozenset()
+    )
+    assert select_schema_groups("Which referee gave the most red cards?") == {
+        "referee",
+        "match_stats",
+    }
+    assert select_schema_groups("What were the odds on Leicester?") == {"odds"}
+    assert select_schema_groups("Which teams were relegated in 2019/20") == {"teamseason"}
+
+
+def test_full_schema_has_every_match_column() -> None:
+    schema = build_schema_prompt(SCHEMA_GROUPS)
+    for column in [*Match.__table__.columns, *MatchOdds.__table__.columns]:
+        assert f"\t{column.name} " in schema
+    assert "CREATE TABLE public.match_odds" in schema
+    assert "CREATE TABLE public.teamseason" in schema
+    assert "CREATE TABLE public.stadium" in schema
+
+
+def test_trimmed_schema_drops_unneeded_columns() -> None:
+    schema = build_schema_prompt(frozenset())
+    assert "full_time_home_goals" in schema
+    assert "bet365_home_win_odds" not in schema
+    assert "CREATE TABLE public.match_odds" not in schema
+    assert "home_corners" not in schema
+    assert "CREATE TABLE public.referee" not in schema
+    assert estimate_tokens(schema) < estimate_tokens(build_schema_prompt(SCHEMA_GROUPS))
+
+
+def test_get_sql_retries_invalid_with_full_schema(monkeypatch) -> None:
+    prompts = []
+
+    async def fake_complete_sql(query: str, system_prompt: str, model=None) -> str:
+        prompts.append(system_prompt)
+        return "invalid" if len(prompts) == 1 else "SELECT 1"
+
+    monkeypatch.setattr(utils, "complete_sql", fake_complete_sql)
+
+    assert asyncio.run(utils.get_sql("Who won the 2015/16 season?")) == "SELECT 1"
+    assert "bet365_home_win_odds" not in prompts[0]
+    assert "bet365_home_win_odds" in prompts[1]
@@ -0,0 +1,127 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+from app.api.querying.coalesce import SingleFlight, shared_flight
+from app.api.querying.timing import request_timer, span
+from app.core.db import async_engine, engine
+from app.models import SharedResponse
+from sqlmodel import Session
+
+
+def test_single_flight_coalesces_concurrent_calls() -> None:
+    flight = SingleFlight()
+    calls = []
+
+    async def compute() -> dict:
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"message": "Leicester"}
+
+    async def main():
+        return await asyncio.gather(*(flight.do("q", compute) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert results == [{"message": "Leicester"}] * 5
+    assert len(calls) == 1
+    assert flight.stats() == {"in_flight": 0, "leaders": 1, "coalesced": 4}
+
+
+def test_single_flight_shares_errors() -> None:
+    flight = SingleFlight()
+
+    async def compute() -> dict:
+        await asyncio.sleep(0.01)
+        raise ValueError("provider down")
+
+    async def main():
+        return await asyncio.gather(
+            flight.do("q", compute), flight.do("q", compute), return_exceptions=True
+        )
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, ValueError) for r in results)
+
+
+def test_single_flight_times_a_wait_for_followers() -> None:
+    flight = SingleFlight()
+
+    async def compute() -> dict:
+        with span("get_sql"):
+            await asyncio.sleep(0.05)
+        return {"message": "Ipswich"}
+
+    async def ask() -> list:
+        with request_timer() as timer:
+            await flight.do("q", compute)
+        return [stage for stage, _ in timer.spans]
+
+    async def main():
+        return await asyncio.gather(ask(), ask())
+
+    leader, follower = asyncio.run(main())
+    assert leader == ["get_sql", "total"]
+    assert follower == ["wait", "total"]
+
+
+def test_shared_flight_reuses_stored_response() -> None:
+    key = f"test:{uuid.uuid4()}"
+    calls = []
+
+    async def compute() -> dict:
+        calls.append(1)
+        return {"message": "Leicester"}
+
+    async def main():
+        first = await shared_flight(key, compute)
+        second = await shared_flight(key, compute)
+        return first, second
+
+    assert asyncio.run(main()) == ({"message": "Leicester"}, {"message": "Leicester"})
+    assert len(calls) == 1
+
+
+def test_shared_flight_waits_without_holding_connections() -> None:
+    key = f"test:{uuid.uuid4()}"
+    calls, checked_out = [], []
+
+    async def compute() -> dict:
+        calls.append(1)
+        checked_out.append(async_engine.pool.checkedout())
+        await asyncio.sleep(0.3)
+        return {"message": "Leicester"}
+
+    async def main():
+        try:
+            return await asyncio.gather(*(shared_flight(key, compute) for _ in range(3)))
+        finally:
+            await async_engine.dispose()
+
+    assert asyncio.run(main()) == [{"message": "Leicester"}] * 3
+    assert len(calls) == 1
+    # Only the followers polling for the response, one short query at a time
+    assert checked_out[0] <= 2
+
+
+def test_shared_flight_prunes_expired_rows(monkeypatch) -> None:
+    old = f"test:{uuid.uuid4()}"
+    with Session(engine) as session:
+        session.add(
+            SharedResponse(
+                key=old, response={}, created_at=datetime.utcnow() - timedelta(days=1)
+            )
+        )
+        session.commit()
+
+    async def compute() -> dict:
+        return {"message": "Leicester"}
+
+    async def main():
+        try:
+            await shared_flight(f"test:{uuid.uuid4()}", compute)
+        finally:
+            await async_engine.dispose()
+
+    asyncio.run(main())
+    with Session(engine) as session:
+        assert session.get(SharedResponse, old) is None
@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+from app.api.querying import utils
+from app.api.querying.cache import TTLCache
+from app.api.querying.normalize import normalize_question
+
+
+def test_normalize_question_folds_case_punctuation_and_whitespace() -> None:
+    assert normalize_question("Who won the 2015/16  season?") == normalize_question(
+        "who won the 2015/16 season"
+    )
+
+
+def test_normalize_question_folds_team_aliases() -> None:
+    assert normalize_question("Man Utd vs Spurs") == (
+        "manchester united vs tottenham hotspur"
+    )
+    assert normalize_question("Tottenham Hotspur") == "tottenham hotspur"
+    assert normalize_question("Nott'm Forest") == "nottingham forest"
+    assert normalize_question("How did Forest do?") == "how did nottingham forest do"
+
+
+def test_normalize_question_keeps_operators_and_decimals() -> None:
+    assert normalize_question("matches with > 3 goals") != normalize_question(
+        "matches with < 3 goals"
+    )
+    assert normalize_question("matches with >3 goals") == "matches with > 3 goals"
+    assert normalize_question("home odds above 2.5?") == "home odds above 2.5"
+    assert normalize_question("goals != 0") != normalize_question("goals = 0")
+
+
+def test_normalize_question_leaves_longer_names_alone() -> None:
+    assert normalize_question("Forest Green") == "forest green"
+    assert normalize_question("Villa Park matches") == "villa park matches"
+    assert normalize_question("villa park matches") == "villa park matches"
+    assert normalize_question("Goals at Spurs Lodge") == "goals at spurs lodge"
+
+
+def test_cache_hit_and_miss_counters() -> None:
+    cache = TTLCache(maxsize=2, ttl=60)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_cache_entries_expire() -> None:
+    cache = TTLCache(maxsize=2, ttl=0.01)
+    cache.set("a", 1)
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_get_sql_cached_calls_model_once(monkeypatch) -> None:
+    calls = []
+
+    async def fake_get_sql(query: str, model=None) -> str:
+        calls.append(query)
+        return "SELECT 1"
+
+    monkeypatch.setattr(utils, "get_sql", fake_get_sql)
+    utils.sql_cache.clear()
+
+    assert asyncio.run(utils.get_sql_cached("Who won the 2015/16 season?")) == "SELECT 1"
+    assert asyncio.run(utils.get_sql_cached("who won the 2015/16 season")) == "SELECT 1"
+    assert len(calls) == 1
+
+
+def test_get_sql_cached_keeps_only_checked_sql(monkeypatch) -> None:
+    answers = ["invalid", "SELECT * FROM arrakis", "SELECT 1", "SELECT 2"]
+
+    async def fake_get_sql(query: str, model=None) -> str:
+        return answers.pop(0)
+
+    monkeypatch.setattr(utils, "get_sql", fake_get_sql)
+    utils.sql_cache.clear()
+
+    question = "Who won the 2016/17 season?"
+    assert asyncio.run(utils.get_sql_cached(question)) == "invalid"
+    assert asyncio.run(utils.get_sql_cached(question)) == "SELECT * FROM arrakis"
+    assert asyncio.run(utils.get_sql_cached(question)) == "SELECT 1"
+    assert asyncio.run(utils.get_sql_cached(question)) == "SELECT 1"
+
+    # SQL that Postgres rejects is asked for again
+    utils.forget_sql(question)
+    assert asyncio.run(utils.get_sql_cached(question)) == "SELECT 2"
@@ -0,0 +1,53 @@
+from app.api.querying import stats
+from app.core.metrics import Histogram
+from fastapi.testclient import TestClient
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    histogram = Histogram("test_seconds", "Test.", labels=("stage",), buckets=(0.1, 1))
+    histogram.observe(0.05, stage="get_sql")
+    histogram.observe(0.5, stage="get_sql")
+    histogram.observe(2, stage="get_sql")
+
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="get_sql",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="get_sql",le="1"} 2' in lines
+    assert 'test_seconds_bucket{stage="get_sql",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{stage="get_sql"} 3' in lines
+
+
+def test_ask_stats_sends_server_timing(client: TestClient, monkeypatch) -> None:
+    async def fake_get_sql(query: str, model=None) -> str:
+        return "SELECT 1 AS seasons"
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    stats.result_cache.clear()
+
+    response = client.post("/api/query/ask_stats", json={"message": "Timed question?"})
+    assert response.status_code == 200
+    stages = [
+        part.split(";")[0] for part in response.headers["Server-Timing"].split(", ")
+    ]
+    assert stages[0] == "intent"
+    assert {"get_sql", "execute", "convert_rows", "format", "encode"} <= set(stages)
+    assert stages[-1] == "total"
+
+    metrics = client.get("/metrics").text
+    assert 'nl_query_stage_seconds_count{stage="get_sql",outcome="ok"}' in metrics
+
+
+def test_invalid_question_outcome(client: TestClient, monkeypatch) -> None:
+    async def fake_get_sql(query: str, model=None) -> str:
+        return "invalid"
+
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+
+    response = client.post("/api/query/ask_stats", json={"message": "Spice?"})
+    assert response.status_code == 400
+    assert "total;dur=" in response.headers["Server-Timing"]
+
+    metrics = client.get("/metrics").text
+    assert (
+        'nl_query_stage_seconds_count{stage="total",outcome="invalid_question"}'
+        in metrics
+    )
@@ -0,0 +1,82 @@
+from app.api.querying import stats
+from app.api.querying.validation import check_sql
+from app.core.config import settings
+from fastapi.testclient import TestClient
+
+
+def test_check_sql_accepts_valid_queries() -> None:
+    for sql in [
+        "SELECT EXTRACT(YEAR FROM match_date) AS year, count(*) c FROM match GROUP BY year",
+        "SELECT t.name FROM team t JOIN teamseason ts ON ts.team_name = t.name",
+        "WITH pts AS (SELECT home_team_name AS team FROM match) SELECT team FROM pts",
+        "SELECT * FROM (VALUES (1, 2)) AS v(a, b) WHERE a < b",
+        "SELECT home_team_name team, count(*) FROM match GROUP BY team",
+        "SELECT m.home_team_name team FROM match m ORDER BY team",
+        "SELECT full_time_home_goals + full_time_away_goals total_goals FROM match "
+        "ORDER BY total_goals",
+        "SELECT full_time_home_goals::numeric goals FROM match ORDER BY goals",
+        "SELECT rank() OVER w FROM match WINDOW w AS (ORDER BY match_date)",
+        "SELECT sum(full_time_home_goals) OVER w, lag(match_date) OVER w2 FROM match "
+        "WINDOW w AS (PARTITION BY season_name), w2 AS (ORDER BY match_date)",
+    ]:
+        assert check_sql(sql).errors == [], sql
+
+
+def test_check_sql_repairs_common_defects() -> None:
+    checked = check_sql(
+        "Here is the query:\n```postgresql\nSELECT home_team_name FROM `match` "
+        "WHERE division = 'Premier League' AND season_name == 'x';\n```\n"
+        "This returns the home teams."
+    )
+    assert checked.sql == (
+        'SELECT home_team_name FROM "match" '
+        "WHERE division = 'Premier League' AND season_name = 'x'"
+    )
+    assert checked.errors == []
+
+
+def test_check_sql_keeps_division_filters() -> None:
+    for sql in [
+        "SELECT count(*) FROM match WHERE (division = 'E0') AND home_team_name = 'A'",
+        "SELECT count(*) FROM match WHERE home_team_name = 'A' OR division = 'E0'",
+    ]:
+        checked = check_sql(sql)
+        assert (checked.sql, checked.errors, checked.repairs) == (sql, [], []), sql
+
+
+def test_check_sql_reports_unknown_names() -> None:
+    checked = check_sql("SELECT m.refere_name FROM match m JOIN arrakis a ON true")
+    assert "unknown table arrakis" in checked.errors
+    assert any("did you mean referee_name" in error for error in checked.errors)
+
+
+def test_check_sql_rejects_writes() -> None:
+    assert not check_sql("SELECT * FROM match; DROP TABLE match").read_only
+    assert not check_sql("SELECT * FROM match FOR UPDATE").read_only
+
+
+def test_invalid_sql_is_retried_once(client: TestClient, monkeypatch) -> None:
+    errors = []
+
+    async def fake_get_sql(query: str, model=None) -> str:
+        return "SELECT count(*) AS wins FROM matches"
+
+    async def fake_repair_sql(query: str, sql: str, sql_errors, model=None) -> str:
+        errors.extend(sql_errors)
+        return "SELECT count(*) AS wins FROM match"
+
+    monkeypatch.setattr(settings, "SQL_SMALL_MODEL", "")
+    monkeypatch.setattr(stats, "get_sql_cached", fake_get_sql)
+    monkeypatch.setattr(stats, "repair_sql", fake_repair_sql)
+
+    response = client.post("/api/query/ask_stats", json={"message": "Wins?"})
+    assert response.status_code == 200
+    assert errors == ["unknown table matches"]
+
+    async def bad_repair_sql(query: str, sql: str, sql_errors, model=None) -> str:
+        return sql
+
+    monkeypatch.setattr(stats, "repair_sql", bad_repair_sql)
+    response = client.post("/api/query/ask_stats", json={"message": "Wins?"})
+    assert response.status_code == 422
+    assert response.json()["detail"]["code"] == "query_invalid_sql"
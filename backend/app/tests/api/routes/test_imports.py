@@ -0,0 +1,73 @@
+import io
+import zipfile
+
+from app.core.config import settings
+from fastapi.testclient import TestClient
+
+AUTH = {"Authorization": f"Bearer {settings.ADD_ACCESS_TOKEN}"}
+
+CSV = (
+    "﻿Div,Date,HomeTeam,AwayTeam,FTHG,FTAG,FTR,Referee,HS,Unknown\r\n"
+    "E0,1990-08-18,Import Home,Import Away,2,1,H,Import Referee,10,x\r\n"
+    "E0,1990-08-25,Import Away,Import Home,0,0,D,,,x\r\n"
+    ",,,,,,,,,\r\n"
+).encode()
+
+
+def test_import_csv_merges_by_natural_key(client: TestClient) -> None:
+    params = {"file_name": "prem_90_91_stats.csv"}
+    response = client.post(
+        "/api/import/matches", params=params, content=CSV, headers=AUTH
+    )
+    assert response.status_code == 200
+    [imported] = response.json()["files"]
+    assert imported["season_name"] == "English Premier League 1990/91 Season"
+    assert imported["rows"] == 2
+    assert imported["inserted"] == 2
+    assert imported["ignored_columns"] == ["Unknown"]
+
+    changed = CSV.replace(b"2,1,H", b"3,1,H")
+    response = client.post(
+        "/api/import/matches", params=params, content=changed, headers=AUTH
+    )
+    [imported] = response.json()["files"]
+    assert (imported["inserted"], imported["updated"], imported["unchanged"]) == (0, 1, 1)
+
+    matches = client.get(
+        "/api/match/list",
+        params={"season_name": "English Premier League 1990/91 Season"},
+    ).json()
+    goals = {match["match_date"]: match["full_time_home_goals"] for match in matches}
+    assert goals == {"1990-08-18": 3, "1990-08-25": 0}
+
+
+def test_import_zip_loads_every_season(client: TestClient) -> None:
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zip_file:
+        zip_file.writestr("prem_91_92_stats.csv", CSV)
+        zip_file.writestr("stadiums.csv", "Name\r\nSkipped\r\n")
+    response = client.post(
+        "/api/import/matches", content=archive.getvalue(), headers=AUTH
+    )
+    assert response.status_code == 200
+    [imported] = response.json()["files"]
+    assert imported["file_name"] == "prem_91_92_stats.csv"
+    assert imported["inserted"] == 2
+
+
+def test_import_rejects_bad_files(client: TestClient) -> None:
+    response = client.post("/api/import/matches", content=CSV, headers=AUTH)
+    assert response.status_code == 400
+
+    bad = CSV.replace(b"2,1,H", b"two,1,H")
+    response = client.post(
+        "/api/import/matches",
+        params={"season_name": "Import Failure Season"},
+        content=bad,
+        headers=AUTH,
+    )
+    assert response.status_code == 400
+    assert "integer" in response.json()["detail"]
+
+    response = client.post("/api/import/matches", content=CSV)
+    assert response.status_code == 403
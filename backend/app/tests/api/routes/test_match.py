@@ -0,0 +1,54 @@
+from app.core.config import settings
+from fastapi.testclient import TestClient
+
+ADD = {"Authorization": f"Bearer {settings.ADD_ACCESS_TOKEN}"}
+UPDATE = {"Authorization": f"Bearer {settings.UPDATE_ACCESS_TOKEN}"}
+DELETE = {"Authorization": f"Bearer {settings.DELETE_ACCESS_TOKEN}"}
+
+MATCH = {
+    "season_name": "Odds 2001/02 Season",
+    "division": "E0",
+    "match_date": "2001-08-18",
+    "match_time": None,
+    "home_team_name": "Odds Home",
+    "away_team_name": "Odds Away",
+    "full_time_home_goals": 2,
+    "full_time_away_goals": 2,
+    "full_time_result": "D",
+    "half_time_home_goals": 1,
+    "half_time_away_goals": 0,
+    "half_time_result": "H",
+    "bet365_home_win_odds": 1.8,
+    "bet365_draw_odds": 3.4,
+}
+
+
+def test_match_create_and_update_with_odds(client: TestClient) -> None:
+    client.post("/api/season/upsert", json={"name": MATCH["season_name"]}, headers=ADD)
+    for name in [MATCH["home_team_name"], MATCH["away_team_name"]]:
+        client.post("/api/team/upsert", json={"name": name}, headers=ADD)
+
+    response = client.post("/api/match/add", json=MATCH, headers=ADD)
+    assert response.status_code == 201
+    content = response.json()
+    assert content["home_team_name"] == MATCH["home_team_name"]
+    assert "bet365_home_win_odds" not in content
+    match_id = content["id"]
+    odds = client.get(f"/api/match/odds/{match_id}").json()
+    assert (odds["bet365_home_win_odds"], odds["bet365_draw_odds"]) == (1.8, 3.4)
+
+    response = client.put(
+        f"/api/match/update/{match_id}",
+        json={**MATCH, "full_time_home_goals": 3, "bet365_draw_odds": 3.6},
+        headers=UPDATE,
+    )
+    assert response.status_code == 200
+    assert response.json()["full_time_home_goals"] == 3
+    odds = client.get(f"/api/match/odds/{match_id}").json()
+    assert (odds["bet365_home_win_odds"], odds["bet365_draw_odds"]) == (1.8, 3.6)
+
+    response = client.delete(f"/api/match/delete/{match_id}", headers=DELETE)
+    assert response.status_code == 204
+    response = client.get(f"/api/match/odds/{match_id}")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Match odds not found"
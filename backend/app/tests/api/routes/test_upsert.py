@@ -0,0 +1,150 @@
+from app.api.routes import match as match_routes
+from app.core.bulk import bulk_upsert
+from app.core.config import settings
+from app.models import MatchOdds
+from fastapi.testclient import TestClient
+
+AUTH = {"Authorization": f"Bearer {settings.ADD_ACCESS_TOKEN}"}
+
+MATCH = {
+    "season_name": "Upsert 1999/00 Season",
+    "division": "E0",
+    "match_date": "1999-08-07",
+    "match_time": None,
+    "home_team_name": "Upsert Home",
+    "away_team_name": "Upsert Away",
+    "full_time_home_goals": 1,
+    "full_time_away_goals": 0,
+    "full_time_result": "H",
+    "half_time_home_goals": 0,
+    "half_time_away_goals": 0,
+    "half_time_result": "D",
+}
+
+
+def test_upsert_match_updates_by_natural_key(client: TestClient) -> None:
+    for path, data in [
+        ("/api/season/upsert", {"name": MATCH["season_name"]}),
+        ("/api/team/upsert", {"name": MATCH["home_team_name"]}),
+        ("/api/team/upsert", {"name": MATCH["away_team_name"]}),
+    ]:
+        first = client.post(path, json=data, headers=AUTH)
+        second = client.post(path, json=data, headers=AUTH)
+        assert first.status_code == second.status_code == 201
+        assert first.json()["id"] == second.json()["id"]
+
+    created = client.post("/api/match/upsert", json=MATCH, headers=AUTH)
+    assert created.status_code == 201
+    updated = client.post(
+        "/api/match/upsert",
+        json={**MATCH, "full_time_home_goals": 2, "bet365_home_win_odds": 1.5},
+        headers=AUTH,
+    )
+    assert updated.status_code == 201
+    assert updated.json()["id"] == created.json()["id"]
+    assert updated.json()["full_time_home_goals"] == 2
+    assert "bet365_home_win_odds" not in updated.json()
+    odds = client.get(f"/api/match/odds/{created.json()['id']}").json()
+    assert odds["bet365_home_win_odds"] == 1.5
+
+    team_season = {
+        "team_name": MATCH["home_team_name"],
+        "season_name": MATCH["season_name"],
+    }
+    first = client.post("/api/team/season/upsert", json=team_season, headers=AUTH)
+    second = client.post("/api/team/season/upsert", json=team_season, headers=AUTH)
+    assert first.json()["id"] == second.json()["id"]
+
+    response = client.post(
+        "/api/match/upsert", json={**MATCH, "match_date": "not a date"}, headers=AUTH
+    )
+    assert response.status_code == 422
+    response = client.post(
+        "/api/match/upsert", json={**MATCH, "home_team_name": "Nobody"}, headers=AUTH
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "home_team_name: unknown team 'Nobody'"
+
+
+def test_bulk_upsert_reports_every_row(client: TestClient) -> None:
+    teams = [{"name": "Bulk Home"}, {"name": "Bulk Away"}]
+    response = client.post("/api/team/bulk_upsert", json=teams, headers=AUTH)
+    assert response.json()["inserted"] == 2
+    response = client.post("/api/team/bulk_upsert", json=teams, headers=AUTH)
+    assert response.json()["unchanged"] == 2
+    client.post("/api/season/bulk_upsert", json=[{"name": "Bulk Season"}], headers=AUTH)
+
+    match = {
+        **MATCH,
+        "season_name": "Bulk Season",
+        "home_team_name": "Bulk Home",
+        "away_team_name": "Bulk Away",
+    }
+    rows = [
+        match,
+        {**match, "match_date": "1999-12-26"},
+        {**match, "match_date": "2000-01-03", "away_team_name": "Nobody"},
+    ]
+    response = client.post(
+        "/api/match/bulk_upsert",
+        json=rows + [{**match, "full_time_home_goals": "many"}],
+        headers=AUTH,
+    )
+    assert response.status_code == 422
+    response = client.post("/api/match/bulk_upsert", json=rows, headers=AUTH)
+    assert response.status_code == 200
+    result = response.json()
+    assert [row["outcome"] for row in result["rows"]] == [
+        "inserted",
+        "inserted",
+        "failed",
+    ]
+    assert "unknown team" in result["rows"][2]["error"]
+
+    rows = [match, {**match, "match_date": "1999-12-26", "full_time_away_goals": 3}]
+    result = client.post("/api/match/bulk_upsert", json=rows, headers=AUTH).json()
+    assert [row["outcome"] for row in result["rows"]] == ["unchanged", "updated"]
+    assert (result["unchanged"], result["updated"]) == (1, 1)
+
+
+def test_bulk_upsert_leaves_matches_of_rejected_odds(
+    client: TestClient, monkeypatch
+) -> None:
+    client.post("/api/season/bulk_upsert", json=[{"name": "Odds Season"}], headers=AUTH)
+    teams = [{"name": "Odds Home"}, {"name": "Odds Away"}]
+    client.post("/api/team/bulk_upsert", json=teams, headers=AUTH)
+    match = {
+        **MATCH,
+        "season_name": "Odds Season",
+        "home_team_name": "Odds Home",
+        "away_team_name": "Odds Away",
+    }
+
+    def rejecting_bulk_upsert(session, model, rows, keys, prepare=None):
+        if model is MatchOdds:
+            # The database turns down the odds of one match
+            rows = [
+                {**row, "match_id": -1} if row["bet365_home_win_odds"] == 3.0 else row
+                for row in rows
+            ]
+        return bulk_upsert(session, model, rows, keys, prepare)
+
+    monkeypatch.setattr(match_routes, "bulk_upsert", rejecting_bulk_upsert)
+    rows = [
+        {**match, "bet365_home_win_odds": 2.0},
+        {**match, "match_date": "1999-08-14", "bet365_home_win_odds": 3.0},
+        {**match, "match_date": "1999-08-21", "bet365_home_win_odds": 4.0},
+    ]
+    result = client.post("/api/match/bulk_upsert", json=rows, headers=AUTH).json()
+    assert [row["outcome"] for row in result["rows"]] == [
+        "inserted",
+        "failed",
+        "inserted",
+    ]
+    assert (result["inserted"], result["failed"]) == (2, 1)
+    assert "match_odds" in result["rows"][1]["error"]
+
+    listed = client.get(
+        "/api/match/list", params={"season_name": "Odds Season", "limit": 10}
+    ).json()
+    assert sorted(row["match_date"] for row in listed) == ["1999-08-07", "1999-08-21"]
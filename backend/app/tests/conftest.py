@@ -1,19 +1,61 @@
 from collections.abc import Generator
+from datetime import datetime
 
 import pytest
 from app.core.db import engine
 from app.main import app
-from app.models import Team
+from app.models import (
+    CachedAnswer,
+    MatchRecord,
+    PrecomputedPlan,
+    Referee,
+    Season,
+    Stadium,
+    Team,
+    TeamSeason,
+)
 from fastapi.testclient import TestClient
-from sqlmodel import Session, delete
+from sqlmodel import Session, delete, func, select
+
+# Tables the tests add rows to, rows referencing others first. Match odds go with
+# their match.
+CREATED_BY_TESTS = [MatchRecord, TeamSeason, Stadium, Team, Referee, Season]
+# Caches the tests write to. Their rows are told apart by key and by the time
+# they were written, as tests also overwrite and age rows.
+CACHED_BY_TESTS = [CachedAnswer, PrecomputedPlan]
+
+
+def _keys(model) -> list:
+    return list(model.__table__.primary_key.columns)
 
 
 @pytest.fixture(scope="session", autouse=True)
 def db() -> Generator[Session, None, None]:
     with Session(engine) as session:
+        # Only the rows added while the tests run are deleted afterwards, the ids
+        # count up so those are the ones above the current maximum
+        last_ids = {
+            model: session.exec(select(func.coalesce(func.max(model.id), 0))).one()
+            for model in CREATED_BY_TESTS
+        }
+        cached_keys = {
+            model: {tuple(key) for key in session.execute(select(*_keys(model)))}
+            for model in CACHED_BY_TESTS
+        }
+        started = datetime.utcnow()
         yield session
-        statement = delete(Team)
-        session.exec(statement)
+        for model in CREATED_BY_TESTS:
+            session.exec(delete(model).where(model.id > last_ids[model]))
+        for model in CACHED_BY_TESTS:
+            for created_at, *key in session.execute(
+                select(model.created_at, *_keys(model))
+            ):
+                if tuple(key) not in cached_keys[model] or created_at >= started:
+                    session.exec(
+                        delete(model).where(
+                            *[column == value for column, value in zip(_keys(model), key)]
+                        )
+                    )
         session.commit()
 
 
@@ -9,12 +9,11 @@ import threading
 import zipfile
 from argparse import ArgumentParser
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import requests
 from dotenv import load_dotenv
 from tenacity import retry, stop_after_attempt, wait_exponential
-from tqdm import tqdm
 
 parser = ArgumentParser()
 parser.add_argument(
@@ -75,25 +74,18 @@ def upsert(model: str, **kwargs) -> Dict[str, Any]:
         raise Exception(f"Failed to create {model}: {response.text}")
 
 
-def create_match(season_name, row: Dict[str, Any]):
-    season = upsert("season", name=season_name)
-    home_team = upsert("team", name=row["HomeTeam"])
-    upsert("team/season", team_name=row["HomeTeam"], season_name=season_name)
-    away_team = upsert("team", name=row["AwayTeam"])
-    upsert("team/season", team_name=row["AwayTeam"], season_name=season_name)
-    if "Referee" in row:
-        referee = upsert("referee", name=row["Referee"]) if row["Referee"] else None
-    else:
-        referee = None
-
+def match_row(season_name: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Maps a row of a football-data CSV to the fields of the match model.
+    """
     match_data = {
-        "season_name": season["name"],
+        "season_name": season_name,
         "division": row["Div"],
         "match_date": row["Date"],
         "match_time": row["Time"] if "Time" in row else None,
-        "home_team_name": home_team["name"],
-        "away_team_name": away_team["name"],
-        "referee_name": referee["name"] if referee else None,
+        "home_team_name": row["HomeTeam"],
+        "away_team_name": row["AwayTeam"],
+        "referee_name": row.get("Referee") or None,
         "full_time_home_goals": int(row["FTHG"]),
         "full_time_away_goals": int(row["FTAG"]),
         "full_time_result": row["FTR"],
@@ -181,14 +173,56 @@ def create_match(season_name, row: Dict[str, Any]):
         ),
     }
 
+    return match_data
+
+
+def create_match(season_name, row: Dict[str, Any]):
+    upsert("season", name=season_name)
+    upsert("team", name=row["HomeTeam"])
+    upsert("team/season", team_name=row["HomeTeam"], season_name=season_name)
+    upsert("team", name=row["AwayTeam"])
+    upsert("team/season", team_name=row["AwayTeam"], season_name=season_name)
+    if row.get("Referee"):
+        upsert("referee", name=row["Referee"])
+
     headers = {"Authorization": f"Bearer {ADD_ACCESS_TOKEN}"}
     response = requests.post(
-        f"{BASE_URL}/api/match/upsert", json=match_data, headers=headers
+        f"{BASE_URL}/api/match/upsert",
+        json=match_row(season_name, row),
+        headers=headers,
     )
     if response.status_code != 201:
         raise Exception(f"Failed to create match: {response.text}")
 
 
+@retry(
+    stop=stop_after_attempt(5),
+    wait=wait_exponential(multiplier=1, min=4, max=10),
+)
+def bulk_upsert(model: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Upserts all the rows of a model in one request and prints the rows that failed.
+
+    Args:
+        model (str): model type, e.g. 'season', 'team', 'team/season' or 'match'
+    Returns:
+        Dict[str, Any]: The number of rows inserted, updated, unchanged and failed.
+    """
+    headers = {"Authorization": f"Bearer {ADD_ACCESS_TOKEN}"}
+    response = requests.post(
+        f"{BASE_URL}/api/{model}/bulk_upsert", json=rows, headers=headers
+    )
+    if response.status_code != 200:
+        raise Exception(f"Failed to upsert {model}: {response.text}")
+    result = response.json()
+    for outcome in result["rows"]:
+        if outcome["outcome"] == "failed":
+            print(
+                f"Failed to upsert {model} {rows[outcome['index']]}: {outcome['error']}"
+            )
+    return result
+
+
 def parse_file_name_to_season(csv_file_name: str):
     """Parses the file name that we get into a season name.
         The file name being passed in is of the form : `prem_<season_year>_stats.csv`.
@@ -218,9 +252,24 @@ def parse_csv(csv_file_path: Path):
     season_name = parse_file_name_to_season(csv_file_name)
     print(f"Parsing data for {season_name} ...")
     with open(csv_file_path, "r", encoding="utf-8") as csvfile:
-        csv_reader = csv.DictReader(csvfile)
-        for row in tqdm(csv_reader):
-            create_match(season_name, row)
+        rows = list(csv.DictReader(csvfile))
+
+    # The whole season goes in one request per model, dimensions first
+    teams = sorted({row[side] for row in rows for side in ["HomeTeam", "AwayTeam"]})
+    referees = sorted({row["Referee"] for row in rows if row.get("Referee")})
+    bulk_upsert("season", [{"name": season_name}])
+    bulk_upsert("team", [{"name": team} for team in teams])
+    bulk_upsert(
+        "team/season",
+        [{"team_name": team, "season_name": season_name} for team in teams],
+    )
+    if referees:
+        bulk_upsert("referee", [{"name": referee} for referee in referees])
+    result = bulk_upsert("match", [match_row(season_name, row) for row in rows])
+    print(
+        f"{season_name}: {result['inserted']} inserted, {result['updated']} updated, "
+        f"{result['unchanged']} unchanged, {result['failed']} failed"
+    )
 
 
 def is_alive(url) -> bool: